@@ -0,0 +1,211 @@
+"""GUI 刷新耗时基准：在 offscreen 平台上按规模测量单步刷新的延迟分位数与内存。
+
+对每个规模启动一个新进程：用 `workload.write_program` 生成程序，经 `start_loading`
+（与界面中“加载指令”相同的后台加载路径）载入 `TomasuloUI`，然后反复调用
+`step_simulation` 并处理事件（含重绘），记录每次刷新的耗时。模态的 `QMessageBox`
+被替换为立即返回，结果缓存目录指向临时目录，因此不需要显示器或人工操作。
+
+每次步进拆分为引擎耗时（`Tomasulo.step`）与界面耗时（其余部分：`update_tables`、
+日志、重绘），分别给出 p50/p90/p99/最大值；内存为载入后与步进结束时的常驻内存。
+
+用法：
+    python bench_gui.py                                    # 默认规模 1000,10000,100000
+    python bench_gui.py --sizes 1000,50000 --steps 300 -o current.json
+    python bench_gui.py --baseline baseline.json --tolerance 1.25
+
+给出 `--baseline` 时与保存的结果比较界面耗时的 p50/p90，任一规模超出
+基准 × `--tolerance` 时退出码为 1；`-o` 把本次结果写为 JSON，可作为新的基准。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (1000, 10000, 100000)
+# 子进程把结果写到标准输出中以此开头的一行（Qt 可能向输出写入其他信息）
+_RESULT_PREFIX = "BENCH_GUI "
+# 与基准比较的指标
+COMPARED = ("ui_p50_ms", "ui_p90_ms")
+
+
+def percentile(values, q):
+    """最近秩分位数（`values` 非空）。"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def _rss_mb():
+    """当前进程的常驻内存（MB）；无法获取时为 None。"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _summary(prefix, samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        f"{prefix}_p50_ms": percentile(ms, 50),
+        f"{prefix}_p90_ms": percentile(ms, 90),
+        f"{prefix}_p99_ms": percentile(ms, 99),
+        f"{prefix}_max_ms": max(ms),
+    }
+
+
+def measure_size(size, steps, seed):
+    """在本进程中测量一个规模（需要 PyQt5），返回结果字典。"""
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+
+    import main as gui
+    from workload import write_program
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    # 模态对话框会阻塞步进：替换为立即返回
+    for name in ("information", "warning", "critical", "question"):
+        setattr(QMessageBox, name, staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TOMASULO_CACHE_DIR"] = os.path.join(tmp, "cache")
+        path = os.path.join(tmp, "program.txt")
+        write_program(path, size, seed=seed)
+
+        window = gui.TomasuloUI()
+        window.show()
+        app.processEvents()
+
+        started = time.perf_counter()
+        window.start_loading(path)
+        # 加载完成时 `_on_load_finished` 把 `_loader` 置为 None
+        while window._loader is not None:
+            app.processEvents()
+            time.sleep(0.001)
+        if window._loader_thread is not None:
+            window._loader_thread.wait()
+        app.processEvents()
+        load_s = time.perf_counter() - started
+        rss_loaded = _rss_mb()
+
+        engine = window.tomasulo
+        engine_step = engine.step
+        engine_time = [0.0]
+
+        def _timed_step():
+            t0 = time.perf_counter()
+            engine_step()
+            engine_time[0] += time.perf_counter() - t0
+        engine.step = _timed_step
+
+        totals, engine_samples = [], []
+        for _ in range(steps):
+            if engine.is_finished():
+                break
+            engine_time[0] = 0.0
+            t0 = time.perf_counter()
+            window.step_simulation()
+            app.processEvents()
+            totals.append(time.perf_counter() - t0)
+            engine_samples.append(engine_time[0])
+        rss_after = _rss_mb()
+        window.close()
+        app.processEvents()
+
+    if not totals:
+        raise RuntimeError(f"规模 {size} 的程序没有可步进的周期")
+    result = {"size": size, "steps": len(totals), "load_ms": load_s * 1000,
+              "rss_loaded_mb": rss_loaded, "rss_after_mb": rss_after}
+    result.update(_summary("ui", [total - eng for total, eng in zip(totals, engine_samples)]))
+    result.update(_summary("engine", engine_samples))
+    result.update(_summary("total", totals))
+    return result
+
+
+def run_child(size, steps, seed, platform):
+    """在新进程中测量一个规模（各规模的内存互不影响）。"""
+    env = dict(os.environ)
+    if platform:
+        env["QT_QPA_PLATFORM"] = platform
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(size), "--steps", str(steps),
+               "--seed", str(seed)]
+    out = subprocess.run(command, env=env, cwd=HERE, check=True, capture_output=True, text=True,
+                         timeout=3600).stdout
+    for line in out.splitlines():
+        if line.startswith(_RESULT_PREFIX):
+            return json.loads(line[len(_RESULT_PREFIX):])
+    raise RuntimeError(f"规模 {size} 的子进程没有输出结果")
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """返回超出基准 × tolerance 的 [(规模, 指标, 基准值, 当前值)]；基准中没有的规模不比较。"""
+    saved = {entry["size"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        base = saved.get(entry["size"])
+        if base is None:
+            continue
+        for key in COMPARED:
+            if key in base and entry[key] > base[key] * tolerance:
+                regressions.append((entry["size"], key, base[key], entry[key]))
+    return regressions
+
+
+def _format_mb(value):
+    return "-" if value is None else f"{value:.0f} MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量 Tomasulo GUI 单步刷新耗时与内存")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="程序规模（逗号分隔的指令条数）")
+    parser.add_argument("--steps", type=int, default=200, help="每个规模测量的单步次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--platform", default="offscreen", help="QT_QPA_PLATFORM（空字符串表示不设置）")
+    parser.add_argument("--baseline", help="基准结果 JSON（本脚本 -o 的输出）")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="允许的界面耗时相对基准的倍数")
+    parser.add_argument("-o", "--output", help="把结果写为 JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(_RESULT_PREFIX + json.dumps(measure_size(args.child, args.steps, args.seed)), flush=True)
+        return 0
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        entry = run_child(size, args.steps, args.seed, args.platform)
+        results.append(entry)
+        print(f"{size:>8} 条: 加载 {entry['load_ms']:.0f} ms，{entry['steps']} 次单步；"
+              f"界面 p50 {entry['ui_p50_ms']:.2f} / p90 {entry['ui_p90_ms']:.2f} / p99 {entry['ui_p99_ms']:.2f} ms，"
+              f"引擎 p50 {entry['engine_p50_ms']:.2f} ms；"
+              f"内存 {_format_mb(entry['rss_loaded_mb'])} -> {_format_mb(entry['rss_after_mb'])}")
+
+    report = {"steps": args.steps, "seed": args.seed, "platform": args.platform, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for size, key, base, current in regressions:
+            print(f"回归: {size} 条 {key} {base:.2f} -> {current:.2f} ms（允许 ×{args.tolerance}）")
+        if regressions:
+            return 1
+        print("未超出基准")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""GUI 冷启动耗时基准（源码版与 PyInstaller 冻结版）。
+
+每次运行都启动一个新进程，设置 TOMASULO_STARTUP_BENCH 让 `main.py`
+在窗口首次绘制后写出进程内启动耗时并退出；同时在外部测量从进程创建
+到退出的总耗时（冻结版包含解包 PYZ/依赖的时间）。
+
+用法：
+    python bench_startup.py                       # 源码版：python main.py
+    python bench_startup.py --exe dist/main/main.exe
+    python bench_startup.py --runs 10 --budget-ms 1500
+
+默认使用 QT_QPA_PLATFORM=offscreen，可在无显示器的机器上运行；
+加 --platform "" 可使用真实平台插件。超出 --budget-ms 时退出码为 1。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_once(command, platform):
+    """运行一次，返回 (进程内启动毫秒, 外部总毫秒)。"""
+    fd, result_path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    env = dict(os.environ, TOMASULO_STARTUP_BENCH=result_path)
+    if platform:
+        env["QT_QPA_PLATFORM"] = platform
+    try:
+        started = time.perf_counter()
+        subprocess.run(command, env=env, cwd=HERE, check=True, timeout=120,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wall_ms = (time.perf_counter() - started) * 1000
+        with open(result_path) as f:
+            inner_ms = float(f.read().strip())
+    finally:
+        os.unlink(result_path)
+    return inner_ms, wall_ms
+
+
+def measure_import(module):
+    """在新进程中测量导入某模块的耗时（毫秒），并确认是否带入了 PyQt5。"""
+    code = (
+        "import sys, time; t = time.perf_counter(); import " + module +
+        "; print((time.perf_counter() - t) * 1000, 'PyQt5' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                         capture_output=True, text=True).stdout.split()
+    return float(out[0]), out[1] == "True"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量 Tomasulo GUI 冷启动耗时")
+    parser.add_argument("--exe", help="冻结版可执行文件路径（默认测源码版）")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--platform", default="offscreen", help="QT_QPA_PLATFORM（空字符串表示不设置）")
+    parser.add_argument("--budget-ms", type=float, default=None, help="外部总耗时中位数预算")
+    args = parser.parse_args(argv)
+
+    import_ms, pulls_qt = measure_import("tomasulo")
+    print(f"import tomasulo: {import_ms:.1f} ms (引入 PyQt5: {'是' if pulls_qt else '否'})")
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(HERE, "main.py")]
+    inner, wall = [], []
+    for _ in range(args.runs):
+        i, w = measure_once(command, args.platform)
+        inner.append(i)
+        wall.append(w)
+    label = "冻结版" if args.exe else "源码版"
+    print(f"{label} 进程内启动: 中位数 {statistics.median(inner):.1f} ms, 最大 {max(inner):.1f} ms")
+    print(f"{label} 外部总耗时: 中位数 {statistics.median(wall):.1f} ms, 最大 {max(wall):.1f} ms")
+
+    if args.budget_ms is not None and statistics.median(wall) > args.budget_ms:
+        print(f"超出启动预算 {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""条件断点与观察点：在引擎循环中检查，命中前以无界面的全速运行。
+
+断点写成以分号或换行分隔的条件，任一条件满足即停止：
+- `cycle N`：时钟到达第 N 个周期。
+- `issue K` / `write K`：第 K 条动态指令（指令表中的行号，从 1 开始）发射 / 写回。
+- `reg F5`：寄存器 F5 的值发生变化。
+- `mem 300`：内存地址 300 被 STORE 写入。
+- `full`：所有保留站变为忙碌（从非全忙变为全忙时触发一次）。
+
+`compile_breakpoints` 在运行前把条件编译为一个检查函数，只包含实际用到的检查；
+每个检查只读取引擎在本周期已经维护的变化集合（`timing_changes`、`dirty_registers`、
+`memory_changes`）或计数（`busy_stations`），没有条件时不产生任何开销，
+因此每周期的额外代价与条件数量和本周期的变化数成正比，而不是与程序规模成正比。
+"""
+from instruction_log import TIMING_FIELDS
+
+_TIMING_KINDS = {"issue": 0, "write": TIMING_FIELDS.index("write_cycle")}
+
+
+def parse_breakpoints(text):
+    """把断点文本解析为 [(类型, 参数)]；格式错误时引发 ValueError。"""
+    conditions = []
+    for item in text.replace("\n", ";").split(";"):
+        tokens = item.split()
+        if not tokens:
+            continue
+        kind = tokens[0].lower()
+        if kind == "full":
+            if len(tokens) != 1:
+                raise ValueError(f"full 不带参数: '{item.strip()}'")
+            conditions.append((kind, None))
+            continue
+        if len(tokens) != 2:
+            raise ValueError(f"断点需要一个参数: '{item.strip()}'")
+        arg = tokens[1]
+        if kind == "reg":
+            arg = arg.upper()
+            if not (arg.startswith("F") and arg[1:].isdigit() and 1 <= int(arg[1:]) <= 32):
+                raise ValueError(f"无效的寄存器: {tokens[1]}")
+        elif kind in ("cycle", "issue", "write", "mem"):
+            try:
+                arg = int(arg)
+            except ValueError:
+                raise ValueError(f"{kind} 需要整数参数: '{item.strip()}'")
+            if kind in ("issue", "write") and arg < 1:
+                raise ValueError(f"指令行号从 1 开始: '{item.strip()}'")
+        else:
+            raise ValueError(f"未知的断点类型: {tokens[0]}")
+        conditions.append((kind, arg))
+    return conditions
+
+
+def compile_breakpoints(t, conditions):
+    """返回检查函数：在 `t.step()` 之后调用，返回本周期命中的条件描述列表；没有条件时返回 None。
+
+    寄存器值与“全忙”状态以编译时的当前状态为基准，因此从断点处继续运行不会立即再次命中。
+    """
+    checks = []
+    cycles = {arg for kind, arg in conditions if kind == "cycle"}
+    if cycles:
+        def _cycle():
+            return [f"cycle {t.clock}"] if t.clock in cycles else []
+        checks.append(_cycle)
+
+    for kind, position in _TIMING_KINDS.items():
+        indices = {arg - 1 for k, arg in conditions if k == kind}
+        if indices:
+            def _timing(kind=kind, position=position, indices=indices):
+                changed = indices & t.timing_changes
+                if not changed:
+                    return []
+                queue = t.instruction_queue
+                return [f"{kind} {i + 1}（{queue.text(i)}）" for i in sorted(changed)
+                        if queue.timing_row(i)[position] == t.clock]
+            checks.append(_timing)
+
+    regs = {arg for kind, arg in conditions if kind == "reg"}
+    if regs:
+        last = {reg: t.registers[reg]["value"] for reg in regs}
+
+        def _reg():
+            hits = []
+            for reg in regs & t.dirty_registers:
+                value = t.registers[reg]["value"]
+                if value != last[reg]:
+                    hits.append(f"reg {reg}: {last[reg]} -> {value}")
+                    last[reg] = value
+            return hits
+        checks.append(_reg)
+
+    addresses = {arg for kind, arg in conditions if kind == "mem"}
+    if addresses:
+        def _mem():
+            return [f"mem {addr} = {t.memory[addr]}" for addr in sorted(addresses & t.memory_changes)]
+        checks.append(_mem)
+
+    if any(kind == "full" for kind, _ in conditions):
+        total = len(t.reservation_stations)
+        was_full = [t.busy_stations == total]
+
+        def _full():
+            full = t.busy_stations == total
+            rising = full and not was_full[0]
+            was_full[0] = full
+            return [f"full（{total} 个保留站全忙）"] if rising else []
+        checks.append(_full)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def _check():
+        hits = []
+        for check in checks:
+            hits += check()
+        return hits
+    return _check
+
+
+def run_until(t, check, max_cycles=None):
+    """全速运行直到命中断点、全部指令写回或时钟达到 `max_cycles`。
+
+    `check` 为 `compile_breakpoints` 的结果（分段运行时复用同一个以保持基准）。
+    返回命中的条件描述列表，未命中时为空列表。
+    """
+    if check is None:
+        t.run(max_cycles=max_cycles)
+        return []
+    step = t.step
+    while not t.is_finished():
+        if max_cycles is not None and t.clock >= max_cycles:
+            break
+        step()
+        hits = check()
+        if hits:
+            return hits
+    return []
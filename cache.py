@@ -0,0 +1,191 @@
+"""存储层次模型：LOAD/STORE 前的多级组相联缓存，给出随访问模式变化的访存延迟。
+
+配置（`Tomasulo(cache=...)` 或配置字典的 `cache` 键）：
+
+    {"levels": [{"size": 64, "assoc": 2, "line": 4, "latency": 2},
+                {"size": 512, "assoc": 4, "line": 8, "latency": 10}],
+     "memory_latency": 40}
+
+- `size` / `line` 以字（一个内存地址）为单位，`size` 必须是 `assoc × line` 的整数倍。
+- `latency` 为在该级命中时的访存总延迟；所有级都缺失时为 `memory_latency`。
+- 替换策略为 LRU；写分配：STORE 与 LOAD 一样按地址访问并填充各级。
+
+缓存只模拟时序，数据仍由 `Tomasulo.memory` 保存。访问在 LOAD/STORE 开始执行时
+发生（按引擎处理保留站的顺序），得到的延迟写入保留站的 `exec_time`，由 `step()`
+的倒计时完成。每级的标签与最近使用时间存放在定长数组中（每组 `assoc` 路连续存放），
+查找只扫描一组。
+
+用法（比较固定访存延迟与缓存模型下的周期数，并报告各级命中率）：
+    python cache.py big.txt
+    python cache.py big.txt --cache cache.json
+"""
+import argparse
+import json
+import sys
+from array import array
+
+DEFAULT_CACHE = {
+    "levels": [
+        {"size": 64, "assoc": 2, "line": 4, "latency": 2},
+        {"size": 512, "assoc": 4, "line": 8, "latency": 10},
+    ],
+    "memory_latency": 40,
+}
+
+# 标签取行号的低 63 位（相差 2^63 整数倍的地址才会混淆）
+_TAG_MASK = (1 << 63) - 1
+
+
+def _positive_int(spec, key, where):
+    value = spec.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"{where} 的 {key} 必须为正整数: {value}")
+    return value
+
+
+class CacheLevel:
+    def __init__(self, name, size, assoc, line, latency):
+        if size % (assoc * line):
+            raise ValueError(f"{name} 的 size 必须是 assoc × line 的整数倍: {size}")
+        self.name = name
+        self.size = size
+        self.assoc = assoc
+        self.line = line
+        self.latency = latency
+        self.num_sets = size // (assoc * line)
+        self.tags = array("q", [-1]) * (self.num_sets * assoc)
+        self.stamps = array("Q", [0]) * (self.num_sets * assoc)
+        self.hits = 0
+        self.misses = 0
+
+    def access(self, addr, stamp):
+        """访问地址：命中时更新 LRU 并返回 True；缺失时替换最久未使用的一路并返回 False。"""
+        line = addr // self.line
+        base = (line % self.num_sets) * self.assoc
+        tag = (line // self.num_sets) & _TAG_MASK
+        tags = self.tags
+        stamps = self.stamps
+        victim = base
+        for way in range(base, base + self.assoc):
+            if tags[way] == tag:
+                stamps[way] = stamp
+                self.hits += 1
+                return True
+            if stamps[way] < stamps[victim]:
+                victim = way
+        tags[victim] = tag
+        stamps[victim] = stamp
+        self.misses += 1
+        return False
+
+
+class CacheHierarchy:
+    def __init__(self, spec=None):
+        spec = DEFAULT_CACHE if spec is None else spec
+        if not isinstance(spec, dict) or not spec.get("levels"):
+            raise ValueError(f"缓存配置需要至少一级: {spec}")
+        self.levels = []
+        for i, level in enumerate(spec["levels"], start=1):
+            name = f"L{i}"
+            if not isinstance(level, dict):
+                raise ValueError(f"{name} 的配置无效: {level}")
+            self.levels.append(CacheLevel(name, *(_positive_int(level, key, name)
+                                                  for key in ("size", "assoc", "line", "latency"))))
+        self.memory_latency = _positive_int(spec, "memory_latency", "缓存配置")
+        self.spec = self.config()
+        self.reads = 0
+        self.writes = 0
+        self._stamp = 0
+
+    def access(self, addr, write=False):
+        """按地址访问缓存层次，返回访存延迟（周期）；缺失的各级都会被填充。"""
+        self._stamp += 1
+        if write:
+            self.writes += 1
+        else:
+            self.reads += 1
+        for level in self.levels:
+            if level.access(addr, self._stamp):
+                return level.latency
+        return self.memory_latency
+
+    def config(self):
+        """返回规范化的配置字典（新对象，可传给 `CacheHierarchy` 重建同样的层次）。"""
+        return {
+            "levels": [{"size": level.size, "assoc": level.assoc, "line": level.line, "latency": level.latency}
+                       for level in self.levels],
+            "memory_latency": self.memory_latency,
+        }
+
+    def copy(self):
+        """复制层次（配置、各级标签与 LRU 时间、计数），副本与原层次互不影响。"""
+        clone = CacheHierarchy(self.spec)
+        for level, source in zip(clone.levels, self.levels):
+            level.tags = array(source.tags.typecode, source.tags)
+            level.stamps = array(source.stamps.typecode, source.stamps)
+        clone.set_state(self.get_state())
+        return clone
+
+    def min_latency(self):
+        return min([level.latency for level in self.levels] + [self.memory_latency])
+
+    def stats(self):
+        """各级命中/缺失次数与命中率，以及访问总数。"""
+        levels = {}
+        for level in self.levels:
+            total = level.hits + level.misses
+            levels[level.name] = {"hits": level.hits, "misses": level.misses,
+                                  "hit_rate": level.hits / total if total else 0.0}
+        return {"reads": self.reads, "writes": self.writes, "levels": levels}
+
+    def get_state(self):
+        """可 JSON 序列化的计数与 LRU 时钟（各级的标签与时间数组由状态快照以二进制保存）。"""
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "stamp": self._stamp,
+            "levels": [{"hits": level.hits, "misses": level.misses} for level in self.levels],
+        }
+
+    def set_state(self, state):
+        if len(state["levels"]) != len(self.levels):
+            raise ValueError("缓存状态与配置的级数不一致")
+        self.reads = state["reads"]
+        self.writes = state["writes"]
+        self._stamp = state["stamp"]
+        for level, saved in zip(self.levels, state["levels"]):
+            level.hits = saved["hits"]
+            level.misses = saved["misses"]
+
+
+def main(argv=None):
+    # runner 经 tomasulo 导入本模块，因此在函数内导入
+    import runner
+    parser = argparse.ArgumentParser(description="比较固定访存延迟与缓存模型下的模拟结果")
+    parser.add_argument("program", help="指令文件")
+    parser.add_argument("--cache", help="缓存配置 JSON 文件（默认 DEFAULT_CACHE）")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    args = parser.parse_args(argv)
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    spec = DEFAULT_CACHE
+    if args.cache:
+        with open(args.cache) as f:
+            spec = json.load(f)
+    with open(args.program) as f:
+        program = f.read()
+    fixed = runner.simulate(program, dict(config, cache=None))
+    cached = runner.simulate(program, dict(config, cache=spec))
+    print(f"固定访存延迟：{fixed['cycles']} 个周期")
+    print(f"缓存模型：    {cached['cycles']} 个周期")
+    stats = cached["cache"]
+    print(f"访问：读 {stats['reads']}，写 {stats['writes']}")
+    for name, level in stats["levels"].items():
+        print(f"{name}: 命中 {level['hits']}，缺失 {level['misses']}，命中率 {level['hit_rate']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
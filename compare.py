@@ -0,0 +1,304 @@
+"""配置对比：用两种机器配置模拟同一程序，按动态指令对齐，给出逐条指令与逐指标的周期差。
+
+两次模拟分别在独立的工作进程中运行（`start_comparison`），每模拟 `chunk_cycles`
+个周期把新确定的时间表行（从上次报告处起连续已写回的前缀）与当前指标发回主进程。
+`ConfigComparison.feed()` 逐条接收这些消息，只处理新到达的行，并增量维护汇总
+（变快/变慢的指令数、写回周期差之和、差值最大的指令），因此两次运行仍在进行时
+界面就可以显示并滚动已对齐的部分。
+
+两种配置下程序的动态指令流相同（分支方向由寄存器值决定，与时序无关），因此按
+动态指令下标对齐；文本不一致时记入 `mismatches`。差值一律为 B − A，正数表示 B 更慢。
+
+配置覆盖写成以分号分隔的 `键=值`（`parse_overrides`）：
+- 操作名（如 `DIV=20`）：该操作的延迟。
+- `num_stations`、`issue_width`、`mispredict_penalty`、`issue_policy`、`branch_predictor`。
+- `fu.<类别>=N`：功能单元数量；`pipelined.<类别>=0/1`：是否流水化。
+
+用法：
+    python compare.py program.txt --b "DIV=20"
+    python compare.py program.txt --a "num_stations=10" --b "num_stations=5" --rows
+"""
+import argparse
+import multiprocessing
+import queue as queue_module
+import sys
+
+import runner
+from tomasulo import FU_CLASSES, TIMING_FIELDS, Tomasulo
+
+# 逐指标比较的指标名（顺序即显示顺序）
+METRICS = ("cycles", "instructions", "ipc", "issued", "completed", "rename_hits", "broadcasts",
+           "avg_busy_stations", "mispredicts")
+
+_INT_KEYS = ("num_stations", "issue_width", "mispredict_penalty")
+_STR_KEYS = ("issue_policy", "branch_predictor")
+
+
+def parse_overrides(text, base=None):
+    """把 "DIV=20; num_stations=5" 形式的覆盖应用到 `base` 配置的副本上并返回；格式错误时引发 ValueError。"""
+    config = Tomasulo.from_config(base or {}).get_config()
+    for item in text.replace("\n", ";").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = (part.strip() for part in item.partition("="))
+        if not sep or not key or not value:
+            raise ValueError(f"覆盖应写成 键=值: '{item}'")
+        if key in _STR_KEYS:
+            config[key] = value
+            continue
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f"{key} 需要整数值: '{item}'")
+        group, _, name = key.partition(".")
+        if key.upper() in config["op_latencies"]:
+            if number < 1:
+                raise ValueError(f"延迟必须为正: '{item}'")
+            config["op_latencies"][key.upper()] = number
+        elif key in _INT_KEYS:
+            config[key] = number
+        elif group in ("fu", "pipelined") and name.upper() in set(FU_CLASSES.values()):
+            target = config["fu_counts" if group == "fu" else "pipelined"]
+            target[name.upper()] = number if group == "fu" else bool(number)
+        else:
+            raise ValueError(f"未知的配置键: {key}")
+    # 由构造函数检查取值范围（保留站数、策略名等）
+    return Tomasulo.from_config(config).get_config()
+
+
+def side_metrics(t):
+    """一次运行的当前指标（见 `METRICS`）。"""
+    counters = t.counters
+    values = counters.values
+    cycles = values["cycles"]
+    busy = sum(k * n for k, n in enumerate(counters.occupancy))
+    return {
+        "cycles": t.clock,
+        "instructions": len(t.instruction_queue),
+        "ipc": values["completed"] / cycles if cycles else 0.0,
+        "issued": values["issued"],
+        "completed": values["completed"],
+        "rename_hits": values["rename_hits"],
+        "broadcasts": values["broadcasts"],
+        "avg_busy_stations": busy / cycles if cycles else 0.0,
+        "mispredicts": t.branch_stats["mispredicts"],
+    }
+
+
+def _run_side(side, program, config, state, max_cycles, chunk_cycles, out):
+    """工作进程入口：模拟一侧并分块发送 ("rows", 起始下标, 行列表, 指标)，最后发送 ("done", 指标)。"""
+    try:
+        t = runner.build_engine(program, config, state)
+    except ValueError as e:
+        out.put((side, "error", str(e)))
+        return
+    limit = runner.DEFAULT_MAX_CYCLES if max_cycles is None else max_cycles
+    queue = t.instruction_queue
+    reported = 0
+    while True:
+        t.run(max_cycles=min(t.clock + chunk_cycles, limit))
+        done = t.is_finished() or t.clock >= limit
+        # 指令乱序写回：只发送从上次报告处起连续已写回的前缀；结束时发送全部剩余行
+        frontier = reported
+        while frontier < len(queue) and (done or queue.timing_row(frontier)[-1] is not None):
+            frontier += 1
+        if frontier > reported or done:
+            rows = [(queue.text(i),) + queue.timing_row(i) for i in range(reported, frontier)]
+            out.put((side, "rows", reported, rows, side_metrics(t)))
+            reported = frontier
+        if done:
+            out.put((side, "done", side_metrics(t)))
+            return
+
+
+class ConfigComparison:
+    """增量对齐两次运行的时间表并维护差值汇总。"""
+
+    def __init__(self):
+        self.rows = {"a": [], "b": []}
+        self.metrics = {"a": {}, "b": {}}
+        self.done = {"a": False, "b": False}
+        self.errors = {}
+        self.aligned = 0            # 两侧都已到达的行数
+        self.mismatches = []        # 两侧文本不一致的行下标
+        self.faster = 0             # B 更早写回的指令数
+        self.slower = 0
+        self.write_delta_total = 0
+        self.max_delta = None       # (写回周期差, 行下标)，按绝对值取最大
+
+    @property
+    def finished(self):
+        return bool(self.errors) or all(self.done.values())
+
+    def feed(self, message):
+        """处理一条工作进程消息，返回本次新对齐的行下标范围 (起始, 结束)。"""
+        side, kind = message[0], message[1]
+        if kind == "error":
+            self.errors[side] = message[2]
+            return (self.aligned, self.aligned)
+        if kind == "done":
+            self.metrics[side] = message[2]
+            self.done[side] = True
+            return (self.aligned, self.aligned)
+        _, _, start, rows, metrics = message
+        own = self.rows[side]
+        if start != len(own):
+            raise ValueError(f"{side} 侧的行不连续: 期望 {len(own)}，收到 {start}")
+        own.extend(rows)
+        self.metrics[side] = metrics
+        first = self.aligned
+        self.aligned = min(len(self.rows["a"]), len(self.rows["b"]))
+        for i in range(first, self.aligned):
+            self._account(i)
+        return (first, self.aligned)
+
+    def _account(self, i):
+        a, b = self.rows["a"][i], self.rows["b"][i]
+        if a[0] != b[0]:
+            self.mismatches.append(i)
+        if a[-1] is None or b[-1] is None:
+            return
+        delta = b[-1] - a[-1]
+        self.write_delta_total += delta
+        if delta < 0:
+            self.faster += 1
+        elif delta > 0:
+            self.slower += 1
+        if self.max_delta is None or abs(delta) > abs(self.max_delta[0]):
+            self.max_delta = (delta, i)
+
+    def row(self, i):
+        """第 i 行：{"text", "a": 周期元组, "b": 周期元组, "delta": 各字段的 B − A（缺失为 None）}。"""
+        a, b = self.rows["a"][i], self.rows["b"][i]
+        delta = tuple(None if x is None or y is None else y - x for x, y in zip(a[1:], b[1:]))
+        return {"text": a[0], "a": a[1:], "b": b[1:], "delta": delta}
+
+    def metric_rows(self):
+        """逐指标比较：[(指标, A, B, B − A, 相对变化或 None)]，使用两侧最近一次报告的值。"""
+        rows = []
+        for name in METRICS:
+            a = self.metrics["a"].get(name)
+            b = self.metrics["b"].get(name)
+            if a is None or b is None:
+                rows.append((name, a, b, None, None))
+                continue
+            rows.append((name, a, b, b - a, (b - a) / a if a else None))
+        return rows
+
+    def summary(self):
+        return {
+            "aligned": self.aligned,
+            "faster": self.faster,
+            "slower": self.slower,
+            "same": self.aligned - self.faster - self.slower,
+            "write_delta_total": self.write_delta_total,
+            "max_delta": self.max_delta,
+            "mismatches": len(self.mismatches),
+        }
+
+
+class ComparisonRun:
+    """两个工作进程与它们的消息队列；`poll()` 把已到达的消息交给 `comparison`。"""
+
+    def __init__(self, program, config_a, config_b, state=None, max_cycles=None, chunk_cycles=2000):
+        ctx = multiprocessing.get_context()
+        self.comparison = ConfigComparison()
+        self._queue = ctx.Queue()
+        program = runner.normalize_program(program)
+        self._processes = [
+            ctx.Process(target=_run_side, args=(side, program, config, state, max_cycles,
+                                                chunk_cycles, self._queue), daemon=True)
+            for side, config in (("a", config_a), ("b", config_b))
+        ]
+        for process in self._processes:
+            process.start()
+
+    def poll(self, timeout=0.0, limit=None):
+        """处理最多 `limit` 条已到达的消息（首条最多等待 `timeout` 秒），返回新对齐的行范围。"""
+        comparison = self.comparison
+        first = comparison.aligned
+        handled = 0
+        while limit is None or handled < limit:
+            try:
+                message = self._queue.get(timeout=timeout) if timeout and not handled else self._queue.get_nowait()
+            except queue_module.Empty:
+                break
+            comparison.feed(message)
+            handled += 1
+        if not comparison.finished:
+            for process in self._processes:
+                # 进程异常退出（未发送 done/error）时记为错误，避免无限等待
+                if process.exitcode not in (None, 0):
+                    side = "a" if process is self._processes[0] else "b"
+                    comparison.errors.setdefault(side, f"工作进程退出码 {process.exitcode}")
+        return (first, comparison.aligned)
+
+    def wait(self):
+        while not self.comparison.finished:
+            self.poll(timeout=0.1)
+        self.close()
+        return self.comparison
+
+    def close(self):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def start_comparison(program, config_a, config_b, state=None, max_cycles=None, chunk_cycles=2000):
+    """启动两个工作进程并立即返回 `ComparisonRun`。"""
+    return ComparisonRun(program, config_a, config_b, state, max_cycles, chunk_cycles)
+
+
+def compare(program, config_a, config_b, state=None, max_cycles=None, chunk_cycles=2000):
+    """并行运行两种配置直到结束，返回 `ConfigComparison`。"""
+    return start_comparison(program, config_a, config_b, state, max_cycles, chunk_cycles).wait()
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用两种机器配置模拟同一程序并对比")
+    parser.add_argument("program", help="指令文件")
+    parser.add_argument("--a", default="", help="配置 A 的覆盖，例如 \"DIV=8\"")
+    parser.add_argument("--b", default="", help="配置 B 的覆盖，例如 \"DIV=20; num_stations=10\"")
+    parser.add_argument("--max-cycles", type=int, default=None)
+    parser.add_argument("--rows", action="store_true", help="同时列出每条指令的写回周期差")
+    args = parser.parse_args(argv)
+    try:
+        config_a = parse_overrides(args.a)
+        config_b = parse_overrides(args.b)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    with open(args.program) as f:
+        program = f.read()
+    comparison = compare(program, config_a, config_b, max_cycles=args.max_cycles)
+    if comparison.errors:
+        for side, message in sorted(comparison.errors.items()):
+            print(f"错误（{side.upper()}）: {message}", file=sys.stderr)
+        return 1
+    print(f"{'指标':<20}{'A':>12}{'B':>12}{'B-A':>12}{'变化':>10}")
+    for name, a, b, delta, ratio in comparison.metric_rows():
+        change = "-" if ratio is None else f"{ratio:+.1%}"
+        print(f"{name:<20}{_format(a):>12}{_format(b):>12}{_format(delta):>12}{change:>10}")
+    summary = comparison.summary()
+    print(f"B 更快 {summary['faster']} 条，更慢 {summary['slower']} 条，相同 {summary['same']} 条；"
+          f"写回周期差之和 {summary['write_delta_total']}")
+    if args.rows:
+        write = TIMING_FIELDS.index("write_cycle")
+        for i in range(comparison.aligned):
+            row = comparison.row(i)
+            print(f"{i + 1}\t{row['text']}\t{_format(row['a'][write])}\t{_format(row['b'][write])}\t"
+                  f"{_format(row['delta'][write])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""模拟器级性能计数器：累计计数、保留站占用直方图、广播扇出直方图与定长采样序列。
+
+`Tomasulo.counters` 是一个 `CounterRegistry`，由 `step()` 直接累加，不经过
+逐条消息的 `log()`。计数器：
+- `cycles`：已模拟的周期数。
+- `issued` / `started` / `completed`：发射到保留站、开始执行、写回（含退休的屏障）的指令数。
+- `barriers`：退休的 BARRIER 数。
+- `rename_lookups` / `rename_hits`：发射时查找寄存器或内存操作数的次数，以及其中
+  由重命名表转到尚未写回的生产者（等待 CDB 广播）的次数。
+- `broadcasts` / `broadcast_waiters`：CDB 广播次数，以及被广播唤醒的操作数所在的保留站总数。
+
+直方图：`occupancy[k]` 为周期结束时恰有 k 个保留站忙碌的周期数；`fanout[k]` 为
+唤醒了 k 个保留站的广播次数。
+
+每 `sample_interval` 个周期把全部累计计数追加到容量为 `capacity` 的环形缓冲区
+（最旧的样本被丢弃），设置了 `dump_path` 时同时把当前值原子写入该文件
+（后缀 `.json` 为 JSON，否则为 Prometheus 文本格式），便于在长时间的无界面运行中
+由外部程序（或 node_exporter 的 textfile 收集器）实时查看。
+"""
+import json
+import os
+import tempfile
+from array import array
+from collections import deque
+
+COUNTERS = ("cycles", "issued", "started", "completed", "barriers",
+            "rename_lookups", "rename_hits", "broadcasts", "broadcast_waiters")
+
+_HELP = {
+    "cycles": "已模拟的周期数",
+    "issued": "发射到保留站的指令数",
+    "started": "开始执行的指令数",
+    "completed": "写回（或退休）的指令数",
+    "barriers": "退休的屏障数",
+    "rename_lookups": "发射时的操作数查找次数",
+    "rename_hits": "经重命名表等待生产者的操作数查找次数",
+    "broadcasts": "CDB 广播次数",
+    "broadcast_waiters": "被 CDB 广播唤醒的保留站总数",
+}
+
+
+class CounterRegistry:
+    def __init__(self, num_stations, sample_interval=1000, capacity=1024):
+        self.num_stations = num_stations
+        self.sample_interval = sample_interval
+        self.capacity = capacity
+        self.dump_path = None
+        self.reset()
+
+    def reset(self):
+        self.values = dict.fromkeys(COUNTERS, 0)
+        self.occupancy = array("q", [0] * (self.num_stations + 1))
+        self.fanout = array("q", [0] * self.num_stations)
+        self.samples = deque(maxlen=self.capacity)
+
+    def end_cycle(self, clock, busy):
+        """周期结束时由引擎调用：累计周期数与占用直方图，必要时采样。"""
+        self.values["cycles"] += 1
+        self.occupancy[busy] += 1
+        if self.sample_interval and clock % self.sample_interval == 0:
+            self.sample(clock)
+
+    def record_broadcast(self, waiters):
+        values = self.values
+        values["broadcasts"] += 1
+        values["broadcast_waiters"] += waiters
+        self.fanout[min(waiters, len(self.fanout) - 1)] += 1
+
+    def sample(self, clock):
+        """把当前累计值追加到采样序列；设置了 `dump_path` 时写出一次。"""
+        self.samples.append((clock,) + tuple(self.values.values()))
+        if self.dump_path:
+            self.dump(self.dump_path)
+
+    # ---- 拉取接口 ----
+
+    def snapshot(self):
+        """返回当前值：{"counters": {...}, "occupancy": [...], "fanout": [...]}。"""
+        return {"counters": dict(self.values), "occupancy": list(self.occupancy), "fanout": list(self.fanout)}
+
+    def series(self):
+        """返回采样序列：{"columns": ["cycle", 计数器...], "rows": [[...], ...]}（从旧到新）。"""
+        return {"columns": ["cycle", *COUNTERS], "rows": [list(row) for row in self.samples]}
+
+    def to_json(self):
+        return json.dumps(dict(self.snapshot(), samples=self.series()))
+
+    def to_prometheus(self, prefix="tomasulo"):
+        """Prometheus 文本格式（计数器与按标签展开的直方图桶）。"""
+        lines = []
+        for name, value in self.values.items():
+            metric = f"{prefix}_{name}_total"
+            lines += [f"# HELP {metric} {_HELP[name]}", f"# TYPE {metric} counter", f"{metric} {value}"]
+        for metric, label, buckets, help_text in (
+            (f"{prefix}_station_occupancy_cycles_total", "busy", self.occupancy, "周期结束时忙碌保留站数为 busy 的周期数"),
+            (f"{prefix}_broadcast_fanout_total", "waiters", self.fanout, "唤醒了 waiters 个保留站的广播次数"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{{label}="{k}"}} {count}' for k, count in enumerate(buckets)]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """原子写出当前值；后缀为 .json 时写 JSON，否则写 Prometheus 文本格式。"""
+        data = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -0,0 +1,217 @@
+"""静态数据流分析：在模拟之前基于已解析的指令列表构建依赖图并计算关键路径。
+
+分析只做一次线性扫描，使用按寄存器和按内存地址的"最后写者/读者"表
+得到 RAW/WAR/WAW 依赖，并在给定 `op_latencies` 下求出数据流关键路径。
+关键路径长度是 `Tomasulo.step()` 所需周期数的下界（寄存器重命名消除了
+WAR/WAW，因此只有 RAW 依赖参与关键路径）。
+"""
+from ops import FU_CLASSES, OPS
+
+
+def instruction_resources(parsed):
+    """返回 (写寄存器, 读寄存器列表, 读内存地址, 写内存地址)。"""
+    spec = OPS.get(parsed.get("op"))
+    if spec is None:
+        return parsed.get("dest"), (parsed.get("src1"), parsed.get("src2")), None, None
+    if spec.kind == "load":
+        return parsed.get("dest"), (), parsed.get("addr"), None
+    if spec.kind == "store":
+        return None, (parsed.get("src"),), None, parsed.get("addr")
+    return parsed.get("dest"), tuple(parsed[key] for key in spec.sources), None, None
+
+
+def analyze_dataflow(parsed_instructions, op_latencies, num_stations=None, keep_edges=True,
+                     issue_width=None, fu_counts=None, pipelined=None):
+    """分析已解析指令列表的数据流依赖。
+
+    计时模型与 `Tomasulo.step()` 一致：无依赖的指令最早在周期 1 开始执行，
+    在 开始 + 延迟 的周期写回；依赖者最早在生产者写回的周期开始执行。
+    若给出 `num_stations`，还会计算保留站容量下界（每条指令至少占用一个
+    保留站 延迟+1 个周期）；给出 `issue_width`、`fu_counts`/`pipelined`
+    （含义同 `Tomasulo` 构造参数）时同样计入发射宽度与功能单元容量下界。
+
+    返回字典，包含依赖边、关键路径（指令下标列表）、周期下界和可用并行度。
+    """
+    reg_writer = {}    # reg -> 最后写者下标
+    reg_readers = {}   # reg -> 自最后一次写以来的读者下标
+    mem_writer = {}    # addr -> 最后写者下标
+    mem_readers = {}   # addr -> 自最后一次写以来的读者下标
+    edges = []
+    edge_counts = {"RAW": 0, "WAR": 0, "WAW": 0}
+
+    earliest_start = []
+    earliest_write = []
+    critical_pred = []
+    total_work = 0
+    station_cycles = 0
+    min_latency = None
+    issued_count = 0   # 占用保留站的指令数（不含屏障）
+    fence = 1          # 最近一个屏障之后的指令最早开始执行的周期
+    fence_index = -1   # 最近一个屏障的下标
+    latest = -1        # 写回最晚的指令下标
+    fu_ops = {}        # 功能单元类别 -> [操作数, 延迟之和, 最小延迟]
+
+    def _add_edge(src, dst, kind, resource):
+        edge_counts[kind] += 1
+        if keep_edges:
+            edges.append((src, dst, kind, resource))
+
+    for i, parsed in enumerate(parsed_instructions):
+        if parsed.get("op") == "BARRIER":
+            # 屏障在所有更早的指令写回后的下一周期退休
+            if latest != -1 and earliest_write[latest] + 1 > fence:
+                fence = earliest_write[latest] + 1
+                critical_pred.append(latest)
+            else:
+                critical_pred.append(fence_index)
+            fence_index = i
+            earliest_start.append(fence)
+            earliest_write.append(fence)
+            continue
+        latency = op_latencies.get(parsed.get("op"), 3)
+        dest, srcs, mem_read, mem_write = instruction_resources(parsed)
+
+        ready = fence
+        pred = fence_index
+        # RAW：读寄存器/读内存依赖最后写者
+        for reg in srcs:
+            producer = reg_writer.get(reg)
+            if producer is not None:
+                _add_edge(producer, i, "RAW", reg)
+                if earliest_write[producer] > ready:
+                    ready = earliest_write[producer]
+                    pred = producer
+            reg_readers.setdefault(reg, []).append(i)
+        if mem_read is not None:
+            producer = mem_writer.get(mem_read)
+            if producer is not None:
+                _add_edge(producer, i, "RAW", mem_read)
+                if earliest_write[producer] > ready:
+                    ready = earliest_write[producer]
+                    pred = producer
+            mem_readers.setdefault(mem_read, []).append(i)
+
+        # WAR/WAW：写寄存器/写内存与之前的读者和写者冲突
+        for table_w, table_r, res in ((reg_writer, reg_readers, dest), (mem_writer, mem_readers, mem_write)):
+            if res is None:
+                continue
+            for reader in table_r.pop(res, ()):
+                if reader != i:
+                    _add_edge(reader, i, "WAR", res)
+            previous = table_w.get(res)
+            if previous is not None:
+                _add_edge(previous, i, "WAW", res)
+            table_w[res] = i
+
+        earliest_start.append(ready)
+        earliest_write.append(ready + latency)
+        critical_pred.append(pred)
+        if latest == -1 or ready + latency > earliest_write[latest]:
+            latest = i
+        total_work += latency
+        station_cycles += latency + 1
+        issued_count += 1
+        if min_latency is None or latency < min_latency:
+            min_latency = latency
+        if fu_counts:
+            fu_class = FU_CLASSES.get(parsed.get("op"))
+            if fu_class in fu_counts:
+                stats = fu_ops.setdefault(fu_class, [0, 0, latency])
+                stats[0] += 1
+                stats[1] += latency
+                stats[2] = min(stats[2], latency)
+
+    count = len(earliest_write)
+    if count == 0:
+        return {
+            "count": 0, "edges": edges, "edge_counts": edge_counts, "critical_path": [],
+            "critical_path_cycles": 0, "resource_bound": 0, "lower_bound": 0, "total_work": 0,
+            "average_parallelism": 0.0, "max_parallelism": 0,
+            "earliest_start": earliest_start, "earliest_write": earliest_write,
+        }
+
+    # 回溯关键路径
+    last = max(range(count), key=earliest_write.__getitem__)
+    critical_path_cycles = earliest_write[last]
+    path = []
+    node = last
+    while node != -1:
+        path.append(node)
+        node = critical_pred[node]
+    path.reverse()
+
+    resource_bound = 0
+    if num_stations:
+        resource_bound = -(-station_cycles // num_stations)
+    if issue_width and issued_count:
+        # 最后一条指令最早在周期 ceil(n/w) 发射
+        resource_bound = max(resource_bound, -(-issued_count // issue_width) + min_latency)
+    for fu_class, (ops, latency_sum, fu_min_latency) in fu_ops.items():
+        units = fu_counts[fu_class]
+        if (pipelined or {}).get(fu_class, True):
+            # 每个流水化单元每周期只能开始一个操作
+            bound = -(-ops // units) + fu_min_latency
+        else:
+            # 非流水化单元在整个执行延迟内被占用
+            bound = 1 + -(-latency_sum // units)
+        resource_bound = max(resource_bound, bound)
+
+    # ASAP 调度下同时执行的指令数峰值（执行区间为 [start, write)）
+    events = []
+    for start, write in zip(earliest_start, earliest_write):
+        if start == write:
+            continue   # 屏障不执行
+        events.append((start, 1))
+        events.append((write, -1))
+    events.sort()
+    running = 0
+    max_parallelism = 0
+    for _, delta in events:
+        running += delta
+        if running > max_parallelism:
+            max_parallelism = running
+
+    # 执行区间长度之和 / 关键路径执行跨度
+    span = critical_path_cycles - 1
+    return {
+        "count": count,
+        "edges": edges,
+        "edge_counts": edge_counts,
+        "critical_path": path,
+        "critical_path_cycles": critical_path_cycles,
+        "resource_bound": resource_bound,
+        "lower_bound": max(critical_path_cycles, resource_bound),
+        "total_work": total_work,
+        "average_parallelism": (total_work / span) if span > 0 else 0.0,
+        "max_parallelism": max_parallelism,
+        "earliest_start": earliest_start,
+        "earliest_write": earliest_write,
+    }
+
+
+def lower_bound_cycles(parsed_instructions, op_latencies, num_stations=None,
+                       issue_width=None, fu_counts=None, pipelined=None):
+    """只返回周期下界（不保留依赖边）。"""
+    report = analyze_dataflow(parsed_instructions, op_latencies, num_stations, keep_edges=False,
+                              issue_width=issue_width, fu_counts=fu_counts, pipelined=pipelined)
+    return report["lower_bound"]
+
+
+def prune_configurations(parsed_instructions, configs, best_cycles):
+    """从扫描配置中剔除下界已不可能优于 `best_cycles` 的配置。
+
+    每个配置是 `Tomasulo.get_config()` 格式的字典（缺省的键取默认值）。延迟取
+    `Tomasulo.min_latencies()`：延迟模型与缓存按可能的最小延迟计算，下界不会高于实际周期数。
+    返回保留下来的 (config, lower_bound) 列表。
+    """
+    # tomasulo 导入本模块，因此在函数内导入
+    from tomasulo import Tomasulo
+    parsed_instructions = list(parsed_instructions)
+    kept = []
+    for config in configs:
+        latencies = Tomasulo.from_config(config).min_latencies()
+        bound = lower_bound_cycles(parsed_instructions, latencies, config.get("num_stations"),
+                                   config.get("issue_width"), config.get("fu_counts"), config.get("pipelined"))
+        if bound < best_cycles:
+            kept.append((config, bound))
+    return kept
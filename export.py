@@ -0,0 +1,252 @@
+"""导出每条动态指令的时间表与逐周期指标：流式 CSV、列式二进制文件、NumPy 结构化数组。
+
+数据源可以是 `Tomasulo` 实例（直接读取 `instruction_queue` 的归档数组），也可以是 `runner`
+的结果字典（读取 `timing`）。所有导出都逐行遍历数据源，不构造中间的字典
+列表；列式导出按行组缓冲定长数组，峰值内存只与行组大小有关。
+
+列式文件（.tcol）布局，类似 Parquet 的行组 + 尾部元数据：
+    b"TCOL"
+    行组 0：各列原始数据依次存放（小端序 array）
+    行组 1 ...
+    尾部 JSON：行数、列名与类型、每个行组的行数与各列偏移、去重后的指令文本表
+    <Q 尾部长度> b"TCOL"
+
+列：`text_id`（指令文本在文本表中的下标，int32）以及 `issue_cycle`、
+`exec_start_cycle`、`exec_complete`、`write_cycle`（int64，未记录为 -1）。
+读取时可只读取需要的列（`read_columnar(path, columns=[...])`）。
+
+逐周期指标（`cycle_metrics`）由时间表用差分数组计算：每周期发射、开始执行、
+执行完成、写回的指令数，以及在途指令数（已发射未写回，即占用保留站的指令数）。
+
+用法：
+    python export.py program.txt --csv timing.csv --columnar timing.tcol --metrics-csv cycles.csv
+    python export.py big.txt --columnar timing.tcol --counters live.prom --sample-interval 10000
+
+`--counters` 在运行过程中每 `--sample-interval` 个周期把性能计数器写入该文件
+（见 counters.py），运行结束后再写一次最终值。
+"""
+import argparse
+import csv
+import json
+import struct
+import sys
+from array import array
+
+from runner import TIMING_FIELDS
+
+MAGIC = b"TCOL"
+FORMAT_VERSION = 1
+COLUMNS = (("text_id", "i"),) + tuple((field, "q") for field in TIMING_FIELDS)
+METRIC_COLUMNS = ("cycle", "issued", "started", "completed", "written", "in_flight")
+_TAIL = struct.Struct("<Q")
+_NUMPY_TYPES = {"i": "<i4", "q": "<i8"}
+
+
+def iter_timing(source):
+    """逐条产生 (文本, 发射, 开始执行, 执行完成, 写回)，未记录的周期为 None。"""
+    if isinstance(source, dict):
+        for row in source["timing"]:
+            yield tuple(row)
+        return
+    yield from source.instruction_queue.iter_timing()
+
+
+def write_csv(source, path):
+    """流式写出时间表 CSV，返回行数。"""
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("index", "text") + TIMING_FIELDS)
+        for count, (text, *cycles) in enumerate(iter_timing(source), start=1):
+            writer.writerow([count - 1, text] + ["" if c is None else c for c in cycles])
+    return count
+
+
+def _le_bytes(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_columnar(source, path, row_group_size=65536):
+    """写出列式二进制时间表，返回行数。"""
+    texts = {}
+    row_groups = []
+    rows = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+
+        def _flush(columns):
+            offsets = []
+            for arr in columns:
+                offsets.append(f.tell())
+                f.write(_le_bytes(arr))
+            row_groups.append({"rows": len(columns[0]), "offsets": offsets})
+
+        columns = [array(code) for _, code in COLUMNS]
+        text_ids, *cycle_columns = columns
+        for text, *cycles in iter_timing(source):
+            text_ids.append(texts.setdefault(text, len(texts)))
+            for column, c in zip(cycle_columns, cycles):
+                column.append(-1 if c is None else c)
+            rows += 1
+            if len(text_ids) >= row_group_size:
+                _flush(columns)
+                columns = [array(code) for _, code in COLUMNS]
+                text_ids, *cycle_columns = columns
+        if len(text_ids):
+            _flush(columns)
+
+        footer = json.dumps({
+            "version": FORMAT_VERSION,
+            "rows": rows,
+            "columns": [{"name": name, "type": code} for name, code in COLUMNS],
+            "row_groups": row_groups,
+            "texts": list(texts),
+        }).encode("utf-8")
+        f.write(footer)
+        f.write(_TAIL.pack(len(footer)) + MAGIC)
+    return rows
+
+
+def read_columnar_footer(f):
+    """读取已打开列式文件的尾部元数据。"""
+    f.seek(-(_TAIL.size + len(MAGIC)), 2)
+    tail = f.read(_TAIL.size + len(MAGIC))
+    if tail[_TAIL.size:] != MAGIC:
+        raise ValueError("不是列式时间表文件")
+    (footer_len,) = _TAIL.unpack(tail[:_TAIL.size])
+    f.seek(-(_TAIL.size + len(MAGIC) + footer_len), 2)
+    footer = json.loads(f.read(footer_len))
+    if footer.get("version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的列式文件版本: {footer.get('version')}")
+    return footer
+
+
+def read_columnar(path, columns=None):
+    """读取列式文件，返回 ({列名: array}, 文本表)。`columns` 可限定只读取部分列。"""
+    with open(path, "rb") as f:
+        footer = read_columnar_footer(f)
+        schema = [(i, c["name"], c["type"]) for i, c in enumerate(footer["columns"])
+                  if columns is None or c["name"] in columns]
+        result = {name: array(code) for _, name, code in schema}
+        for group in footer["row_groups"]:
+            for i, name, code in schema:
+                arr = result[name]
+                f.seek(group["offsets"][i])
+                arr.frombytes(f.read(group["rows"] * arr.itemsize))
+    if sys.byteorder == "big":
+        for arr in result.values():
+            arr.byteswap()
+    return result, footer["texts"]
+
+
+def to_numpy(source):
+    """返回 (NumPy 结构化数组, 文本表)。`source` 也可以是列式文件路径。
+
+    字段与列式文件相同；未记录的周期为 -1。需要安装 numpy。
+    """
+    import numpy as np
+
+    dtype = np.dtype([(name, _NUMPY_TYPES[code]) for name, code in COLUMNS])
+    if isinstance(source, str):
+        columns, texts = read_columnar(source)
+        table = np.empty(len(columns["text_id"]), dtype=dtype)
+        for name, code in COLUMNS:
+            table[name] = np.frombuffer(columns[name], dtype=code)
+        return table, texts
+
+    texts = {}
+
+    def _rows():
+        for text, *cycles in iter_timing(source):
+            yield (texts.setdefault(text, len(texts)),) + tuple(-1 if c is None else c for c in cycles)
+
+    count = len(source["timing"]) if isinstance(source, dict) else len(source.instruction_queue)
+    table = np.fromiter(_rows(), dtype=dtype, count=count)
+    return table, list(texts)
+
+
+def cycle_metrics(source):
+    """由时间表计算逐周期指标，返回 {列名: array("q")}，第 i 行对应周期 i+1。"""
+    issued, started, completed, written = (array("q") for _ in range(4))
+    counters = (issued, started, completed, written)
+
+    def _bump(column, cycle):
+        if cycle is None:
+            return
+        if cycle > len(column):
+            column.extend([0] * (cycle - len(column)))
+        column[cycle - 1] += 1
+
+    for _text, *cycles in iter_timing(source):
+        for column, cycle in zip(counters, cycles):
+            _bump(column, cycle)
+
+    length = max(len(column) for column in counters)
+    for column in counters:
+        column.extend([0] * (length - len(column)))
+    # 在途指令：发射周期起占用保留站，写回周期之后释放（上一周期的写回数在本周期扣除）
+    in_flight = array("q")
+    running = previous_written = 0
+    for i, w in zip(issued, written):
+        running += i - previous_written
+        in_flight.append(running)
+        previous_written = w
+    return {
+        "cycle": array("q", range(1, length + 1)),
+        "issued": issued,
+        "started": started,
+        "completed": completed,
+        "written": written,
+        "in_flight": in_flight,
+    }
+
+
+def write_metrics_csv(source, path):
+    """写出逐周期指标 CSV，返回周期数。"""
+    metrics = cycle_metrics(source)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(METRIC_COLUMNS)
+        writer.writerows(zip(*(metrics[name] for name in METRIC_COLUMNS)))
+    return len(metrics["cycle"])
+
+
+def main(argv=None):
+    import runner
+
+    parser = argparse.ArgumentParser(description="运行程序并导出时间表与逐周期指标")
+    parser.add_argument("program", help="指令文件")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    parser.add_argument("--max-cycles", type=int, default=None)
+    parser.add_argument("--csv", help="时间表 CSV 输出路径")
+    parser.add_argument("--columnar", help="列式二进制输出路径")
+    parser.add_argument("--metrics-csv", help="逐周期指标 CSV 输出路径")
+    parser.add_argument("--counters", help="性能计数器输出路径（.json 为 JSON，否则为 Prometheus 文本格式）")
+    parser.add_argument("--sample-interval", type=int, default=1000, help="计数器采样间隔（周期）")
+    args = parser.parse_args(argv)
+
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    with open(args.program) as f:
+        t = runner.build_engine(f.read(), config)
+    t.counters.sample_interval = args.sample_interval
+    t.counters.dump_path = args.counters
+    t.run(max_cycles=args.max_cycles or runner.DEFAULT_MAX_CYCLES)
+    if args.counters:
+        t.counters.sample(t.clock)
+    print(f"模拟完成：{len(t.instruction_queue)} 条动态指令，{t.clock} 个周期")
+    if args.csv:
+        write_csv(t, args.csv)
+    if args.columnar:
+        write_columnar(t, args.columnar)
+    if args.metrics_csv:
+        write_metrics_csv(t, args.metrics_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""差分模糊测试：比较乱序 `step()` 引擎与顺序参考解释器的最终状态。
+
+每个用例由一个整数种子完全确定：随机程序（`workload.generate_program`，
+寄存器与地址集合较小以制造大量冒险）、随机的初始寄存器/内存映像和随机的
+机器配置（操作延迟、保留站数量、发射宽度、功能单元数量与流水化、发射策略、
+分支预测器、依赖操作数的提前结束延迟模型、随机的缓存层次）。部分用例把程序包在一个计数循环中，
+以覆盖分支与惰性取指；部分用例插入屏障（BARRIER）；部分用例加入 FMA、SQRT
+与整数运算。参考结果由 `Tomasulo.execute_instruction` 按程序
+顺序得到，与 `Tomasulo.run()` 的结果比较最终寄存器和内存。
+
+发现不一致时用 delta debugging 把程序收缩为最小失败用例。
+用例按种子区间分块，通过进程池并行执行，可扩展到数百万用例。
+
+用法：
+    python fuzz.py --cases 1000000 --workers 8
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from tomasulo import BRANCH_PREDICTORS, FU_CLASSES, ISSUE_POLICIES, Tomasulo
+from workload import DEFAULT_OP_MIX, generate_program
+
+# 扩展操作：三源 FMA、单源 SQRT 与整数运算
+EXTENDED_OP_MIX = dict(DEFAULT_OP_MIX, FMA=2, SQRT=1, AND=1, XOR=1, SHL=1, SHR=1)
+
+
+def make_case(seed, max_length=16):
+    """由种子生成 (程序行列表, 初始状态, 机器配置)。"""
+    rng = random.Random(seed)
+    length = rng.randint(1, max_length)
+    looped = rng.random() < 0.3
+    # 循环体中连续的 MUL 会使整数位数指数级增长，因此循环用例不生成 MUL
+    op_mix = {"ADD": 3, "SUB": 2, "DIV": 1, "LOAD": 2, "STORE": 1} if looped else None
+    if not looped and rng.random() < 0.3:
+        op_mix = dict(EXTENDED_OP_MIX)
+    program = list(generate_program(
+        length,
+        seed=rng.getrandbits(32),
+        op_mix=op_mix,
+        num_registers=rng.randint(2, 8),
+        address_range=(0, rng.randint(1, 8)),
+        dep_probability=rng.random(),
+        dep_distance=rng.uniform(1.0, 4.0),
+    ))
+    if rng.random() < 0.2:
+        # 屏障只影响计时，最终状态必须与顺序执行一致
+        for _ in range(rng.randint(1, 2)):
+            program.insert(rng.randint(0, len(program)), "BARRIER")
+    state = {
+        "registers": {f"F{i}": rng.randint(-9, 9) for i in range(1, 33)},
+        "memory": {a: rng.randint(-9, 9) for a in range(8)},
+    }
+    if looped:
+        # 计数循环：F30 从 0 递增到 F32，循环体只使用 F1..F8，不会改写循环控制寄存器
+        state["registers"].update({"F30": 0, "F31": 1, "F32": rng.randint(1, 4)})
+        program = ["loop:"] + program + ["ADD F30 F30 F31", "BNE F30 F32 loop"]
+    classes = sorted(set(FU_CLASSES.values()))
+    config = {
+        "op_latencies": {op: rng.randint(1, 10) for op in FU_CLASSES},
+        "num_stations": rng.randint(1, 6),
+        "issue_width": rng.choice([None, 1, 2, 3]),
+        "fu_counts": {c: rng.randint(1, 2) for c in classes if rng.random() < 0.5},
+        "pipelined": {c: rng.random() < 0.5 for c in classes},
+        "issue_policy": rng.choice(ISSUE_POLICIES),
+        "branch_predictor": rng.choice(BRANCH_PREDICTORS),
+        "mispredict_penalty": rng.randint(0, 3),
+    }
+    if rng.random() < 0.2:
+        # 提前结束只会缩短延迟，因此 run_engine 的周期上限仍然成立
+        config["latency_models"] = {op: {"model": "early_out", "fast": rng.randint(1, 3)}
+                                    for op in ("MUL", "DIV", "FMA") if rng.random() < 0.6}
+    if rng.random() < 0.2:
+        # 容量很小的缓存，使 LOAD/STORE 的延迟随命中与缺失变化
+        levels = []
+        latency = 0
+        for _ in range(rng.randint(1, 2)):
+            assoc, line = rng.choice([1, 2]), rng.choice([1, 2, 4])
+            latency += rng.randint(1, 4)
+            levels.append({"size": assoc * line * rng.choice([1, 2, 4]), "assoc": assoc, "line": line,
+                           "latency": latency})
+        config["cache"] = {"levels": levels, "memory_latency": latency + rng.randint(1, 12)}
+    return program, state, config
+
+
+def _apply_state(t, state):
+    for reg, value in state["registers"].items():
+        t.registers[reg]["value"] = value
+    t.memory.update(state["memory"])
+
+
+def run_reference(program, state, max_steps=10000):
+    """用顺序参考解释器执行程序，返回 (寄存器值, 内存)；超过 `max_steps` 条动态指令时返回 None。"""
+    t = Tomasulo()
+    _apply_state(t, state)
+    instructions = []
+    labels = {}
+    for line in program:
+        line_labels, text, _parsed = t.parse_program_line(line)
+        for label in line_labels:
+            labels[label] = len(instructions)
+        if text is not None:
+            instructions.append(text)
+    pc = 0
+    steps = 0
+    while pc < len(instructions):
+        steps += 1
+        if steps > max_steps:
+            return None
+        taken = t.execute_instruction(instructions[pc])
+        pc = labels[t.parse_instruction_text(instructions[pc])["target"]] if taken else pc + 1
+    return {reg: data["value"] for reg, data in t.registers.items()}, t.memory
+
+
+def run_engine(program, state, config, engine_factory=Tomasulo):
+    """用乱序引擎执行程序，返回 (寄存器值, 内存, 是否在周期上限内完成)。
+
+    `config` 为 `Tomasulo.get_config()` 格式的机器配置（可只含部分键）。
+    """
+    t = engine_factory.from_config(config)
+    _apply_state(t, state)
+    t.load_program(program)
+    # 完全串行执行（含预测错误惩罚）的周期数也不会超过此上限；超过即视为死锁
+    dynamic = len(program) * (1 + state["registers"].get("F32", 0) if t.program is not None else 1)
+    max_latency = max(list(t.op_latencies.values()) + ([t.cache.memory_latency] if t.cache else []))
+    limit = (max_latency + t.mispredict_penalty + 3) * (dynamic + 1) + 10
+    t.run(max_cycles=limit)
+    return {reg: data["value"] for reg, data in t.registers.items()}, t.memory, t.is_finished()
+
+
+def _same(a, b):
+    if a == b:
+        return True
+    return isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b)
+
+
+def diff_states(expected, actual):
+    """返回两个 (寄存器, 内存) 状态之间的差异描述列表。"""
+    exp_regs, exp_mem = expected
+    act_regs, act_mem = actual
+    if exp_regs == act_regs and exp_mem == act_mem:
+        return []
+    diffs = []
+    for reg, value in exp_regs.items():
+        if not _same(value, act_regs.get(reg)):
+            diffs.append(f"{reg}: 期望 {value}, 实际 {act_regs.get(reg)}")
+    for addr in sorted(set(exp_mem) | set(act_mem)):
+        if not _same(exp_mem.get(addr, 0), act_mem.get(addr, 0)):
+            diffs.append(f"M[{addr}]: 期望 {exp_mem.get(addr, 0)}, 实际 {act_mem.get(addr, 0)}")
+    return diffs
+
+
+def check_program(program, state, config, engine_factory=Tomasulo):
+    """返回差异列表；空列表表示两个引擎一致（或程序本身无效/不终止，无从比较）。"""
+    try:
+        expected = run_reference(program, state)
+    except (ValueError, KeyError):
+        # 收缩过程中可能删掉标签或循环控制指令
+        return []
+    if expected is None:
+        return []
+    regs, mem, finished = run_engine(program, state, config, engine_factory)
+    if not finished:
+        return ["引擎未在周期上限内完成（可能死锁）"]
+    return diff_states(expected, (regs, mem))
+
+
+def shrink(program, fails):
+    """Delta debugging：返回使 `fails(program)` 仍为真的最小程序（1-最小）。"""
+    program = list(program)
+    n = 2
+    while len(program) >= 2:
+        chunk = max(1, len(program) // n)
+        reduced = False
+        for start in range(0, len(program), chunk):
+            candidate = program[:start] + program[start + chunk:]
+            if candidate and fails(candidate):
+                program = candidate
+                n = max(n - 1, 2)
+                reduced = True
+                break
+        if not reduced:
+            if chunk == 1:
+                break
+            n = min(n * 2, len(program))
+    return program
+
+
+def check_case(seed, max_length=16, engine_factory=Tomasulo):
+    """运行一个种子用例；一致时返回 None，否则返回收缩后的失败报告。"""
+    program, state, config = make_case(seed, max_length)
+    diffs = check_program(program, state, config, engine_factory)
+    if not diffs:
+        return None
+    minimal = shrink(program, lambda p: bool(check_program(p, state, config, engine_factory)))
+    return {
+        "seed": seed,
+        "program": minimal,
+        "original_length": len(program),
+        "config": config,
+        "diffs": check_program(minimal, state, config, engine_factory),
+    }
+
+
+def _check_range(args):
+    start, stop, max_length = args
+    failures = []
+    for seed in range(start, stop):
+        failure = check_case(seed, max_length)
+        if failure is not None:
+            failures.append(failure)
+    return stop - start, failures
+
+
+def run_fuzz(cases, workers=1, start_seed=0, max_length=16, chunk_size=2000, max_failures=10, progress=None):
+    """并行运行 `cases` 个用例，返回失败报告列表（最多 `max_failures` 个）。
+
+    `progress(done, cases)` 在每个分块完成后被调用。
+    """
+    tasks = [(s, min(s + chunk_size, start_seed + cases), max_length)
+             for s in range(start_seed, start_seed + cases, chunk_size)]
+    failures = []
+    done = 0
+    if workers <= 1:
+        results = map(_check_range, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_check_range, tasks)
+    try:
+        for count, chunk_failures in results:
+            done += count
+            failures.extend(chunk_failures)
+            if progress:
+                progress(done, cases)
+            if len(failures) >= max_failures:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    return failures[:max_failures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="乱序引擎与顺序参考解释器的差分模糊测试")
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--start-seed", type=int, default=0)
+    parser.add_argument("--max-length", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def _progress(done, total):
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        print(f"\r{done}/{total} 用例 ({rate:.0f}/s)", end="", file=sys.stderr)
+
+    failures = run_fuzz(args.cases, args.workers, args.start_seed, args.max_length, args.chunk_size,
+                        progress=_progress)
+    print(file=sys.stderr)
+    for failure in failures:
+        print(f"种子 {failure['seed']}：{failure['original_length']} 条指令收缩为 {len(failure['program'])} 条，配置 {failure['config']}")
+        for line in failure["program"]:
+            print(f"    {line}")
+        for d in failure["diffs"]:
+            print(f"  {d}")
+    if failures:
+        return 1
+    print("未发现不一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""动态指令记录：`Tomasulo.instruction_queue` 的紧凑存储。
+
+每条动态指令在归档中只占定长数组的一格：文本下标（array "I"，指向去重后的
+文本表）、四个周期字段（array "q"，未记录为 -1）与标志位（array "B"）。
+只有活动窗口中的指令（已被访问的待发射指令与在途指令）才保留完整的条目字典；
+指令写回后由引擎调用 `retire()`，把周期写入数组并丢弃字典。因此引擎的活动
+结构大小只与在途指令数有关，与已退休的指令数无关。
+
+对外仍表现为列表：`len()`、下标、切片、迭代与 `==` 比较。访问已退休的指令
+返回由归档重建的只读快照字典；界面与导出应优先使用 `timing_row()`、
+`iter_timing()` 等直接读取数组的接口。
+"""
+from array import array
+
+TIMING_FIELDS = ("issue_cycle", "exec_start_cycle", "exec_complete", "write_cycle")
+
+# 标志位
+RETIRED = 1
+BRANCH = 2
+TAKEN = 4
+MISPREDICTED = 8
+
+_UNSET = (-1,) * len(TIMING_FIELDS)
+
+
+class InstructionLog:
+    def __init__(self):
+        self.texts = []             # 去重后的指令文本表
+        self._parsed = []           # 与文本表平行的已解析字典（同文本的动态指令共享）
+        self._text_index = {}       # 文本 -> 文本表下标
+        self.text_ids = array("I")
+        self.cycles = array("q")    # 每条指令 len(TIMING_FIELDS) 个周期
+        self.flags = array("B")
+        self._live = {}             # 下标 -> 条目字典（活动窗口）
+
+    def _intern(self, text, parsed):
+        text_id = self._text_index.get(text)
+        if text_id is None:
+            text_id = self._text_index[text] = len(self.texts)
+            self.texts.append(text)
+            self._parsed.append(parsed)
+        return text_id
+
+    def add(self, text, parsed):
+        """追加一条尚未发射的指令；首次访问时才创建条目字典。"""
+        self.text_ids.append(self._intern(text, parsed))
+        self.cycles.extend(_UNSET)
+        self.flags.append(0)
+
+    def append(self, entry):
+        """追加一条已有条目字典的指令（如取指前端产生的带分支信息的条目）。"""
+        self.add(entry["text"], entry["parsed"])
+        self._live[len(self.text_ids) - 1] = entry
+
+    def retire(self, index):
+        """把已写回的指令移出活动窗口，周期与分支信息写入归档数组。"""
+        entry = self._live.pop(index, None)
+        if entry is None:
+            return
+        base = index * len(TIMING_FIELDS)
+        for k, field in enumerate(TIMING_FIELDS):
+            value = entry[field]
+            self.cycles[base + k] = -1 if value is None else value
+        flags = RETIRED
+        if "taken" in entry:
+            flags |= BRANCH | (TAKEN if entry["taken"] else 0) | (MISPREDICTED if entry.get("mispredicted") else 0)
+        self.flags[index] = flags
+
+    def snapshot(self):
+        """返回用于比较的只读副本：复制定长数组与活动条目，文本表与已解析字典共享（只追加，不修改）。"""
+        other = InstructionLog.__new__(InstructionLog)
+        other.texts = self.texts
+        other._parsed = self._parsed
+        other._text_index = self._text_index
+        other.text_ids = array("I", self.text_ids)
+        other.cycles = array("q", self.cycles)
+        other.flags = array("B", self.flags)
+        other._live = {index: dict(entry) for index, entry in self._live.items()}
+        return other
+
+    @property
+    def live_count(self):
+        """活动窗口中的条目字典数。"""
+        return len(self._live)
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    def __getitem__(self, index):
+        entry = self._live.get(index) if type(index) is int else None
+        if entry is not None:
+            return entry
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+            if index in self._live:
+                return self._live[index]
+        if not 0 <= index < len(self):
+            raise IndexError("instruction index out of range")
+        text_id = self.text_ids[index]
+        flags = self.flags[index]
+        if not flags & RETIRED:
+            # 待发射指令：条目由引擎修改（issued 与各周期），因此放入活动窗口
+            entry = self._live[index] = {
+                "text": self.texts[text_id],
+                "parsed": self._parsed[text_id],
+                "issued": False,
+                "issue_cycle": None,
+                "exec_start_cycle": None,
+                "exec_complete": None,
+                "write_cycle": None,
+            }
+            return entry
+        entry = {"text": self.texts[text_id], "parsed": self._parsed[text_id], "issued": True}
+        entry.update(zip(TIMING_FIELDS, self.timing_row(index)))
+        if flags & BRANCH:
+            entry["taken"] = bool(flags & TAKEN)
+            if flags & MISPREDICTED:
+                entry["mispredicted"] = True
+        return entry
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, InstructionLog)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<InstructionLog {len(self)} 条，活动 {len(self._live)} 条>"
+
+    # ---- 直接读取数组的接口（不创建条目字典） ----
+
+    def text(self, index):
+        return self.texts[self.text_ids[index]]
+
+    def parsed(self, index):
+        entry = self._live.get(index)
+        return entry["parsed"] if entry is not None else self._parsed[self.text_ids[index]]
+
+    def timing_row(self, index):
+        """返回 (发射, 开始执行, 执行完成, 写回)，未记录为 None。"""
+        entry = self._live.get(index)
+        if entry is not None:
+            return tuple(entry[field] for field in TIMING_FIELDS)
+        base = index * len(TIMING_FIELDS)
+        return tuple(None if c < 0 else c for c in self.cycles[base:base + len(TIMING_FIELDS)])
+
+    def iter_timing(self):
+        """逐条产生 (文本, 发射, 开始执行, 执行完成, 写回)。"""
+        texts = self.texts
+        for i, text_id in enumerate(self.text_ids):
+            yield (texts[text_id],) + self.timing_row(i)
+
+    def iter_parsed(self):
+        for i in range(len(self)):
+            yield self.parsed(i)
@@ -1,9 +1,477 @@
+import time
+
+# 启动计时起点（尽量早，用于启动耗时基准，见 bench_startup.py）
+_START = time.perf_counter()
+
+import os
 import sys
-import copy
-from PyQt5.QtWidgets import QApplication, QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QPushButton, QMessageBox, QLabel, QHBoxLayout, QFileDialog, QHeaderView, QSizePolicy, QLineEdit, QComboBox, QAbstractItemView
-from PyQt5.QtGui import QColor
-from tomasulo import Tomasulo
-from PyQt5.QtWidgets import QPlainTextEdit
+from array import array
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, QRectF, Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTableView, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QPushButton, QMessageBox, QLabel, QHBoxLayout, QFileDialog, QHeaderView, QSizePolicy, QLineEdit, QComboBox, QAbstractItemView
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsScene, QGraphicsView
+from PyQt5.QtGui import QColor, QPainter
+from ops import OPS
+from tomasulo import BRANCH_OPS, REGISTER_INDEX, TIMING_FIELDS, Tomasulo
+from PyQt5.QtWidgets import QPlainTextEdit, QCheckBox, QProgressBar
+
+
+class InstructionLoader(QObject):
+    """后台线程中分块读取并解析指令文件，通过信号把结果交给 GUI 线程。
+
+    信号：
+    - chunk_ready(list)：一批 (原始行, 标签列表, 指令文本, 已解析字典)，按文件顺序；只有标签的行文本与字典为 None
+    - line_error(int, str, str)：行号、原始行、错误信息
+    - progress(int, int)：已读取字节数、文件总字节数
+    - finished(int, int, bool)：成功条数、错误条数、是否被取消
+    - indexed(object)：大型文件（或已有索引的文件）经行偏移索引打开的 `IndexedProgram`，
+      此时不发送 chunk_ready，指令在步进时按需从文件读取（见 program_index.py）
+    """
+    chunk_ready = pyqtSignal(list)
+    line_error = pyqtSignal(int, str, str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, int, bool)
+    indexed = pyqtSignal(object)
+
+    # 第一批较小，以便表格尽快显示首批行；之后使用较大的批次减少信号开销
+    FIRST_CHUNK = 200
+    CHUNK = 5000
+    # 达到该大小的文件经索引加载
+    INDEX_THRESHOLD = 16 * 1024 * 1024
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self._cancelled = False
+        # 独立的解析器实例，避免在工作线程中触碰 GUI 持有的模拟器状态
+        self._parser = Tomasulo()
+
+    def cancel(self):
+        """请求取消；工作线程在处理下一行前检查该标志。"""
+        self._cancelled = True
+
+    def run(self):
+        total = os.path.getsize(self.file_path)
+        # 推迟导入，避免影响启动耗时
+        from program_index import INDEX_SUFFIX
+        if total >= self.INDEX_THRESHOLD or os.path.exists(self.file_path + INDEX_SUFFIX):
+            self._run_indexed(total)
+            return
+        done_bytes = 0
+        loaded = 0
+        errors = 0
+        chunk = []
+        limit = self.FIRST_CHUNK
+        with open(self.file_path, "rb") as f:
+            for lineno, raw in enumerate(f, start=1):
+                if self._cancelled:
+                    break
+                done_bytes += len(raw)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    line_labels, text, parsed = self._parser.parse_program_line(line)
+                    chunk.append((line, line_labels, text, parsed))
+                    loaded += 1
+                except Exception as e:
+                    errors += 1
+                    self.line_error.emit(lineno, line, str(e))
+                if len(chunk) >= limit:
+                    self.chunk_ready.emit(chunk)
+                    self.progress.emit(done_bytes, total)
+                    chunk = []
+                    limit = self.CHUNK
+        if chunk and not self._cancelled:
+            self.chunk_ready.emit(chunk)
+        self.progress.emit(done_bytes, total)
+        self.finished.emit(loaded, errors, self._cancelled)
+
+    def _run_indexed(self, total):
+        """建立或读取行偏移索引（已有且有效的索引不重新解析文件）。"""
+        from program_index import IndexedProgram
+        try:
+            program = IndexedProgram(self.file_path)
+        except (OSError, ValueError) as e:
+            self.line_error.emit(0, self.file_path, str(e))
+            self.progress.emit(total, total)
+            self.finished.emit(0, 1, False)
+            return
+        self.progress.emit(total, total)
+        self.indexed.emit(program)
+        self.finished.emit(program.rows, 0, False)
+
+
+class TimelineBlock(QGraphicsItem):
+    """时间线中连续 `TimelineView.BLOCK` 行的绘制项。
+
+    场景按块的包围盒剔除不可见的块；块内只绘制暴露区域（exposedRect）覆盖的行，
+    因此每次重绘的开销与可见行数成正比，而不是与指令总数成正比。
+    """
+
+    def __init__(self, timeline, first):
+        super().__init__()
+        self.timeline = timeline
+        self.first = first
+        self.rows = 0
+        self.max_cycle = 0
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def grow(self, rows, max_cycle):
+        if rows != self.rows or max_cycle > self.max_cycle:
+            self.prepareGeometryChange()
+            self.rows = rows
+            self.max_cycle = max(self.max_cycle, max_cycle)
+
+    def boundingRect(self):
+        t = self.timeline
+        return QRectF(0, self.first * t.ROW_H, (self.max_cycle + 2) * t.CYCLE_W, self.rows * t.ROW_H)
+
+    def paint(self, painter, option, widget=None):
+        t = self.timeline
+        exposed = option.exposedRect
+        lo = max(self.first, int(exposed.top() // t.ROW_H))
+        hi = min(self.first + self.rows, int(exposed.bottom() // t.ROW_H) + 1)
+        w, h = t.CYCLE_W, t.ROW_H - 2
+        now = t.clock + 1
+        for i in range(lo, hi):
+            issue = t.issue[i]
+            if issue < 0:
+                continue
+            start, complete, write = t.start[i], t.complete[i], t.write[i]
+            y = i * t.ROW_H + 1
+            # 发射后等待操作数/功能单元
+            wait_end = start if start >= 0 else now
+            if wait_end > issue:
+                painter.fillRect(QRectF(issue * w, y, (wait_end - issue) * w, h), t.WAIT_COLOR)
+            if start >= 0:
+                exec_end = complete + 1 if complete >= 0 else now
+                painter.fillRect(QRectF(start * w, y, (exec_end - start) * w, h), t.EXEC_COLOR)
+            if write >= 0:
+                painter.fillRect(QRectF(write * w, y, w, h), t.WRITE_COLOR)
+
+
+class TimelineView(QGraphicsView):
+    """流水线时间线（甘特图）：每行一条动态指令，横轴为周期。
+
+    灰色为发射后等待，蓝色为执行，绿色为写回。数据保存在定长数组中，由
+    `sync()` 根据引擎的 `timing_changes` 增量更新，只重绘发生变化的块。
+    Ctrl+滚轮横向缩放，Ctrl+Shift+滚轮整体缩放，拖动平移；点击某行发出 `row_clicked`。
+    """
+    row_clicked = pyqtSignal(int)
+
+    BLOCK = 512
+    ROW_H = 8
+    CYCLE_W = 12
+    WAIT_COLOR = QColor("lightgray")
+    EXEC_COLOR = QColor("steelblue")
+    WRITE_COLOR = QColor("seagreen")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlags(QGraphicsView.DontAdjustForAntialiasing | QGraphicsView.DontSavePainterState)
+        self.setRenderHint(QPainter.Antialiasing, False)
+        self.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.clear()
+
+    def clear(self):
+        self.scene().clear()
+        self.blocks = []
+        self.issue, self.start, self.complete, self.write = (array("q") for _ in range(4))
+        self.open_rows = set()   # 已发射但未写回的行（条形随时钟增长）
+        self.clock = 0
+
+    def _set_row(self, i, queue):
+        """从指令记录的归档数组读取第 i 行的周期（不创建条目字典）。"""
+        issue, start, complete, write = (-1 if c is None else c for c in queue.timing_row(i))
+        self.issue[i], self.start[i], self.complete[i], self.write[i] = issue, start, complete, write
+        if issue >= 0 and write < 0:
+            self.open_rows.add(i)
+        else:
+            self.open_rows.discard(i)
+        return max(issue, start, complete, write)
+
+    def sync(self, tomasulo):
+        """把引擎的时间数据同步到时间线。
+
+        连续单步时只处理新增的行、`timing_changes` 中的行和在途行；
+        重置、跳过若干周期或首次显示时全量重建。
+        """
+        queue = tomasulo.instruction_queue
+        incremental = len(queue) >= len(self.issue) and tomasulo.clock in (self.clock, self.clock + 1)
+        if not incremental:
+            self.clear()
+        stepped = tomasulo.clock == self.clock + 1
+        dirty = {}   # 块号 -> 最大周期
+        old_rows = len(self.issue)
+        for i in range(old_rows, len(queue)):
+            for column in (self.issue, self.start, self.complete, self.write):
+                column.append(-1)
+            cycle = self._set_row(i, queue)
+            block = i // self.BLOCK
+            dirty[block] = max(dirty.get(block, 0), cycle)
+        if incremental and stepped:
+            for i in tomasulo.timing_changes:
+                if i < old_rows:
+                    cycle = self._set_row(i, queue)
+                    block = i // self.BLOCK
+                    dirty[block] = max(dirty.get(block, 0), cycle)
+        self.clock = tomasulo.clock
+        for i in self.open_rows:
+            block = i // self.BLOCK
+            dirty[block] = max(dirty.get(block, 0), self.clock)
+
+        rows = len(self.issue)
+        while len(self.blocks) * self.BLOCK < rows:
+            item = TimelineBlock(self, len(self.blocks) * self.BLOCK)
+            self.blocks.append(item)
+            self.scene().addItem(item)
+        for block, cycle in dirty.items():
+            item = self.blocks[block]
+            item.grow(min(self.BLOCK, rows - item.first), cycle)
+            item.update()
+        self.scene().setSceneRect(0, 0, (self.clock + 2) * self.CYCLE_W, max(rows, 1) * self.ROW_H)
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            factor = 1.25 ** (event.angleDelta().y() / 120)
+            self.scale(factor, factor if event.modifiers() & Qt.ShiftModifier else 1.0)
+            event.accept()
+        else:
+            super().wheelEvent(event)
+
+    def mousePressEvent(self, event):
+        row = int(self.mapToScene(event.pos()).y() // self.ROW_H)
+        if 0 <= row < len(self.issue):
+            self.row_clicked.emit(row)
+        super().mousePressEvent(event)
+
+class InstructionTableModel(QAbstractTableModel):
+    """指令状态表的数据模型：直接读取引擎 `InstructionLog` 的文本与周期数组，不为每行创建单元格对象。
+
+    `sync()` 只通知新增的行、`timing_changes` 中的行以及上次高亮过的行，视图只重绘其中可见的部分。
+    周期字段只在被记录的那个周期写入一次，因此“上次同步之后变化的单元格”就是周期大于
+    上次同步时钟的单元格；高亮在 `data()` 中按该阈值判断，不保存旧表格的副本。
+    """
+    HEADERS = ["Op", "Dest", "j", "k", "Issue", "Exec Start", "Exec Comp", "Write Result"]
+    CHANGED_COLOR = QColor("lightyellow")
+    CRITICAL_COLOR = QColor("lightblue")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = None
+        self._rows = 0
+        self._clock = 0
+        self._new_from = 0          # 该行及之后的行为上次同步新增的行，整行高亮
+        self._changed_after = 0     # 周期大于该值的单元格为上次同步以来记录的，高亮
+        self._marked = []           # 上次同步高亮的行区间 (first, last)，下次同步时重绘以清除高亮
+        self._critical = frozenset()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if col < 4:
+                parts = self._queue.text(row).split()
+                return parts[col] if col < len(parts) else ""
+            value = self._queue.timing_row(row)[col - 4]
+            return "" if value is None else str(value)
+        if role == Qt.BackgroundRole:
+            if col == 0 and row in self._critical:
+                return self.CRITICAL_COLOR
+            if row >= self._new_from:
+                return self.CHANGED_COLOR
+            if col >= 4:
+                value = self._queue.timing_row(row)[col - 4]
+                if value is not None and value > self._changed_after:
+                    return self.CHANGED_COLOR
+        return None
+
+    def sync(self, tomasulo, highlight=True):
+        """把引擎的指令记录同步到视图。
+
+        `highlight` 为 False 时（如加载过程中追加的行）不高亮。指令记录被替换或变短
+        （重置、重新加载）时整体重置模型。
+        """
+        queue = tomasulo.instruction_queue
+        if queue is not self._queue or len(queue) < self._rows:
+            self.beginResetModel()
+            self._queue = queue
+            self._rows = self._new_from = len(queue)
+            self._clock = self._changed_after = tomasulo.clock
+            self._marked = []
+            self.endResetModel()
+            return
+        old_rows, old_clock = self._rows, self._clock
+        if len(queue) > old_rows:
+            self.beginInsertRows(QModelIndex(), old_rows, len(queue) - 1)
+            self._rows = len(queue)
+            self.endInsertRows()
+        self._clock = tomasulo.clock
+        if highlight:
+            self._new_from, self._changed_after = old_rows, old_clock
+        else:
+            self._new_from, self._changed_after = self._rows, self._clock
+
+        if tomasulo.clock == old_clock:
+            changed = []
+        elif tomasulo.clock == old_clock + 1:
+            changed = [(i, i) for i in sorted(tomasulo.timing_changes) if i < old_rows]
+        else:
+            # 跨越多个周期时 `timing_changes` 只反映最后一个周期，通知全部已有行（视图只重绘可见行）
+            changed = [(0, old_rows - 1)] if old_rows else []
+        for first, last in self._marked + changed:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.HEADERS) - 1))
+        added = [(old_rows, self._rows - 1)] if self._rows > old_rows else []
+        self._marked = changed + added if highlight else []
+
+    def set_critical_rows(self, rows):
+        """设置关键路径上的行（第一列以浅蓝色显示），只重绘集合变化的行。"""
+        rows = frozenset(rows)
+        for row in rows.symmetric_difference(self._critical):
+            if row < self._rows:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, 0))
+        self._critical = rows
+
+
+class ComparisonWindow(QWidget):
+    """配置对比窗口：配置 A 为主窗口的当前配置，配置 B 由覆盖文本给出（见 compare.py）。
+
+    两次模拟在工作进程中运行；定时器每次只取一批消息，把新对齐的行追加到表格，
+    因此运行期间即可滚动已对齐的部分。差值为 B − A，变慢标红、变快标绿。
+    """
+    POLL_MS = 100
+    POLL_MESSAGES = 20
+    SLOWER_COLOR = QColor("mistyrose")
+    FASTER_COLOR = QColor("honeydew")
+
+    def __init__(self, program, config, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("配置对比")
+        self.resize(820, 600)
+        self.program = program
+        self.config_a = config
+        self._run = None
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.overrides_input = QLineEdit()
+        self.overrides_input.setPlaceholderText("配置 B 相对当前配置的覆盖，例如 DIV=20; num_stations=10")
+        self.start_button = QPushButton("开始对比")
+        self.start_button.clicked.connect(self.toggle)
+        controls.addWidget(self.overrides_input)
+        controls.addWidget(self.start_button)
+        layout.addLayout(controls)
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.metric_table = QTableWidget()
+        self.metric_table.setColumnCount(4)
+        self.metric_table.setHorizontalHeaderLabels(["A", "B", "B-A", "变化"])
+        self.metric_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.metric_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.metric_table)
+
+        self.row_table = QTableWidget()
+        self.row_table.setColumnCount(7)
+        self.row_table.setHorizontalHeaderLabels(["指令", "A 发射", "A 写回", "B 发射", "B 写回", "Δ发射", "Δ写回"])
+        self.row_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.row_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.row_table, 1)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._poll)
+
+    def toggle(self):
+        if self._run is not None:
+            self._stop("已停止")
+            return
+        import compare
+        try:
+            config_b = compare.parse_overrides(self.overrides_input.text(), self.config_a)
+        except ValueError as e:
+            QMessageBox.warning(self, "配置无效", str(e))
+            return
+        self.row_table.setRowCount(0)
+        from compare import METRICS
+        self.metric_table.setRowCount(len(METRICS))
+        self.metric_table.setVerticalHeaderLabels(list(METRICS))
+        self._run = compare.start_comparison(self.program, self.config_a, config_b)
+        self.start_button.setText("停止")
+        self.status_label.setText("运行中…")
+        self._timer.start(self.POLL_MS)
+
+    def _poll(self):
+        run = self._run
+        first, end = run.poll(limit=self.POLL_MESSAGES)
+        comparison = run.comparison
+        self._append_rows(comparison, first, end)
+        self._show_metrics(comparison)
+        summary = comparison.summary()
+        text = (f"已对齐 {summary['aligned']} 条：B 更快 {summary['faster']} 条，更慢 {summary['slower']} 条，"
+                f"写回周期差之和 {summary['write_delta_total']}")
+        if summary["max_delta"] is not None:
+            delta, row = summary["max_delta"]
+            text += f"；差值最大为第 {row + 1} 条（{delta:+d}）"
+        if summary["mismatches"]:
+            text += f"；{summary['mismatches']} 条指令文本不一致"
+        if comparison.errors:
+            self._stop("；".join(f"{side.upper()}: {message}" for side, message in sorted(comparison.errors.items())))
+        elif comparison.finished:
+            self._stop(text + "（完成）")
+        else:
+            self.status_label.setText(text + "（运行中…）")
+
+    def _append_rows(self, comparison, first, end):
+        if end <= first:
+            return
+        self.row_table.setRowCount(end)
+        issue, write = 0, len(TIMING_FIELDS) - 1
+        for i in range(first, end):
+            row = comparison.row(i)
+            values = [row["text"], row["a"][issue], row["a"][write], row["b"][issue], row["b"][write],
+                      row["delta"][issue], row["delta"][write]]
+            delta = row["delta"][write]
+            color = None if not delta else (self.SLOWER_COLOR if delta > 0 else self.FASTER_COLOR)
+            for c, value in enumerate(values):
+                item = QTableWidgetItem("" if value is None else str(value))
+                if color is not None and c >= 5:
+                    item.setBackground(color)
+                self.row_table.setItem(i, c, item)
+
+    def _show_metrics(self, comparison):
+        for r, (_name, a, b, delta, ratio) in enumerate(comparison.metric_rows()):
+            values = [a, b, delta]
+            for c, value in enumerate(values):
+                text = "" if value is None else (f"{value:.3f}" if isinstance(value, float) else str(value))
+                self.metric_table.setItem(r, c, QTableWidgetItem(text))
+            self.metric_table.setItem(r, 3, QTableWidgetItem("" if ratio is None else f"{ratio:+.1%}"))
+
+    def _stop(self, message):
+        self._timer.stop()
+        if self._run is not None:
+            self._run.close()
+            self._run = None
+        self.start_button.setText("开始对比")
+        self.status_label.setText(message)
+
+    def closeEvent(self, event):
+        self._stop("")
+        super().closeEvent(event)
+
 
 class TomasuloUI(QMainWindow):
     def __init__(self):
@@ -37,13 +505,14 @@ class TomasuloUI(QMainWindow):
         self.central_widget.setLayout(self.layout)
 
         # 指令状态表
-        self.instruction_table = QTableWidget()
-        # 列：Op, Dest, j, k, Issue, Exec Start, Exec Comp, Write Result
-        self.instruction_table.setColumnCount(8)
-        self.instruction_table.setHorizontalHeaderLabels(["Op", "Dest", "j", "k", "Issue", "Exec Start", "Exec Comp", "Write Result"])
+        # 列：Op, Dest, j, k, Issue, Exec Start, Exec Comp, Write Result；数据由模型直接读取指令记录
+        self.instruction_model = InstructionTableModel(self)
+        self.instruction_table = QTableView()
+        self.instruction_table.setModel(self.instruction_model)
+        self.instruction_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.instruction_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.instruction_table.setMinimumHeight(200)
         self.instruction_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.layout.addWidget(self.instruction_table)
 
         # 保留站表
         self.reservation_table = QTableWidget()
@@ -53,7 +522,6 @@ class TomasuloUI(QMainWindow):
         self.reservation_table.setMinimumHeight(120)
         self.reservation_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.reservation_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.layout.addWidget(self.reservation_table)
 
         # 寄存器结果状态表
         self.register_table = QTableWidget()
@@ -65,7 +533,6 @@ class TomasuloUI(QMainWindow):
         self.register_table.setMinimumHeight(100)
         self.register_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.register_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        self.layout.addWidget(self.register_table)
 
         try:
             header_h = self.register_table.horizontalHeader().height() or 24
@@ -94,15 +561,72 @@ class TomasuloUI(QMainWindow):
         self.step_button.clicked.connect(self.step_simulation)
         self.layout.addWidget(self.step_button)
 
+        # 断点：全速运行到条件满足后只刷新一次界面（见 breakpoints.py）
+        self.breakpoint_layout = QHBoxLayout()
+        self.breakpoint_input = QLineEdit()
+        self.breakpoint_input.setPlaceholderText("断点，例如 cycle 500; issue 12; write 12; reg F5; mem 300; full")
+        self.run_to_breakpoint_button = QPushButton("运行到断点")
+        self.run_to_breakpoint_button.clicked.connect(self.run_to_breakpoint)
+        self.breakpoint_layout.addWidget(self.breakpoint_input)
+        self.breakpoint_layout.addWidget(self.run_to_breakpoint_button)
+        self.layout.addLayout(self.breakpoint_layout)
+        self.breakpoint_label = QLabel("")
+        self.breakpoint_label.hide()
+        self.layout.addWidget(self.breakpoint_label)
+        self._breakpoint_running = False
+        self._breakpoint_check = None
+
+        # 配置对比：用当前配置与修改后的配置在工作进程中模拟同一程序（见 compare.py）
+        self.compare_button = QPushButton("对比配置")
+        self.compare_button.clicked.connect(self.open_comparison)
+        self.layout.addWidget(self.compare_button)
+        self._comparison_window = None
+        # 最近一次成功加载的含分支程序的源行（对比时需要静态程序）
+        self._loaded_program = None
+
         # 从文件加载指令按钮
         self.load_button = QPushButton("从文件加载指令")
         self.load_button.clicked.connect(self.load_instructions)
         self.layout.addWidget(self.load_button)
 
+        # 后台加载进度条与取消按钮（仅在加载期间显示）
+        self.load_progress_layout = QHBoxLayout()
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 1000)
+        self.load_cancel_button = QPushButton("取消加载")
+        self.load_cancel_button.clicked.connect(self.cancel_loading)
+        self.load_progress_layout.addWidget(self.load_progress)
+        self.load_progress_layout.addWidget(self.load_cancel_button)
+        self.layout.addLayout(self.load_progress_layout)
+        self.load_progress.hide()
+        self.load_cancel_button.hide()
+        self._loader = None
+        self._loader_thread = None
+        self._load_errors = []
+        # 经索引加载的大型程序（见 program_index.py），None 表示程序已整体载入模拟器
+        self._indexed_program = None
+
+        # 跳转到指令行；“从此行开始”以当前寄存器/内存为映像，从静态程序的该行重新开始模拟
+        self.jump_layout = QHBoxLayout()
+        self.jump_input = QLineEdit()
+        self.jump_input.setPlaceholderText("行号（从 0 开始）")
+        self.jump_button = QPushButton("跳转到行")
+        self.jump_button.clicked.connect(self.jump_to_row)
+        self.start_from_row_button = QPushButton("从此行开始")
+        self.start_from_row_button.clicked.connect(self.start_from_row)
+        self.jump_layout.addWidget(self.jump_input)
+        self.jump_layout.addWidget(self.jump_button)
+        self.jump_layout.addWidget(self.start_from_row_button)
+        self.layout.addLayout(self.jump_layout)
+        self.jump_label = QLabel("")
+        self.jump_label.hide()
+        self.layout.addWidget(self.jump_label)
+
         # 添加指令的输入部件
         self.add_instr_layout = QHBoxLayout()
         self.op_combo = QComboBox()
-        self.supported_ops = ["ADD", "SUB", "MUL", "DIV", "LOAD", "STORE"]
+        # 可逐条添加的操作：注册表中的运算操作与 LOAD/STORE（分支需要标签，只能通过程序文件加载）
+        self.supported_ops = [name for name, spec in OPS.items() if spec.kind in ("alu", "load", "store")]
         self.op_combo.addItems(self.supported_ops)
         self.op_combo.currentIndexChanged.connect(self._on_op_changed)
 
@@ -130,28 +654,97 @@ class TomasuloUI(QMainWindow):
         self.layout.addWidget(self.reset_button)
 
         # Debug 复选框
-        from PyQt5.QtWidgets import QCheckBox
         self.debug_checkbox = QCheckBox("Debug")
         self.debug_checkbox.setChecked(False)
         self.tomasulo.debug = False
         self.debug_checkbox.stateChanged.connect(self.toggle_debug)
         self.layout.addWidget(self.debug_checkbox)
 
-        # 日志视图（默认隐藏）
-        self.log_view = QPlainTextEdit()
-        self.log_view.setReadOnly(True)
-        self.log_view.setFixedHeight(88)
-        self.log_view.hide()
-        self.layout.addWidget(self.log_view)
+        # 关键路径叠加复选框：在指令表中标出数据流关键路径
+        self.critical_path_checkbox = QCheckBox("关键路径")
+        self.critical_path_checkbox.setChecked(False)
+        self.critical_path_checkbox.stateChanged.connect(lambda _state: self.update_tables())
+        self.layout.addWidget(self.critical_path_checkbox)
+        self.dataflow_label = QLabel("")
+        self.dataflow_label.hide()
+        self.layout.addWidget(self.dataflow_label)
+        # 缓存的分析结果及其对应的 (队列长度, 延迟配置)
+        self._dataflow_report = None
+        self._dataflow_key = None
+
+        # 磁盘结果缓存（见 result_cache.py）：加载文件后查找同一 (程序, 配置) 的已知结果，
+        # 单步运行到结束后写入。缓存对象在首次使用时创建
+        self.cache_label = QLabel("")
+        self.cache_label.hide()
+        self.layout.addWidget(self.cache_label)
+        self._result_cache = None
+        self._result_key = None
+        self._result_stored = False
+
+        # 时间线视图在首次勾选时才创建（见 _toggle_timeline）
+        self.timeline_checkbox = QCheckBox("时间线")
+        self.timeline_checkbox.setChecked(False)
+        self.timeline_checkbox.stateChanged.connect(self._toggle_timeline)
+        self.layout.addWidget(self.timeline_checkbox)
+        self.timeline_view = None
+        self._timeline_slot = self.layout.count()
+
+        # 日志视图在首次启用 Debug 时才创建（见 _ensure_log_view），此处只记录其在布局中的位置
+        self.log_view = None
+        self._log_view_slot = self.layout.count()
 
         # 跟踪已显示的日志行数
         self._log_index = 0
 
         self._prev_state = None
-        self.update_tables()
+        # 寄存器表：列顺序、已显示内容与上次高亮的单元格（见 _refresh_register_table）
+        self._reg_columns = None
+        self._reg_shown = {}
+        self._reg_highlighted = []
+        # 首次填充表格（含 32 列寄存器表）推迟到窗口显示之后的第一次事件循环
+        QTimer.singleShot(0, self.update_tables)
+
+    def _ensure_log_view(self):
+        """按需创建日志视图。"""
+        if self.log_view is None:
+            self.log_view = QPlainTextEdit()
+            self.log_view.setReadOnly(True)
+            self.log_view.setFixedHeight(88)
+            self.log_view.hide()
+            self.layout.insertWidget(self._log_view_slot, self.log_view)
+        return self.log_view
+
+    def _toggle_timeline(self, state):
+        """显示或隐藏时间线；首次显示时创建并全量同步。"""
+        if state:
+            if self.timeline_view is None:
+                self.timeline_view = TimelineView()
+                self.timeline_view.setMinimumHeight(160)
+                self.timeline_view.row_clicked.connect(self._on_timeline_row_clicked)
+                self.layout.insertWidget(self._timeline_slot, self.timeline_view)
+            self.timeline_view.clear()
+            self.timeline_view.show()
+            self._sync_timeline()
+        elif self.timeline_view is not None:
+            self.timeline_view.hide()
 
-    def update_tables(self):
-        """使用 Tomasulo 的当前状态更新所有表。"""
+    def _sync_timeline(self):
+        if self.timeline_view is not None and self.timeline_view.isVisible():
+            self.timeline_view.sync(self.tomasulo)
+
+    def _on_timeline_row_clicked(self, row):
+        if 0 <= row < self.instruction_model.rowCount():
+            self.instruction_table.scrollTo(self.instruction_model.index(row, 0), QAbstractItemView.PositionAtCenter)
+            self.instruction_table.selectRow(row)
+
+    def _scroll_to_last_row(self):
+        self._on_timeline_row_clicked(self.instruction_model.rowCount() - 1)
+
+    def update_tables(self, all_registers=False):
+        """使用 Tomasulo 的当前状态更新所有表。
+
+        `all_registers` 为 True 时检查全部寄存器（跨越多个周期后 `dirty_registers` 只反映最后一个周期）。
+        """
         state = self.tomasulo.get_state()
 
         # 清除之前的亮点
@@ -162,71 +755,12 @@ class TomasuloUI(QMainWindow):
                     if item:
                         item.setBackground(QColor("white"))
 
-        _clear_table_highlights(self.instruction_table)
         _clear_table_highlights(self.reservation_table)
-        _clear_table_highlights(self.register_table)
 
         # --- 指令表 ---
-        instrs = state.get("instruction_queue", [])
-        self.instruction_table.setRowCount(len(instrs))
-        for row, entry in enumerate(instrs):
-            text = entry.get("text", "")
-            parts = text.split()
-
-            # 辅助函数：设置并高亮单元格与之前状态比较
-            def _set_and_highlight(table, r, c, new_text, prev_val=None):
-                item = QTableWidgetItem(new_text)
-                changed = False
-                if self._prev_state is not None:
-                    try:
-                        if prev_val is None:
-                            prev_instrs = self._prev_state.get("instruction_queue", [])
-                            prev_entry = prev_instrs[r] if r < len(prev_instrs) else None
-                            if prev_entry is None:
-                                changed = True
-                            else:
-                                # 按字段比较
-                                if c == 0:
-                                    prev_v = prev_entry.get("text", "").split()[0] if prev_entry.get("text") else ""
-                                elif c == 1:
-                                    prev_v = prev_entry.get("text", "").split()[1] if len(prev_entry.get("text", "").split())>1 else ""
-                                elif c == 2:
-                                    prev_v = prev_entry.get("text", "").split()[2] if len(prev_entry.get("text", "").split())>2 else ""
-                                elif c == 3:
-                                    prev_v = prev_entry.get("text", "").split()[3] if len(prev_entry.get("text", "").split())>3 else ""
-                                elif c == 4:
-                                    prev_v = str(prev_entry.get("issue_cycle")) if prev_entry.get("issue_cycle") is not None else ""
-                                elif c == 5:
-                                    prev_v = str(prev_entry.get("exec_start_cycle")) if prev_entry.get("exec_start_cycle") is not None else ""
-                                elif c == 6:
-                                    prev_v = str(prev_entry.get("exec_complete")) if prev_entry.get("exec_complete") is not None else ""
-                                elif c == 7:
-                                    prev_v = str(prev_entry.get("write_cycle")) if prev_entry.get("write_cycle") is not None else ""
-                                else:
-                                    prev_v = ""
-                                changed = (str(prev_v) != str(new_text))
-                        else:
-                            changed = (str(prev_val) != str(new_text))
-                    except Exception:
-                        changed = True
-                if changed:
-                    item.setBackground(QColor("lightyellow"))
-                table.setItem(r, c, item)
-
-            _set_and_highlight(self.instruction_table, row, 0, parts[0] if len(parts)>0 else "")
-            _set_and_highlight(self.instruction_table, row, 1, parts[1] if len(parts)>1 else "")
-            _set_and_highlight(self.instruction_table, row, 2, parts[2] if len(parts)>2 else "")
-            _set_and_highlight(self.instruction_table, row, 3, parts[3] if len(parts)>3 else "")
-
-            issue_status = str(entry.get("issue_cycle")) if entry.get("issue_cycle") is not None else ""
-            exec_start_status = str(entry.get("exec_start_cycle")) if entry.get("exec_start_cycle") is not None else ""
-            exec_comp_status = str(entry.get("exec_complete")) if entry.get("exec_complete") is not None else ""
-            write_result_status = str(entry.get("write_cycle")) if entry.get("write_cycle") is not None else ""
-
-            _set_and_highlight(self.instruction_table, row, 4, issue_status)
-            _set_and_highlight(self.instruction_table, row, 5, exec_start_status)
-            _set_and_highlight(self.instruction_table, row, 6, exec_comp_status)
-            _set_and_highlight(self.instruction_table, row, 7, write_result_status)
+        # 模型只通知新增的行与 `timing_changes` 中的行，不复制指令记录
+        self.instruction_model.sync(self.tomasulo)
+        self._apply_critical_path_overlay()
 
         # --- 保留站表 ---
         rs_list = state.get("reservation_stations", [])
@@ -259,65 +793,108 @@ class TomasuloUI(QMainWindow):
                 self.reservation_table.setItem(r, c, item)
 
         # --- 寄存器表 ---
-        regs = state.get("registers", {})
-        # 设置 Qi 行、Value 行、Status 行
-        for col, reg_name in enumerate(sorted(regs.keys(), key=lambda x: int(x[1:]))):
+        self._refresh_register_table(all_registers)
+
+        # 保存快照以供下次步骤比较
+        self._prev_state = self._snapshot_state(state)
+
+        self._sync_timeline()
+
+
+    def _register_columns(self):
+        """寄存器名 -> 列号。列顺序与单元格对象只在寄存器集合变化时重建。"""
+        regs = self.tomasulo.registers
+        if self._reg_columns is None or len(self._reg_columns) != len(regs):
+            order = sorted(regs, key=lambda x: int(x[1:]))
+            self._reg_columns = {name: col for col, name in enumerate(order)}
+            self.register_table.setColumnCount(len(order))
+            self.register_table.setHorizontalHeaderLabels(order)
+            self._reg_shown = {}
+            self._reg_highlighted = []
+            for col in range(len(order)):
+                for row in range(3):
+                    self.register_table.setItem(row, col, QTableWidgetItem(""))
+        return self._reg_columns
+
+    def _snapshot_state(self, state):
+        """保存用于下次高亮比较的状态。
+
+        `get_state()` 返回的保留站与寄存器字典已是带可读标签的新副本，可直接保存；指令表的
+        高亮由 `InstructionTableModel` 按周期阈值判断，不保存指令记录的副本。
+        """
+        return {
+            "clock": state["clock"],
+            "reservation_stations": state["reservation_stations"],
+            "registers": state["registers"],
+        }
+
+    def _refresh_register_table(self, all_registers=False):
+        """只刷新引擎 `dirty_registers`（或 `all_registers` 时全部寄存器）中显示内容确实变化的单元格。
+
+        单元格对象复用，只修改文本和背景；上一次高亮的单元格恢复原背景。
+        """
+        columns = self._register_columns()
+        regs = self.tomasulo.registers
+        # 重命名表保存整数标签，只在显示时转换为可读标签
+        rename_table = self.tomasulo.rename_table
+        first = not self._reg_shown
+        for row, col in self._reg_highlighted:
+            item = self.register_table.item(row, col)
+            if row == 2:
+                item.setBackground(QColor("yellow") if item.text() == "Busy" else QColor("lightgreen"))
+            else:
+                item.setBackground(QColor("white"))
+        self._reg_highlighted = []
+
+        for reg_name in (regs if first or all_registers else self.tomasulo.dirty_registers):
             reg_data = regs[reg_name]
-            # Qi
-            qi_item = QTableWidgetItem(reg_data.get("rename", "") or "")
-            # Value
             val = reg_data.get("value", "")
             if isinstance(val, float) and val.is_integer():
                 val_str = str(int(val))
             else:
                 val_str = str(val)
-            val_item = QTableWidgetItem(val_str)
-            # Status
-            if reg_data.get("busy", False):
-                status_item = QTableWidgetItem("Busy")
-                status_item.setBackground(QColor("yellow"))
-            else:
-                status_item = QTableWidgetItem("Free")
-                status_item.setBackground(QColor("lightgreen"))
-
-            # 高亮与 prev_state 比较
-            if self._prev_state is not None:
-                try:
-                    prev_reg = self._prev_state.get("registers", {}).get(reg_name, {})
-                    if prev_reg.get("rename", None) != reg_data.get("rename", None):
-                        qi_item.setBackground(QColor("lightyellow"))
-                    if str(prev_reg.get("value", "")) != val_str:
-                        val_item.setBackground(QColor("lightyellow"))
-                    if bool(prev_reg.get("busy", False)) != bool(reg_data.get("busy", False)):
-                        status_item.setBackground(QColor("lightyellow"))
-                except Exception:
-                    pass
-
-            self.register_table.setItem(0, col, qi_item)
-            self.register_table.setItem(1, col, val_item)
-            self.register_table.setItem(2, col, status_item)
-
-        # 保存快照以供下次步骤比较
-        try:
-            self._prev_state = copy.deepcopy(state)
-        except Exception:
-            self._prev_state = state
+            tag = rename_table[REGISTER_INDEX[reg_name]]
+            shown = (self.tomasulo.tag_label(tag) if tag > 0 else "", val_str, "Busy" if tag > 0 else "Free")
+            previous = self._reg_shown.get(reg_name)
+            if previous == shown:
+                continue
+            self._reg_shown[reg_name] = shown
+            col = columns[reg_name]
+            for row, text in enumerate(shown):
+                if previous is not None and previous[row] == text:
+                    continue
+                item = self.register_table.item(row, col)
+                item.setText(text)
+                if previous is not None:
+                    item.setBackground(QColor("lightyellow"))
+                    self._reg_highlighted.append((row, col))
+                elif row == 2:
+                    item.setBackground(QColor("yellow") if text == "Busy" else QColor("lightgreen"))
 
+    def _apply_critical_path_overlay(self):
+        """若启用，则在指令表中高亮关键路径上的指令并显示周期下界。"""
+        if not self.critical_path_checkbox.isChecked():
+            self.instruction_model.set_critical_rows(())
+            self.dataflow_label.hide()
+            return
+        key = (len(self.tomasulo.instruction_queue), tuple(sorted(self.tomasulo.op_latencies.items())))
+        if self._dataflow_key != key:
+            self._dataflow_report = self.tomasulo.analyze_dataflow(keep_edges=False)
+            self._dataflow_key = key
+        report = self._dataflow_report
+        self.instruction_model.set_critical_rows(report["critical_path"])
+        self.dataflow_label.setText(
+            f"周期下界: {report['lower_bound']}  关键路径: {len(report['critical_path'])} 条指令  "
+            f"平均并行度: {report['average_parallelism']:.2f}  最大并行度: {report['max_parallelism']}"
+        )
+        self.dataflow_label.show()
 
     def step_simulation(self):
         """将模拟推进一个时钟周期。"""
         self.tomasulo.step()
         self.update_tables()
-
-        # 如果启用了 debug，拉取新日志并追加到日志视图
-        if self.tomasulo.debug:
-            new_logs = self.tomasulo.get_logs(self._log_index)
-            for line in new_logs:
-                self.log_view.appendPlainText(line)
-            self._log_index += len(new_logs)
-            # 确保可见并滚动到底部
-            self.log_view.show()
-            self.log_view.verticalScrollBar().setValue(self.log_view.verticalScrollBar().maximum())
+        self._pull_logs()
+        self._store_cached_result()
 
         # 获取本周期完成的操作并显示
         completed_operations = self.tomasulo.get_completed_operations()
@@ -325,6 +902,130 @@ class TomasuloUI(QMainWindow):
             details = "\n".join(completed_operations)
             QMessageBox.information(self, "周期汇总", f"已完成指令:\n{details}")
 
+    def _pull_logs(self):
+        """如果启用了 debug，拉取新日志并追加到日志视图。"""
+        if not self.tomasulo.debug:
+            return
+        self._ensure_log_view()
+        new_logs = self.tomasulo.get_logs(self._log_index)
+        for line in new_logs:
+            self.log_view.appendPlainText(line)
+        self._log_index += len(new_logs)
+        # 确保可见并滚动到底部
+        self.log_view.show()
+        self.log_view.verticalScrollBar().setValue(self.log_view.verticalScrollBar().maximum())
+
+    # 每次事件循环回调中运行的周期数：在运行期间保持界面可响应（可点击停止）
+    BREAKPOINT_CHUNK = 20000
+
+    def run_to_breakpoint(self):
+        """全速运行直到命中断点或全部指令写回，然后只刷新一次界面；运行中再次点击则停止。"""
+        if self._breakpoint_running:
+            self._finish_breakpoint_run(["已停止"])
+            return
+        from breakpoints import compile_breakpoints, parse_breakpoints
+        try:
+            conditions = parse_breakpoints(self.breakpoint_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "断点无效", str(e))
+            return
+        self._breakpoint_check = compile_breakpoints(self.tomasulo, conditions)
+        self._breakpoint_running = True
+        # 未开启 Debug 时不记录逐条日志
+        self.tomasulo.log_enabled = self.tomasulo.debug
+        self.run_to_breakpoint_button.setText("停止")
+        for button in (self.step_button, self.load_button, self.reset_button, self.add_instr_button):
+            button.setEnabled(False)
+        QTimer.singleShot(0, self._run_breakpoint_chunk)
+
+    def _run_breakpoint_chunk(self):
+        if not self._breakpoint_running:
+            return
+        from breakpoints import run_until
+        t = self.tomasulo
+        hits = run_until(t, self._breakpoint_check, t.clock + self.BREAKPOINT_CHUNK)
+        if hits or t.is_finished():
+            self._finish_breakpoint_run(hits or ["全部指令已写回"])
+            return
+        self.breakpoint_label.setText(f"运行中… 周期 {t.clock}")
+        self.breakpoint_label.show()
+        QTimer.singleShot(0, self._run_breakpoint_chunk)
+
+    def _finish_breakpoint_run(self, messages):
+        self._breakpoint_running = False
+        self._breakpoint_check = None
+        self.tomasulo.log_enabled = True
+        self.run_to_breakpoint_button.setText("运行到断点")
+        for button in (self.step_button, self.load_button, self.reset_button, self.add_instr_button):
+            button.setEnabled(True)
+        self.breakpoint_label.setText(f"周期 {self.tomasulo.clock}：" + "；".join(messages))
+        self.breakpoint_label.show()
+        # 一次运行跨越多个周期，寄存器表需要与全部寄存器比较
+        self.update_tables(all_registers=True)
+        self._pull_logs()
+        self._store_cached_result()
+
+    def open_comparison(self):
+        """打开配置对比窗口，对比对象为当前加载的程序（从头模拟，不影响主窗口的模拟器）。"""
+        if self._indexed_program is not None and self.tomasulo.program is self._indexed_program.parsed:
+            QMessageBox.information(self, "配置对比", "经索引加载的大型程序不支持配置对比，请使用 compare.py。")
+            return
+        if self.tomasulo.program is not None:
+            program = self._loaded_program
+        else:
+            queue = self.tomasulo.instruction_queue
+            program = [queue.text(i) for i in range(len(queue))]
+        if not program:
+            QMessageBox.information(self, "配置对比", "请先加载或添加指令。")
+            return
+        if self._comparison_window is not None:
+            self._comparison_window.close()
+        self._comparison_window = ComparisonWindow(program, self.tomasulo.get_config(), self)
+        self._comparison_window.show()
+
+    def _get_result_cache(self):
+        if self._result_cache is None:
+            # 推迟导入，避免影响启动耗时
+            from result_cache import ResultCache
+            try:
+                self._result_cache = ResultCache()
+            except OSError:
+                self._result_cache = False
+        return self._result_cache or None
+
+    def _lookup_cached_result(self, program_lines):
+        """根据刚加载的程序与当前配置查找缓存结果，命中时显示最终周期数。"""
+        import runner
+        self._result_key = None
+        self._result_stored = False
+        self.cache_label.hide()
+        cache = self._get_result_cache()
+        if cache is None or not program_lines:
+            return
+        self._result_key = runner.job_key(program_lines, self.tomasulo.get_config())
+        result = cache.get(self._result_key)
+        if result is None:
+            return
+        self._result_stored = True
+        ipc = result["instructions"] / result["cycles"] if result["cycles"] else 0.0
+        self.cache_label.setText(
+            f"缓存结果: {result['cycles']} 个周期  {result['instructions']} 条动态指令  IPC: {ipc:.2f}"
+        )
+        self.cache_label.show()
+
+    def _store_cached_result(self):
+        """加载的程序单步运行结束后把结果写入磁盘缓存。"""
+        if self._result_key is None or self._result_stored or not self.tomasulo.is_finished():
+            return
+        import runner
+        cache = self._get_result_cache()
+        if cache is not None:
+            try:
+                cache.put(self._result_key, runner.collect_result(self.tomasulo))
+            except OSError:
+                pass
+        self._result_stored = True
+
     def show_details(self, row, column):
         """显示所选保留站的详细信息。"""
         rs = self.tomasulo.get_state()["reservation_stations"][row]
@@ -340,46 +1041,210 @@ class TomasuloUI(QMainWindow):
         )
         QMessageBox.information(self, "Reservation Station Details", details)
 
+    def _jump_row(self):
+        """读取行号输入；无效时提示并返回 None。"""
+        try:
+            row = int(self.jump_input.text().strip())
+        except ValueError:
+            row = -1
+        if row < 0:
+            QMessageBox.warning(self, "跳转到行", "请输入非负整数行号。")
+            return None
+        return row
+
+    def jump_to_row(self):
+        """滚动指令表到该行；经索引加载时即使该行尚未取指，也直接从文件读取并显示其文本。"""
+        row = self._jump_row()
+        if row is None:
+            return
+        shown = row < self.instruction_model.rowCount()
+        if shown:
+            self._on_timeline_row_clicked(row)
+        program = self._indexed_program
+        if program is not None and row < program.rows:
+            self.jump_label.setText(f"第 {row} 行（文件偏移 {program.line_offset(row)}）：{program.text(row)}")
+            self.jump_label.show()
+        elif not shown:
+            QMessageBox.warning(self, "跳转到行", f"行号超出范围: {row}")
+
+    def start_from_row(self):
+        """以当前寄存器与内存为映像，从静态程序的第 N 行重新开始模拟。"""
+        row = self._jump_row()
+        if row is None:
+            return
+        t = self.tomasulo
+        if self._indexed_program is not None:
+            program = (self._indexed_program.texts, self._indexed_program.parsed, self._indexed_program.labels)
+        elif t.program is not None:
+            program = (t.program_texts, t.program, t.labels)
+        else:
+            queue = t.instruction_queue
+            program = t.parse_program([queue.text(i) for i in range(len(queue))])
+        if row >= len(program[1]):
+            QMessageBox.warning(self, "从此行开始", f"行号超出范围: {row}（共 {len(program[1])} 条指令）")
+            return
+        registers = {reg: data["value"] for reg, data in t.registers.items()}
+        memory = dict(t.memory)
+        t.reset()
+        for reg, value in registers.items():
+            t.registers[reg]["value"] = value
+        t.memory = memory
+        t.start_program(*program, row)
+        # 从中间开始的运行与加载的程序不是同一作业，不查找也不写入结果缓存
+        self._result_key = None
+        self.cache_label.hide()
+        self._prev_state = None
+        self.update_tables(all_registers=True)
+
     def load_instructions(self):
-        """从文件加载指令。"""
+        """从文件加载指令（在后台线程中解析，表格逐批填充）。"""
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getOpenFileName(self, "Open Instruction File", "", "Text Files (*.txt);;All Files (*)", options=options)
         if file_path:
-            with open(file_path, "r") as file:
-                lines = [instr.rstrip('\n') for instr in file.readlines()]
+            self.start_loading(file_path)
 
-            # 在加载前重置模拟器状态
-            self.tomasulo.reset()
+    def start_loading(self, file_path):
+        """启动后台加载；若已有加载在进行则先取消。"""
+        self.cancel_loading()
+        if self._loader_thread is not None:
+            self._loader_thread.wait()
 
-            errors = []
-            loaded = 0
-            for lineno, raw in enumerate(lines, start=1):
-                line = raw.strip()
-                if not line:
-                    continue
-                try:
-                    self.tomasulo.add_instruction(line)
-                    loaded += 1
-                except Exception as e:
-                    errors.append(f"Line {lineno}: {line} -> {e}")
+        # 在加载前重置模拟器状态
+        self.tomasulo.reset()
+        self._close_indexed_program()
+        self.jump_label.hide()
+        self._prev_state = None
+        self.update_tables()
+        self._load_errors = []
+        # 工作线程已解析的静态程序：含分支的程序在加载完成后直接交给 start_program
+        # （标签可能向后引用），GUI 线程不再重新解析
+        self._program_lines = []
+        self._program_texts = []
+        self._program_parsed = []
+        self._program_labels = {}
+        # 分支目标标签 -> 首次引用的指令文本，加载完成时检查是否都有定义
+        self._branch_targets = {}
+        self._label_errors = 0
+        self._control_flow = False
 
-            self.update_tables()
-            # 加载并更新表后，滚动到最后加载的指令以便可见
-            last_row = self.instruction_table.rowCount() - 1
-            if last_row >= 0:
-                item = self.instruction_table.item(last_row, 0)
-                if item:
-                    self.instruction_table.scrollToItem(item, QAbstractItemView.PositionAtCenter)
-                    try:
-                        self.instruction_table.selectRow(last_row)
-                    except Exception:
-                        pass
+        self._loader = InstructionLoader(file_path)
+        self._loader_thread = QThread(self)
+        self._loader.moveToThread(self._loader_thread)
+        self._loader_thread.started.connect(self._loader.run)
+        self._loader.chunk_ready.connect(self._on_load_chunk)
+        self._loader.indexed.connect(self._on_load_indexed)
+        self._loader.line_error.connect(self._on_load_error)
+        self._loader.progress.connect(self._on_load_progress)
+        self._loader.finished.connect(self._on_load_finished)
+        self._loader.finished.connect(self._loader_thread.quit)
+
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        self.load_cancel_button.show()
+        # 加载期间禁止会改变或运行模拟器的操作：重置/添加指令会使 `_program_lines`
+        # （结果缓存的键）与模拟器中的指令不一致，运行到断点会模拟只加载了一部分的程序
+        for button in (self.load_button, self.step_button, self.reset_button, self.add_instr_button,
+                       self.run_to_breakpoint_button, self.compare_button, self.start_from_row_button):
+            button.setEnabled(False)
+        self._loader_thread.start()
 
-            if errors:
-                QMessageBox.warning(self, "Load Instructions - Some lines failed",
-                                    "Some instruction lines were invalid and skipped:\n" + "\n".join(errors))
+    def cancel_loading(self):
+        """请求取消正在进行的后台加载。"""
+        if self._loader is not None:
+            self._loader.cancel()
+
+    def _on_load_chunk(self, chunk):
+        """把一批已解析指令加入模拟器，并只追加对应的表格行。"""
+        added = False
+        for raw, line_labels, text, parsed in chunk:
+            self._program_lines.append(raw)
+            for label in line_labels:
+                if label in self._program_labels:
+                    self._load_errors.append(f"重复的标签 {label}: {raw}")
+                    self._label_errors += 1
+                self._program_labels[label] = len(self._program_texts)
+            if text is None:
+                continue
+            self._program_texts.append(text)
+            self._program_parsed.append(parsed)
+            if parsed["op"] in BRANCH_OPS:
+                self._control_flow = True
+                self._branch_targets.setdefault(parsed["target"], text)
+            if not self._control_flow:
+                self.tomasulo.add_instruction(text, parsed)
+                added = True
+        if added:
+            self.instruction_model.sync(self.tomasulo, highlight=False)
+
+    def _on_load_indexed(self, program):
+        """索引加载：模拟器从第 0 行开始按需取指，表格随步进增长。"""
+        self._indexed_program = program
+        program.start(self.tomasulo)
+
+    def _close_indexed_program(self):
+        if self._indexed_program is not None:
+            self._indexed_program.close()
+            self._indexed_program = None
+
+    def _on_load_error(self, lineno, line, message):
+        self._load_errors.append(f"Line {lineno}: {line} -> {message}")
+
+    def _on_load_progress(self, done, total):
+        self.load_progress.setValue(int(done * 1000 / total) if total else 1000)
+
+    def _on_load_finished(self, parsed_count, error_count, cancelled):
+        if self._indexed_program is not None:
+            loaded = parsed_count
+        elif self._control_flow and not cancelled:
+            # 含分支：使用工作线程解析的静态程序，动态指令在步进时按需展开
+            self.tomasulo.reset()
+            undefined = [f"未定义的标签: {label} ('{text}')"
+                         for label, text in self._branch_targets.items() if label not in self._program_labels]
+            self._load_errors += undefined
+            self._label_errors += len(undefined)
+            if self._label_errors:
+                error_count += self._label_errors
             else:
-                QMessageBox.information(self, "Load Instructions", f"Loaded {loaded} instructions")
+                self.tomasulo.start_program(self._program_texts, self._program_parsed, self._program_labels)
+            self.update_tables()
+            loaded = len(self.tomasulo.program or [])
+        else:
+            loaded = len(self.tomasulo.instruction_queue)
+        self._loaded_program = self._program_lines if self._control_flow and not cancelled and not error_count else None
+        if not cancelled and not error_count:
+            self._lookup_cached_result(self._program_lines)
+        else:
+            self._result_key = None
+            self.cache_label.hide()
+        self._program_lines = []
+        self._program_texts = []
+        self._program_parsed = []
+        self._program_labels = {}
+        self._branch_targets = {}
+        self.load_progress.hide()
+        self.load_cancel_button.hide()
+        for button in (self.load_button, self.step_button, self.reset_button, self.add_instr_button,
+                       self.run_to_breakpoint_button, self.compare_button, self.start_from_row_button):
+            button.setEnabled(True)
+        self._loader = None
+        # 新加载的行全部视为未变化，下一次步进只高亮真正的变化
+        self.instruction_model.sync(self.tomasulo, highlight=False)
+        self._prev_state = self._snapshot_state(self.tomasulo.get_state())
+        self._apply_critical_path_overlay()
+        self._sync_timeline()
+
+        # 加载完成后，滚动到最后加载的指令以便可见
+        self._scroll_to_last_row()
+
+        if cancelled:
+            QMessageBox.information(self, "Load Instructions", f"已取消，已加载 {loaded} 条指令")
+        elif error_count:
+            shown = self._load_errors[:50]
+            more = f"\n... 另有 {error_count - len(shown)} 行" if error_count > len(shown) else ""
+            QMessageBox.warning(self, "Load Instructions - Some lines failed",
+                                "Some instruction lines were invalid and skipped:\n" + "\n".join(shown) + more)
+        else:
+            QMessageBox.information(self, "Load Instructions", f"Loaded {loaded} instructions")
 
     def add_instruction_from_input(self):
         """从 QLineEdit 中添加单个指令到模拟器。"""
@@ -398,20 +1263,15 @@ class TomasuloUI(QMainWindow):
         instr_text = " ".join([op] + operands)
         try:
             self.tomasulo.add_instruction(instr_text)
+            # 程序已改变，加载时查到的缓存结果不再适用
+            self._result_key = None
+            self.cache_label.hide()
             # 清除操作数输入（保持 op 选择）
             for w in self.operand_inputs:
                 w.clear()
             self.update_tables()
             # 滚动 instruction_table 以显示新添加的指令（最后一行）
-            last_row = self.instruction_table.rowCount() - 1
-            if last_row >= 0:
-                item = self.instruction_table.item(last_row, 0)
-                if item:
-                    self.instruction_table.scrollToItem(item, QAbstractItemView.PositionAtCenter)
-                    try:
-                        self.instruction_table.selectRow(last_row)
-                    except Exception:
-                        pass
+            self._scroll_to_last_row()
             QMessageBox.information(self, "Add Instruction", f"已添加: {instr_text}")
         except Exception as e:
             QMessageBox.warning(self, "Add Instruction Failed", f"添加失败: {e}")
@@ -420,15 +1280,19 @@ class TomasuloUI(QMainWindow):
         """根据选定的操作码重建操作数输入字段。"""
         # op -> 操作数占位符映射
         mapping = {
-            "ADD": ["dest (e.g. F3)", "src1 (e.g. F1)", "src2 (e.g. F2)"],
-            "SUB": ["dest (e.g. F3)", "src1 (e.g. F1)", "src2 (e.g. F2)"],
-            "MUL": ["dest (e.g. F3)", "src1 (e.g. F1)", "src2 (e.g. F2)"],
-            "DIV": ["dest (e.g. F3)", "src1 (e.g. F1)", "src2 (e.g. F2)"],
             "LOAD": ["dest (e.g. F1)", "address (int)"],
             "STORE": ["address (int)", "src (e.g. F1)"],
         }
+        # 运算操作按注册表中的操作数形式生成占位符
+        operand_placeholders = {
+            "dest": "dest (e.g. F3)",
+            "src1": "src1 (e.g. F1)",
+            "src2": "src2 (e.g. F2)",
+            "src3": "src3 (e.g. F4)",
+        }
         op = self.op_combo.currentText()
-        placeholders = mapping.get(op, [])
+        spec = OPS.get(op)
+        placeholders = mapping.get(op) or ([operand_placeholders[key] for key in spec.operands] if spec else [])
 
         # 清除现有的操作数部件
         for i in reversed(range(self.operand_layout.count())):
@@ -443,6 +1307,7 @@ class TomasuloUI(QMainWindow):
             "dest (e.g. F3)": "reg",
             "src1 (e.g. F1)": "reg",
             "src2 (e.g. F2)": "reg",
+            "src3 (e.g. F4)": "reg",
             "address (int)": "int",
             "src (e.g. F1)": "reg",
         }
@@ -519,9 +1384,21 @@ class TomasuloUI(QMainWindow):
                     errors.append(f"{label}: 格式不正确")
         return all_ok, errors
 
+    def closeEvent(self, event):
+        """关闭窗口前停止后台加载线程。"""
+        self.cancel_loading()
+        if self._loader_thread is not None:
+            self._loader_thread.quit()
+            self._loader_thread.wait()
+        self._close_indexed_program()
+        super().closeEvent(event)
+
     def reset_simulation(self):
         """重置模拟器状态。"""
         self.tomasulo.reset()
+        self._result_key = None
+        self._loaded_program = None
+        self.cache_label.hide()
         self.update_tables()
 
     def toggle_debug(self, state):
@@ -532,16 +1409,33 @@ class TomasuloUI(QMainWindow):
         if enabled:
             # 填充现有日志
             logs = self.tomasulo.get_logs(0)
+            self._ensure_log_view()
             self.log_view.clear()
             for line in logs:
                 self.log_view.appendPlainText(line)
             self._log_index = len(logs)
             self.log_view.show()
-        else:
+        elif self.log_view is not None:
             self.log_view.hide()
 
-if __name__ == "__main__":
+
+def _report_startup(app):
+    """启动基准模式：窗口首次绘制后把启动耗时写入 TOMASULO_STARTUP_BENCH 指定的文件并退出。"""
+    elapsed_ms = (time.perf_counter() - _START) * 1000
+    with open(os.environ["TOMASULO_STARTUP_BENCH"], "w") as f:
+        f.write(f"{elapsed_ms:.1f}\n")
+    app.quit()
+
+
+def main():
     app = QApplication(sys.argv)
     window = TomasuloUI()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if os.environ.get("TOMASULO_STARTUP_BENCH"):
+        # 在 update_tables 的延迟填充之后触发，计入首屏内容
+        QTimer.singleShot(0, lambda: _report_startup(app))
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -10,25 +10,27 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # 排除界面用不到的模块，缩小 PYZ 并减少冷启动时的解包与导入
+    excludes=['tkinter', 'unittest', 'pydoc', 'doctest', 'numpy',
+              'PyQt5.QtNetwork', 'PyQt5.QtQml', 'PyQt5.QtQuick', 'PyQt5.QtSql',
+              'PyQt5.QtMultimedia', 'PyQt5.QtWebEngineWidgets', 'PyQt5.QtTest'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
+# 使用 onedir 布局：onefile 每次启动都要把依赖解包到临时目录，冷启动明显更慢
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    # UPX 压缩的 DLL 每次加载都需解压，关闭以加快启动
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +38,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
@@ -0,0 +1,243 @@
+"""操作注册表：每个操作声明操作数形式、计算函数、默认延迟、功能单元类别与类别（kind）。
+
+`Tomasulo` 的解析、发射、执行、写回以及顺序参考执行都通过 `OPS` 查表分派，
+不再各自用 if/elif 列出操作名；新增运算操作只需 `register_op`：
+
+    register_op("MAX", "rrr", lambda a, b: max(a, b), fu_class="ADDER", latency=2)
+
+操作数形式（`SHAPES`）给出指令文本中操作数的顺序与解析后字典的键：
+- `rrr`：dest src1 src2（ADD F3 F1 F2）
+- `rr`：dest src1（SQRT F2 F1）
+- `rrrr`：dest src1 src2 src3（FMA F4 F1 F2 F3，F4 = F1 × F2 + F3）
+- `ra` / `ar`：LOAD dest addr / STORE addr src
+- `rrl` / `l`：BEQ src1 src2 label / JMP label
+- 空：BARRIER
+
+类别决定保留站如何取操作数与写回：`alu`（寄存器源操作数，结果写入 dest）、
+`load`、`store`、`branch`、`barrier`。通过 `register_op` 新增的操作只能是 `alu`。
+
+延迟模型（`make_latency_model`，按操作配置在 `Tomasulo.latency_models` 中）：
+- 固定（默认）：取 `op_latencies[op]`。
+- `{"model": "early_out", "fast": 2}`：依赖操作数的提前结束。任一源操作数为 0，
+  或最后一个源操作数为 2 的整数次幂（含 ±1）时只需 `fast` 个周期，否则为配置的延迟。
+- `{"model": "sampled", "values": [4, 8, 20], "weights": [6, 3, 1], "seed": 0}`：
+  按权重抽样。抽样由 (种子, 动态指令下标) 的哈希决定，与执行顺序无关，
+  因此同一程序与配置的结果总是相同。
+延迟在操作数就绪、开始执行时确定（非流水化功能单元的占用时间随之变化）。
+"""
+import math
+from bisect import bisect_right
+from itertools import accumulate
+
+# 操作数形式 -> 解析后字典中各操作数的键（按指令文本中的顺序）
+SHAPES = {
+    "rrr": ("dest", "src1", "src2"),
+    "rr": ("dest", "src1"),
+    "rrrr": ("dest", "src1", "src2", "src3"),
+    "ra": ("dest", "addr"),
+    "ar": ("addr", "src"),
+    "rrl": ("src1", "src2", "target"),
+    "l": ("target",),
+    "": (),
+}
+
+# 操作数个数错误时的提示
+_USAGE = {
+    "rrr": "需要3个操作数: dest src1 src2",
+    "rr": "需要2个操作数: dest src1",
+    "rrrr": "需要4个操作数: dest src1 src2 src3",
+    "ra": "需要目标寄存器和地址",
+    "ar": "需要地址和源寄存器",
+    "rrl": "需要两个源寄存器和目标标签: src1 src2 label",
+    "l": "需要目标标签",
+    "": "不接受操作数",
+}
+
+# 保留站的源操作数槽位
+SOURCE_SLOTS = ("src1", "src2", "src3")
+
+KINDS = ("alu", "load", "store", "branch", "barrier")
+_ALU_SHAPES = ("rr", "rrr", "rrrr")
+
+
+class Op:
+    __slots__ = ("name", "shape", "operands", "sources", "source_fields", "usage", "compute", "fu_class", "latency", "kind")
+
+    def __init__(self, name, shape, compute, fu_class, latency, kind):
+        self.name = name
+        self.shape = shape
+        self.operands = SHAPES[shape]
+        # 寄存器源操作数（按槽位顺序），执行时按此顺序传给 compute
+        self.sources = tuple(key for key in self.operands if key in SOURCE_SLOTS)
+        # 保留站中对应的 (值字段, 寄存器字段)
+        self.source_fields = tuple((f"{key}_value", key) for key in self.sources)
+        self.usage = _USAGE[shape]
+        self.compute = compute
+        self.fu_class = fu_class
+        self.latency = latency
+        self.kind = kind
+
+    def __repr__(self):
+        return f"<Op {self.name} {self.shape or '-'} {self.kind}>"
+
+
+OPS = {}
+# 操作 -> 功能单元类别（随注册更新）
+FU_CLASSES = {}
+
+
+def _register(name, shape, compute, fu_class, latency, kind):
+    op = OPS[name] = Op(name, shape, compute, fu_class, latency, kind)
+    if fu_class is not None:
+        FU_CLASSES[name] = fu_class
+    return op
+
+
+def register_op(name, shape, compute, fu_class, latency, replace=False):
+    """注册一个运算操作（类别 `alu`）；`compute` 按源操作数顺序接收值并返回结果。"""
+    name = name.upper()
+    if shape not in _ALU_SHAPES:
+        raise ValueError(f"运算操作的操作数形式必须是 {'/'.join(_ALU_SHAPES)}: {shape}")
+    if name in OPS and (not replace or OPS[name].kind != "alu"):
+        raise ValueError(f"操作已存在: {name}")
+    if not isinstance(latency, int) or latency < 1:
+        raise ValueError(f"延迟必须为正整数: {latency}")
+    return _register(name, shape, compute, fu_class, latency, "alu")
+
+
+def _div(a, b):
+    return (a / b) if b != 0 else 0
+
+
+def _sqrt(a):
+    if not a >= 0:
+        return 0
+    try:
+        return math.sqrt(a)
+    except OverflowError:
+        return math.inf
+
+
+def _int(x):
+    """整数运算的操作数：截断为整数，非有限值视为 0。"""
+    try:
+        return int(x)
+    except (OverflowError, ValueError):
+        return 0
+
+
+_register("ADD", "rrr", lambda a, b: a + b, "ADDER", 5, "alu")
+_register("SUB", "rrr", lambda a, b: a - b, "ADDER", 5, "alu")
+_register("MUL", "rrr", lambda a, b: a * b, "MULT", 6, "alu")
+_register("DIV", "rrr", _div, "DIVIDER", 8, "alu")
+_register("LOAD", "ra", None, "MEM", 4, "load")
+_register("STORE", "ar", None, "MEM", 4, "store")
+_register("BEQ", "rrl", lambda a, b: a == b, "BRANCH", 1, "branch")
+_register("BNE", "rrl", lambda a, b: a != b, "BRANCH", 1, "branch")
+_register("JMP", "l", lambda: True, "BRANCH", 1, "branch")
+_register("BARRIER", "", None, None, 0, "barrier")
+_register("FMA", "rrrr", lambda a, b, c: a * b + c, "MULT", 6, "alu")
+_register("SQRT", "rr", _sqrt, "DIVIDER", 12, "alu")
+# 整数运算：操作数先截断为整数；移位量取低 6 位
+_register("AND", "rrr", lambda a, b: _int(a) & _int(b), "INT", 1, "alu")
+_register("OR", "rrr", lambda a, b: _int(a) | _int(b), "INT", 1, "alu")
+_register("XOR", "rrr", lambda a, b: _int(a) ^ _int(b), "INT", 1, "alu")
+_register("SHL", "rrr", lambda a, b: _int(a) << (_int(b) & 63), "INT", 1, "alu")
+_register("SHR", "rrr", lambda a, b: _int(a) >> (_int(b) & 63), "INT", 1, "alu")
+
+# 条件/无条件跳转
+BRANCH_OPS = tuple(name for name, op in OPS.items() if op.kind == "branch")
+
+# 屏障：等待所有更早的指令写回（保留站全部空闲）后退休，不占用保留站与发射宽度。
+# 屏障之后的指令从空闲的机器开始执行，可作为分片模拟的切分点（见 shard.py）
+BARRIER_OP = "BARRIER"
+
+
+def default_latencies():
+    """各操作的默认延迟（`Tomasulo.op_latencies` 的初始值）。"""
+    return {name: op.latency for name, op in OPS.items() if op.kind != "barrier"}
+
+
+def evaluate(op, *operands):
+    """计算一条操作的结果（算术结果，或分支是否跳转）。"""
+    spec = OPS.get(op)
+    if spec is None or spec.compute is None:
+        raise ValueError(f"不支持的操作: {op}")
+    return spec.compute(*operands)
+
+
+# ---- 延迟模型 ----
+
+LATENCY_MODELS = ("fixed", "early_out", "sampled")
+
+
+def _power_of_two(x):
+    if isinstance(x, float):
+        if not math.isfinite(x) or not x.is_integer():
+            return False
+        x = int(x)
+    elif not isinstance(x, int):
+        return False
+    x = abs(x)
+    return x > 0 and x & (x - 1) == 0
+
+
+class EarlyOutLatency:
+    """任一源操作数为 0，或最后一个源操作数为 2 的整数次幂时提前结束。"""
+
+    def __init__(self, fast):
+        if not isinstance(fast, int) or fast < 1:
+            raise ValueError(f"early_out 的 fast 必须为正整数: {fast}")
+        self.fast = fast
+
+    def __call__(self, operands, base, index):
+        if operands and (any(v == 0 for v in operands) or _power_of_two(operands[-1])):
+            return min(self.fast, base)
+        return base
+
+    def minimum(self, base):
+        return min(self.fast, base)
+
+
+class SampledLatency:
+    """按权重抽样；抽样值由 (种子, 动态指令下标) 的哈希决定。"""
+
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, values, weights=None, seed=0):
+        if not values or any(not isinstance(v, int) or v < 1 for v in values):
+            raise ValueError(f"sampled 的 values 必须是正整数列表: {values}")
+        weights = [1] * len(values) if weights is None else weights
+        if len(weights) != len(values) or any(w < 0 for w in weights) or sum(weights) <= 0:
+            raise ValueError(f"sampled 的 weights 无效: {weights}")
+        self.values = list(values)
+        self.cumulative = list(accumulate(weights))
+        self.seed = seed
+
+    def _unit(self, index):
+        # splitmix64：把 (种子, 下标) 映射为 [0, 1) 中的均匀值
+        x = (self.seed * 0x9E3779B97F4A7C15 + (index or 0) + 1) & self._MASK
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & self._MASK
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & self._MASK
+        return (x ^ (x >> 31)) / 2.0 ** 64
+
+    def __call__(self, operands, base, index):
+        return self.values[bisect_right(self.cumulative, self._unit(index) * self.cumulative[-1])]
+
+    def minimum(self, base):
+        return min(self.values)
+
+
+def make_latency_model(spec):
+    """把配置中的模型描述编译为可调用对象；固定延迟返回 None。描述无效时引发 ValueError。"""
+    if not isinstance(spec, dict) or spec.get("model") not in LATENCY_MODELS:
+        raise ValueError(f"未知的延迟模型: {spec}")
+    model = spec["model"]
+    try:
+        if model == "fixed":
+            return None
+        if model == "early_out":
+            return EarlyOutLatency(spec.get("fast", 1))
+        return SampledLatency(spec.get("values"), spec.get("weights"), spec.get("seed", 0))
+    except TypeError as e:
+        raise ValueError(f"延迟模型参数无效: {spec} ({e})")
@@ -0,0 +1,327 @@
+"""大型指令文件的索引加载：行偏移索引 + mmap，随机访问任意一行并从任意位置开始模拟。
+
+第一次打开文件时顺序扫描一遍：逐行解析（检查格式、收集标签），记录每条指令所在行的
+字节偏移，写入文件旁的索引 `<文件>.idx`。之后再次打开同一文件只读取并映射索引，
+不再解析整个文件；指令在被访问时才从映射的文件中取出该行解析（按行缓存）。
+
+索引布局（与状态快照相同的风格，数组在前、尾部为 JSON 元数据）：
+    b"TIDX" + 4 字节填充
+    每条指令所在行的起始偏移（`Q`，小端序）
+    尾部 JSON：格式版本、文件大小、修改时间、内容摘要、指令条数、标签 -> PC、是否含分支
+    <Q 尾部长度> b"TIDX"
+
+文件大小、修改时间或摘要（文件大小与首尾各 1 MiB 的 SHA-256）不一致时重建索引；
+索引无法写入（如只读目录）时只在内存中使用。
+
+    program = IndexedProgram("big.txt")
+    program.text(5_000_000)                        # 第 5,000,000 条指令的文本
+    t = build_engine(program, 5_000_000, state={"registers": {"F1": 3}})   # 从该条开始模拟
+    t.run()
+
+用法：
+    python program_index.py big.txt                 # 建立（或校验）索引并报告条数与耗时
+    python program_index.py big.txt --row 5000000   # 显示第 N 条指令
+    python program_index.py big.txt --run-from 5000000 --state image.json --max-cycles 10000
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import Sequence
+
+import runner
+from tomasulo import BRANCH_OPS, Tomasulo
+
+MAGIC = b"TIDX"
+FORMAT_VERSION = 1
+INDEX_SUFFIX = ".idx"
+_TAIL = struct.Struct("<Q")
+_HEADER = 8
+# 摘要覆盖的首尾字节数
+_DIGEST_SPAN = 1 << 20
+# 已解析行缓存的上限（超出时清空）；循环体反复取指同一 PC 时命中
+_CACHE_ROWS = 1 << 16
+
+
+def _file_digest(data):
+    """文件大小与首尾各 `_DIGEST_SPAN` 字节的 SHA-256。"""
+    digest = hashlib.sha256(str(len(data)).encode())
+    digest.update(data[:_DIGEST_SPAN])
+    digest.update(data[max(len(data) - _DIGEST_SPAN, 0):])
+    return digest.hexdigest()
+
+
+def _map(f):
+    """只读映射整个文件；空文件返回 b""（mmap 不接受长度为 0 的映射）。"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_index(path, parser=None):
+    """扫描并解析指令文件，返回索引的 bytes；格式错误时引发 ValueError（带行号）。"""
+    parser = parser or Tomasulo()
+    offsets = array("Q")
+    labels = {}
+    # 分支目标标签 -> 首次引用的行号
+    targets = {}
+    stat = os.stat(path)
+    offset = 0
+    with open(path, "rb") as f:
+        for lineno, raw in enumerate(f, start=1):
+            start = offset
+            offset += len(raw)
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            try:
+                line_labels, text, parsed = parser.parse_program_line(line)
+            except ValueError as e:
+                raise ValueError(f"第 {lineno} 行: {e}")
+            for label in line_labels:
+                if label in labels:
+                    raise ValueError(f"第 {lineno} 行: 重复的标签 {label}")
+                labels[label] = len(offsets)
+            if text is not None:
+                offsets.append(start)
+                if parsed["op"] in BRANCH_OPS:
+                    targets.setdefault(parsed["target"], lineno)
+        for label, lineno in targets.items():
+            if label not in labels:
+                raise ValueError(f"第 {lineno} 行: 未定义的标签 {label}")
+        data = _map(f)
+        try:
+            digest = _file_digest(data)
+        finally:
+            if data:
+                data.close()
+    meta = {
+        "version": FORMAT_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+        "rows": len(offsets),
+        "labels": labels,
+        "branches": bool(targets),
+    }
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    footer = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([MAGIC, bytes(_HEADER - len(MAGIC)), offsets.tobytes(), footer, _TAIL.pack(len(footer)), MAGIC])
+
+
+def read_index(buffer):
+    """校验索引的魔数与版本，返回 (偏移数组的只读视图, 元数据字典)。"""
+    view = memoryview(buffer).cast("B")
+    end = len(view)
+    if end < _HEADER + _TAIL.size + len(MAGIC) or view[:len(MAGIC)] != MAGIC or view[end - len(MAGIC):] != MAGIC:
+        raise ValueError("不是指令文件索引")
+    (footer_len,) = _TAIL.unpack(view[end - len(MAGIC) - _TAIL.size:end - len(MAGIC)])
+    footer_start = end - len(MAGIC) - _TAIL.size - footer_len
+    if footer_start < _HEADER:
+        raise ValueError("索引已损坏：尾部长度无效")
+    meta = json.loads(bytes(view[footer_start:footer_start + footer_len]))
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的索引版本: {meta.get('version')}")
+    if _HEADER + meta["rows"] * 8 != footer_start:
+        raise ValueError("索引已损坏：偏移数组长度不符")
+    offsets = view[_HEADER:footer_start]
+    if sys.byteorder == "big":
+        swapped = array("Q", bytes(offsets))
+        swapped.byteswap()
+        return swapped, meta
+    return offsets.cast("Q"), meta
+
+
+class _Rows(Sequence):
+    """按行号访问索引程序的只读序列（文本或已解析字典），供 `Tomasulo.start_program` 使用。"""
+
+    def __init__(self, program, field):
+        self._program = program
+        self._field = field
+
+    def __len__(self):
+        return self._program.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._program.rows))]
+        return self._program.row(row)[self._field]
+
+
+class IndexedProgram:
+    """通过行偏移索引与 mmap 访问的指令文件（见模块说明）。
+
+    属性：`rows`（指令条数）、`labels`（标签 -> 行号）、`branches`（是否含分支）、
+    `texts` / `parsed`（按行号访问的文本与已解析字典序列）、`rebuilt`（本次是否重建了索引）。
+    """
+
+    def __init__(self, path, index_path=None, rebuild=False):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._parser = Tomasulo()
+        # 先置空全部资源：之后任一步失败时 close() 只释放已打开的部分
+        self._file = None
+        self._data = None
+        self._index_file = None
+        self._index_map = None
+        self._offsets = None
+        self.rebuilt = False
+        try:
+            self._file = open(path, "rb")
+            self._data = _map(self._file)
+            loaded = None if rebuild else self._open_saved_index()
+            if loaded is None:
+                blob = build_index(path, self._parser)
+                self.rebuilt = True
+                loaded = read_index(blob)
+                self._save(blob)
+        except BaseException:
+            self.close()
+            raise
+        self._offsets, meta = loaded
+        self.rows = meta["rows"]
+        self.labels = meta["labels"]
+        self.branches = meta["branches"]
+        self._cache = {}
+        self.texts = _Rows(self, 0)
+        self.parsed = _Rows(self, 1)
+
+    def _open_saved_index(self):
+        """读取并校验已保存的索引；不存在、损坏或与文件不一致时返回 None。"""
+        try:
+            f = open(self.index_path, "rb")
+        except OSError:
+            return None
+        index_map = None
+        try:
+            index_map = _map(f)
+            offsets, meta = read_index(index_map)
+        except (OSError, ValueError):
+            if index_map:
+                index_map.close()
+            f.close()
+            return None
+        stat = os.fstat(self._file.fileno())
+        if (meta["size"], meta["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns) \
+                or meta["digest"] != _file_digest(self._data):
+            if isinstance(offsets, memoryview):
+                offsets.release()
+            index_map.close()
+            f.close()
+            return None
+        self._index_file = f
+        self._index_map = index_map
+        return offsets, meta
+
+    def _save(self, blob):
+        """原子地写入索引；目录不可写时忽略（本次只在内存中使用）。"""
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return self.rows
+
+    def line_offset(self, row):
+        """第 `row` 条指令所在行在文件中的字节偏移。"""
+        if not 0 <= row < self.rows:
+            raise IndexError(f"行号超出范围: {row}（共 {self.rows} 条）")
+        return self._offsets[row]
+
+    def row(self, row):
+        """返回第 `row` 条指令的 (文本, 已解析字典)，从映射的文件中取出该行解析。"""
+        cached = self._cache.get(row)
+        if cached is not None:
+            return cached
+        start = self.line_offset(row)
+        end = self._data.find(b"\n", start)
+        line = self._data[start:end if end >= 0 else len(self._data)].decode("utf-8", errors="replace")
+        _labels, text, parsed = self._parser.parse_program_line(line)
+        if len(self._cache) >= _CACHE_ROWS:
+            self._cache.clear()
+        cached = self._cache[row] = (text, parsed)
+        return cached
+
+    def text(self, row):
+        return self.row(row)[0]
+
+    def start(self, t, row=0):
+        """让模拟器从第 `row` 条指令开始按需取指（寄存器与内存取模拟器的当前值）。"""
+        t.start_program(self.texts, self.parsed, self.labels, row)
+
+    def close(self):
+        """释放映射与文件（可重复调用）。"""
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        for resource in (self._index_map, self._index_file, self._data, self._file):
+            if resource is not None and not isinstance(resource, bytes):
+                resource.close()
+        self._offsets = self._index_map = self._index_file = self._data = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_engine(program, row=0, config=None, state=None):
+    """创建模拟器，以 `state`（寄存器/内存映像，格式同 runner 的作业）为初始状态，从第 `row` 条开始。"""
+    t = runner.build_engine([], config, state)
+    program.start(t, row)
+    return t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="为大型指令文件建立行偏移索引并随机访问")
+    parser.add_argument("program", help="指令文件")
+    parser.add_argument("--row", type=int, help="显示第 N 条指令（从 0 开始）")
+    parser.add_argument("--run-from", type=int, help="从第 N 条指令开始模拟")
+    parser.add_argument("--state", help="初始寄存器/内存映像 JSON（{\"registers\": {...}, \"memory\": {...}}）")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    parser.add_argument("--max-cycles", type=int, default=runner.DEFAULT_MAX_CYCLES)
+    parser.add_argument("--rebuild", action="store_true", help="忽略已保存的索引，重新建立")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        program = IndexedProgram(args.program, rebuild=args.rebuild)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    with program:
+        action = "建立索引" if program.rebuilt else "读取已保存的索引"
+        print(f"{action}：{program.rows} 条指令，{len(program.labels)} 个标签，"
+              f"耗时 {time.perf_counter() - started:.3f} 秒（{program.index_path}）")
+        if args.row is not None:
+            print(f"第 {args.row} 条（偏移 {program.line_offset(args.row)}）：{program.text(args.row)}")
+        if args.run_from is not None:
+            config = state = None
+            if args.config:
+                with open(args.config) as f:
+                    config = json.load(f)
+            if args.state:
+                with open(args.state) as f:
+                    state = json.load(f)
+            t = build_engine(program, args.run_from, config, state)
+            t.run(max_cycles=args.max_cycles)
+            status = "完成" if t.is_finished() else "达到周期上限"
+            print(f"从第 {args.run_from} 条开始：{status}，{t.clock} 个周期，{len(t.instruction_queue)} 条动态指令")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""磁盘结果缓存：按内容寻址保存 `runner` 的模拟结果，按总大小做 LRU 淘汰。
+
+键为 `runner.job_key`（程序哈希 + 规范化配置 + 初始状态 + 周期上限 + 引擎版本），
+每个结果保存为 `<目录>/<键前两位>/<键>.trc`。目录中的 `VERSION` 文件记录
+`tomasulo.ENGINE_VERSION` 与存储格式版本，打开缓存时若不一致则删除全部条目
+（只删除两位十六进制分片目录中的 `.trc` 文件，目录中的其他文件不受影响）。
+
+存储格式（zlib 压缩）：
+    b"TRC1" | <III 元数据长度, 文本表长度, 动态指令数>
+    | 元数据 JSON（周期数、寄存器、内存、分支统计等，不含时间表）
+    | 去重后的指令文本表（"\\n" 分隔）
+    | 每条动态指令的文本下标（array "I"）
+    | 时间表（array "q"，每条 4 个周期，未记录为 -1）
+
+循环展开出的动态指令共享文本，因此文本只保存一次。
+
+最近使用时间以文件 mtime 表示（命中时更新），总大小超过 `max_bytes` 时删除
+最久未使用的条目，直到降到上限的 90%。多个进程可共享同一目录：写入先写临时
+文件再原子替换，各进程的大小统计只是近似值。
+"""
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+from array import array
+
+from tomasulo import ENGINE_VERSION
+
+MAGIC = b"TRC1"
+FORMAT_VERSION = 1
+SUFFIX = ".trc"
+_HEADER = struct.Struct("<III")
+_HEX = frozenset("0123456789abcdef")
+
+
+def default_cache_dir():
+    """缓存目录：环境变量 TOMASULO_CACHE_DIR，否则为 ~/.cache/tomasulo。"""
+    return os.environ.get("TOMASULO_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "tomasulo")
+
+
+def encode_result(result):
+    """把结果字典编码为紧凑的字节串（逐周期增量不保存）。"""
+    meta = {k: v for k, v in result.items() if k not in ("timing", "deltas")}
+    interned = {}
+    indices = array("I")
+    cycles = array("q")
+    for text, *row in result.get("timing", ()):
+        indices.append(interned.setdefault(text, len(interned)))
+        cycles.extend(-1 if c is None else c for c in row)
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    text_bytes = "\n".join(interned).encode("utf-8")
+    payload = b"".join((_HEADER.pack(len(meta_bytes), len(text_bytes), len(indices)),
+                        meta_bytes, text_bytes, indices.tobytes(), cycles.tobytes()))
+    return MAGIC + zlib.compress(payload)
+
+
+def decode_result(data):
+    """`encode_result` 的逆操作；格式不符时引发 ValueError。"""
+    if data[:4] != MAGIC:
+        raise ValueError("不是结果缓存文件")
+    payload = memoryview(zlib.decompress(data[4:]))
+    meta_len, text_len, count = _HEADER.unpack_from(payload)
+    pos = _HEADER.size
+    result = json.loads(bytes(payload[pos:pos + meta_len]))
+    pos += meta_len
+    texts = bytes(payload[pos:pos + text_len]).decode("utf-8").split("\n") if text_len else []
+    pos += text_len
+    indices = array("I")
+    indices.frombytes(payload[pos:pos + count * indices.itemsize])
+    pos += count * indices.itemsize
+    cycles = array("q")
+    cycles.frombytes(payload[pos:pos + count * 4 * cycles.itemsize])
+    result["timing"] = [
+        [texts[indices[i]]] + [None if c < 0 else c for c in cycles[i * 4:i * 4 + 4]]
+        for i in range(count)
+    ]
+    return result
+
+
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._check_version()
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def _check_version(self):
+        """引擎或格式版本变化时清空缓存目录。"""
+        version = f"{ENGINE_VERSION}.{FORMAT_VERSION}"
+        path = os.path.join(self.directory, "VERSION")
+        try:
+            with open(path) as f:
+                current = f.read().strip()
+        except OSError:
+            current = None
+        if current == version:
+            return
+        # 只删除缓存自己的条目（两位十六进制分片目录中的 .trc 与临时文件），
+        # 目录中的其他内容原样保留
+        for sub in self._shard_dirs():
+            for entry in os.scandir(sub.path):
+                if entry.is_file() and entry.name.endswith((SUFFIX, ".tmp")):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+            try:
+                os.rmdir(sub.path)
+            except OSError:
+                pass
+        with open(path, "w") as f:
+            f.write(version)
+
+    def _shard_dirs(self):
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_dir() and len(entry.name) == 2 and all(c in _HEX for c in entry.name)]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+    def _entries(self):
+        """返回 [(mtime_ns, 大小, 路径)]。"""
+        entries = []
+        for sub in self._shard_dirs():
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(SUFFIX):
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        return entries
+
+    def get(self, key):
+        """返回缓存的结果字典；不存在或已损坏时返回 None。"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = decode_result(f.read())
+        except (OSError, ValueError, zlib.error, struct.error):
+            self.misses += 1
+            return None
+        now = time.time_ns()
+        try:
+            os.utime(path, ns=(now, now))
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """保存结果；必要时淘汰最久未使用的条目。"""
+        data = encode_result(result)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.size += len(data) - old_size
+        if self.size > self.max_bytes:
+            self.evict(int(self.max_bytes * 0.9))
+
+    def evict(self, target_bytes):
+        """按最近使用时间从旧到新删除条目，直到总大小不超过 `target_bytes`。"""
+        entries = sorted(self._entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= target_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self.size -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries())
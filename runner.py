@@ -0,0 +1,203 @@
+"""无界面批量模拟：把 (程序, 机器配置, 初始状态) 作业交给 `Tomasulo` 运行。
+
+作业与结果都是可 JSON 序列化的普通字典，既可在本进程中运行，也可提交到
+进程池（`run_batch`、`server.py`）。相同的 (程序, 配置, 初始状态) 总是得到
+相同的结果，`job_key` 给出用于结果缓存的内容哈希。
+
+作业字典：
+- `program`：指令行列表或多行字符串（可含标签与分支）。
+- `config`：`Tomasulo.get_config()` 格式的字典，可只含部分键。
+- `state`：可选的初始状态 `{"registers": {"F1": 3}, "memory": {"100": 7}}`。
+- `max_cycles`：周期上限，默认 `DEFAULT_MAX_CYCLES`。
+- `snapshot`：可选，`snapshot.dumps()` 得到的状态快照；给出时从该状态继续，忽略前三个键。
+
+结果字典包含最终周期数、是否完成、最终寄存器值与内存（只列出非零地址）、
+每条动态指令的时间表（`timing`：[文本, 发射, 开始执行, 执行完成, 写回]）以及分支统计，
+配置了缓存（`config["cache"]`）时还有各级命中统计（`cache`）；
+`simulate(..., deltas=True)` 时还包含逐周期增量（`deltas`）；`simulate_chunk` 分段运行并逐段返回增量。
+"""
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from tomasulo import ENGINE_VERSION, TIMING_FIELDS, Tomasulo
+
+DEFAULT_MAX_CYCLES = 1_000_000
+
+
+def normalize_program(program):
+    """把多行字符串或行列表规范为去掉首尾空白、不含空行的行列表。"""
+    if isinstance(program, str):
+        program = program.splitlines()
+    return [line.strip() for line in program if line.strip()]
+
+
+def program_hash(program):
+    """程序内容的 SHA-256（与空白行、行首尾空白无关）。"""
+    return hashlib.sha256("\n".join(normalize_program(program)).encode("utf-8")).hexdigest()
+
+
+def job_key(program, config=None, state=None, max_cycles=None):
+    """作业的内容哈希：(程序哈希, 规范化配置, 初始状态, 周期上限, 引擎版本)。
+
+    配置先经过 `Tomasulo.from_config(...).get_config()` 补全默认值，因此省略默认键
+    与显式写出默认值的配置得到相同的键。
+    """
+    canonical = {
+        "program": program_hash(program),
+        "config": Tomasulo.from_config(config or {}).get_config(),
+        "state": _normalize_state(state),
+        "max_cycles": DEFAULT_MAX_CYCLES if max_cycles is None else max_cycles,
+        "engine": ENGINE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _normalize_state(state):
+    state = state or {}
+    return {
+        "registers": dict(state.get("registers") or {}),
+        "memory": {str(int(addr)): value for addr, value in (state.get("memory") or {}).items()},
+    }
+
+
+def build_engine(program, config=None, state=None):
+    """创建并加载模拟器；程序或配置无效时引发 ValueError。
+
+    无界面运行不需要逐条日志，因此关闭 `log()`；进度可由 `t.counters` 观察。
+    """
+    t = Tomasulo.from_config(config or {})
+    t.log_enabled = False
+    state = _normalize_state(state)
+    for reg, value in state["registers"].items():
+        if reg not in t.registers:
+            raise ValueError(f"无效的寄存器: {reg}")
+        t.registers[reg]["value"] = value
+    for addr, value in state["memory"].items():
+        t.memory[int(addr)] = value
+    t.load_program(normalize_program(program))
+    return t
+
+
+def collect_result(t):
+    """从运行结束的模拟器中提取结果字典。"""
+    result = {
+        "cycles": t.clock,
+        "finished": t.is_finished(),
+        "instructions": len(t.instruction_queue),
+        "registers": {reg: data["value"] for reg, data in t.registers.items()},
+        "memory": {str(addr): value for addr, value in sorted(t.memory.items()) if value != 0},
+        "timing": [list(row) for row in t.instruction_queue.iter_timing()],
+        "branch_stats": dict(t.branch_stats),
+    }
+    if t.cache is not None:
+        result["cache"] = t.cache.stats()
+    return result
+
+
+def run_with_deltas(t, max_cycles):
+    """逐周期运行并记录增量，返回增量列表。
+
+    每个增量为 `{"cycle", "registers", "memory", "timing"}`，只包含本周期值发生
+    变化的寄存器、内存地址，以及时间字段发生变化的指令（[下标, 发射, 开始, 完成, 写回]，
+    取自引擎的 `timing_changes`，每周期的开销与本周期的变化数成正比）。
+    """
+    deltas = []
+    regs = {reg: data["value"] for reg, data in t.registers.items()}
+    memory = dict(t.memory)
+    while not t.is_finished() and t.clock < max_cycles:
+        t.step()
+        queue = t.instruction_queue
+        timing = [[index, *queue.timing_row(index)] for index in sorted(t.timing_changes)]
+        changed_regs = {}
+        for reg, data in t.registers.items():
+            if data["value"] != regs[reg]:
+                changed_regs[reg] = regs[reg] = data["value"]
+        changed_mem = {}
+        if t.memory != memory:
+            for addr, value in t.memory.items():
+                if memory.get(addr) != value:
+                    changed_mem[str(addr)] = memory[addr] = value
+        deltas.append({"cycle": t.clock, "registers": changed_regs, "memory": changed_mem, "timing": timing})
+    return deltas
+
+
+def simulate(program, config=None, state=None, max_cycles=None, deltas=False):
+    """运行一个作业并返回结果字典（可在进程池中调用）。"""
+    return _run(build_engine(program, config, state), max_cycles, deltas)
+
+
+def resume(data, max_cycles=None, deltas=False):
+    """从 `snapshot.dumps` 的快照继续运行到结束或 `max_cycles`，返回与 `simulate` 相同的结果字典。
+
+    快照是一段 bytes，跨进程传递只需复制这段缓冲区（可在进程池中调用）。
+    """
+    from snapshot import loads
+    return _run(loads(data), max_cycles, deltas)
+
+
+def _run(t, max_cycles, deltas):
+    limit = DEFAULT_MAX_CYCLES if max_cycles is None else max_cycles
+    if deltas:
+        cycle_deltas = run_with_deltas(t, limit)
+    else:
+        t.run(max_cycles=limit)
+    result = collect_result(t)
+    if deltas:
+        result["deltas"] = cycle_deltas
+    return result
+
+
+def simulate_chunk(job, cycles):
+    """逐周期运行作业至多 `cycles` 个周期并记录增量（可在进程池中调用），用于分段流式返回。
+
+    `job` 为作业字典，含 `snapshot` 键时从该快照继续。返回 (增量列表, 快照, 结果)：
+    模拟结束或达到 `max_cycles` 时快照为 None、结果为最终结果字典（不含增量），
+    否则结果为 None，下一段以 `{"snapshot": 快照, "max_cycles": ...}` 继续。
+    """
+    from snapshot import dumps, loads
+    if "snapshot" in job:
+        t = loads(job["snapshot"])
+    else:
+        t = build_engine(job["program"], job.get("config"), job.get("state"))
+    limit = DEFAULT_MAX_CYCLES if job.get("max_cycles") is None else job["max_cycles"]
+    deltas = run_with_deltas(t, min(limit, t.clock + cycles))
+    if t.is_finished() or t.clock >= limit:
+        return deltas, None, collect_result(t)
+    return deltas, dumps(t), None
+
+
+def simulate_job(job):
+    """以作业字典为参数的 `simulate`，便于 `executor.map`；含 `snapshot` 键时从该快照继续（`resume`）。"""
+    if "snapshot" in job:
+        return resume(job["snapshot"], job.get("max_cycles"), job.get("deltas", False))
+    return simulate(job["program"], job.get("config"), job.get("state"), job.get("max_cycles"),
+                    job.get("deltas", False))
+
+
+def run_batch(jobs, workers=1, cache=None):
+    """运行一组作业，按输入顺序返回结果列表。`workers > 1` 时使用进程池。
+
+    给出 `cache`（`result_cache.ResultCache`）时先按 `job_key` 查找，只模拟未命中的作业，
+    并把新结果写回缓存（记录逐周期增量的作业与从快照继续的作业不缓存）。
+    """
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    keys = [None] * len(jobs)
+    todo = []
+    for i, job in enumerate(jobs):
+        if cache is not None and not job.get("deltas") and "snapshot" not in job:
+            keys[i] = job_key(job["program"], job.get("config"), job.get("state"), job.get("max_cycles"))
+            results[i] = cache.get(keys[i])
+        if results[i] is None:
+            todo.append(i)
+    if workers <= 1 or len(todo) <= 1:
+        fresh = [simulate_job(jobs[i]) for i in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fresh = list(pool.map(simulate_job, [jobs[i] for i in todo]))
+    for i, result in zip(todo, fresh):
+        results[i] = result
+        if keys[i] is not None:
+            cache.put(keys[i], result)
+    return results
@@ -0,0 +1,235 @@
+"""抽样模拟：功能性快进大部分指令，只对周期性的窗口做详细的逐周期模拟，外推总周期数与 IPC。
+
+按程序顺序用 `Tomasulo.execute_instruction`（顺序参考语义，不推进时钟）快进，
+每隔 `interval` 条动态指令取一个样本：从快进得到的寄存器/内存状态新建一个引擎，
+`start_program` 从当前 PC 开始取指，先详细模拟 `warmup` 条指令填充保留站与功能单元，
+再测量随后 `window` 条指令的周期数。窗口的周期数为“窗口内指令全部写回的周期”减去
+“预热指令全部写回的周期”（按程序顺序退休的口径），CPI = 周期数 / `window`。
+
+快进期间同时做功能性预热：LOAD/STORE 访问缓存模型（配置了 `cache` 时），分支更新
+bimodal 预测器的计数器；每个窗口从预热后的缓存副本与预测器状态开始。
+
+外推：总周期 ≈ 平均 CPI × 动态指令总数；置信区间取各窗口 CPI 的
+均值 ± z × 标准差 / √窗口数（正态近似，窗口数较少时区间偏窄），IPC 的区间由 CPI 的区间取倒数。
+窗口内的动态指令下标从 0 重新计数，因此 `sampled` 延迟模型在窗口中的抽样序列与完整模拟不同。
+
+用法：
+    python sampling.py big.txt --interval 100000 --window 1000 --warmup 2000
+    python sampling.py big.txt --config machine.json --exact     # 同时运行完整模拟以比较
+
+命令行经 `program_index.IndexedProgram` 读取文件（行偏移索引 + mmap），不把整个文件读入内存。
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from statistics import NormalDist, mean, stdev
+
+import runner
+from ops import OPS
+from program_index import IndexedProgram
+from tomasulo import Tomasulo
+
+DEFAULT_INTERVAL = 100_000
+DEFAULT_WINDOW = 1000
+DEFAULT_WARMUP = 2000
+
+
+class _Window:
+    """一个详细模拟窗口的结果。"""
+    __slots__ = ("start", "instructions", "cycles")
+
+    def __init__(self, start, instructions, cycles):
+        self.start = start
+        self.instructions = instructions
+        self.cycles = cycles
+
+
+def _cycle_limit(t, count):
+    """详细模拟 `count` 条指令的周期上限（超出视为死锁）。"""
+    latencies = list(t.op_latencies.values())
+    for model in t.latency_models.values():
+        latencies.extend(model.get("values") or ())
+    if t.cache is not None:
+        latencies.append(t.cache.memory_latency)
+    return (max(latencies) + t.mispredict_penalty + 3) * (count + 1) + 10
+
+
+def measure_window(t, warmup, window):
+    """在已 `start_program` 的引擎上逐周期模拟，返回窗口的 (指令数, 周期数)。
+
+    指令数为实际测到的窗口指令数（程序在窗口内结束时少于 `window`）。
+    """
+    queue = t.instruction_queue
+    end = warmup + window
+    limit = _cycle_limit(t, end)
+    done = 0
+    warm_clock = t.clock
+    while done < end:
+        if t.is_finished():
+            break
+        if t.clock >= limit:
+            raise RuntimeError(f"详细窗口在 {limit} 个周期内未完成（可能死锁）")
+        t.step()
+        # 按程序顺序推进已全部写回的前缀
+        while done < len(queue) and done < end and queue.timing_row(done)[3] is not None:
+            done += 1
+            if done == warmup:
+                warm_clock = t.clock
+    if done <= warmup:
+        return 0, 0
+    return done - warmup, t.clock - warm_clock
+
+
+def _interval(values, confidence):
+    """均值的置信区间（正态近似）；少于两个样本时区间退化为均值。"""
+    center = mean(values)
+    if len(values) < 2:
+        return center, center
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    half = z * stdev(values) / math.sqrt(len(values))
+    return center - half, center + half
+
+
+def sample(program, config=None, state=None, interval=DEFAULT_INTERVAL, window=DEFAULT_WINDOW,
+           warmup=DEFAULT_WARMUP, offset=None, confidence=0.95, max_instructions=None):
+    """抽样模拟一个程序，返回估计结果字典。
+
+    `program`/`config`/`state` 与 `runner.simulate` 相同，`program` 也可以是
+    `program_index.IndexedProgram`（按需读取大型指令文件，不整体解析）。第 k 个样本从第
+    `offset + k × interval` 条动态指令开始（先预热 `warmup` 条，再测量 `window` 条），
+    `offset` 缺省时把样本放在每个间隔的中间。`max_instructions` 限制快进的动态指令数
+    （用于不终止的程序）。程序或配置无效时引发 ValueError。
+    """
+    if window < 1 or warmup < 0:
+        raise ValueError(f"窗口长度必须为正、预热长度不能为负: window={window}, warmup={warmup}")
+    if interval < warmup + window:
+        raise ValueError(f"抽样间隔 {interval} 小于预热与窗口长度之和 {warmup + window}")
+    if offset is None:
+        offset = (interval - warmup - window) // 2
+    if not 0 <= offset <= interval - warmup - window:
+        raise ValueError(f"样本偏移必须在 0..{interval - warmup - window} 之间: {offset}")
+    if not 0 < confidence < 1:
+        raise ValueError(f"置信度必须在 (0, 1) 之间: {confidence}")
+
+    started = time.perf_counter()
+    # 功能参考：按顺序语义维护寄存器与内存
+    ref = runner.build_engine([], config, state)
+    if isinstance(program, IndexedProgram):
+        texts, parsed_list, labels = program.texts, program.parsed, program.labels
+    else:
+        texts, parsed_list, labels = ref.parse_program(runner.normalize_program(program))
+    config = ref.get_config()
+    warm_cache = ref.cache
+    bimodal = {} if config["branch_predictor"] == "bimodal" else None
+    registers = ref.registers
+    memory = ref.memory
+
+    windows = []
+    detailed = 0
+    position = 0
+    pc = 0
+    next_sample = offset
+    size = len(parsed_list)
+    while pc < size and (max_instructions is None or position < max_instructions):
+        if position == next_sample:
+            t = Tomasulo.from_config(config)
+            t.log_enabled = False
+            for reg, data in registers.items():
+                t.registers[reg]["value"] = data["value"]
+            t.memory = dict(memory)
+            if warm_cache is not None:
+                t.cache = warm_cache.copy()
+            t.start_program(texts, parsed_list, labels, pc, branch_history=bimodal)
+            count, cycles = measure_window(t, warmup, window)
+            detailed += len(t.instruction_queue)
+            if count == window:
+                windows.append(_Window(position, count, cycles))
+            next_sample += interval
+
+        parsed = parsed_list[pc]
+        kind = OPS[parsed["op"]].kind
+        taken = ref.execute_instruction(parsed)
+        pc += 1
+        if kind == "branch":
+            if bimodal is not None and parsed["op"] != "JMP":
+                counter = bimodal.get(pc - 1, 1)
+                bimodal[pc - 1] = min(counter + 1, 3) if taken else max(counter - 1, 0)
+            if taken:
+                pc = labels[parsed["target"]]
+        elif warm_cache is not None and (kind == "load" or kind == "store"):
+            warm_cache.access(parsed["addr"], kind == "store")
+        position += 1
+
+    if not windows:
+        raise ValueError(f"程序只有 {position} 条动态指令，不足以取得一个完整的样本窗口")
+    cpis = [w.cycles / w.instructions for w in windows]
+    cpi = mean(cpis)
+    low, high = _interval(cpis, confidence)
+    low = max(low, 0.0)
+    return {
+        "instructions": position,
+        "finished": pc >= size,
+        "windows": len(windows),
+        "window": window,
+        "warmup": warmup,
+        "interval": interval,
+        "confidence": confidence,
+        "cpi": cpi,
+        "cpi_interval": [low, high],
+        "cycles": cpi * position,
+        "cycles_interval": [low * position, high * position],
+        "ipc": 1 / cpi if cpi else math.inf,
+        "ipc_interval": [1 / high if high else math.inf, 1 / low if low else math.inf],
+        "window_cpi": cpis,
+        "detailed_instructions": detailed,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽样模拟：快进 + 周期性详细窗口，外推总周期数与 IPC")
+    parser.add_argument("program", help="指令文件")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="相邻样本的间隔（动态指令数）")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="每个样本测量的指令数")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="测量前详细预热的指令数")
+    parser.add_argument("--offset", type=int, help="第一个样本的起始位置（默认在间隔中间）")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--max-instructions", type=int, help="快进的动态指令数上限")
+    parser.add_argument("--exact", action="store_true", help="同时运行完整的详细模拟以比较")
+    args = parser.parse_args(argv)
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    try:
+        with IndexedProgram(args.program) as indexed:
+            result = sample(indexed, config, interval=args.interval, window=args.window, warmup=args.warmup,
+                            offset=args.offset, confidence=args.confidence,
+                            max_instructions=args.max_instructions)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    level = f"{args.confidence:.0%}"
+    print(f"{result['instructions']} 条动态指令，{result['windows']} 个窗口"
+          f"（详细模拟 {result['detailed_instructions']} 条，耗时 {result['elapsed']:.2f} 秒）")
+    print(f"估计周期数：{result['cycles']:.0f}（{level} 区间 "
+          f"{result['cycles_interval'][0]:.0f} - {result['cycles_interval'][1]:.0f}）")
+    print(f"估计 IPC：{result['ipc']:.3f}（{level} 区间 "
+          f"{result['ipc_interval'][0]:.3f} - {result['ipc_interval'][1]:.3f}）")
+    if args.exact:
+        with open(args.program) as f:
+            program = f.read()
+        started = time.perf_counter()
+        exact = runner.simulate(program, config, max_cycles=sys.maxsize)
+        elapsed = time.perf_counter() - started
+        error = (result["cycles"] - exact["cycles"]) / exact["cycles"]
+        print(f"完整模拟：{exact['cycles']} 个周期，IPC {exact['instructions'] / exact['cycles']:.3f}"
+              f"（耗时 {elapsed:.2f} 秒）；估计误差 {error:+.2%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
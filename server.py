@@ -0,0 +1,355 @@
+"""本地多用户模拟服务：基于 asyncio 的 HTTP/JSON 接口，作业在有界进程池中运行。
+
+接口（均为 JSON，仅监听本机地址，不依赖外部网络）：
+- `GET /health`：`{"status": "ok"}`。
+- `GET /stats`：作业数、缓存命中/未命中、排队数等。
+- `POST /simulate`：请求体为 `runner` 中的作业字典（`program`、`config`、`state`、
+  `max_cycles`）。默认返回最终结果；加 `"stream": true` 时以分块传输的
+  NDJSON 返回，每行一个 `{"type": "delta", ...}` 逐周期增量，最后一行为
+  `{"type": "result", ...}`。流式作业在进程池中分段运行（段间以快照交接），
+  每段完成后立即送出该段的增量。
+
+结果按 `runner.job_key`（程序哈希 + 规范化配置 + 初始状态）缓存在内存 LRU 中，
+并发的相同作业共享同一次计算。缓存只保存最终结果，流式请求的增量每次重新计算。
+排队作业超过 `max_pending` 时返回 503。
+
+用法：
+    python server.py --port 8765 --workers 4
+
+`SimulationClient` 是基于 `http.client` 的最小客户端，用于脚本与测试。
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import runner
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class SimulationServer:
+    # 流式作业的段长（周期数）：首段较短以尽快送出增量，之后倍增，快照交接次数随总周期数对数增长
+    STREAM_FIRST_CYCLES = 256
+    STREAM_MAX_CYCLES = 65536
+
+    def __init__(self, host="127.0.0.1", port=8765, workers=2, max_pending=64, cache_size=256,
+                 max_body=16 * 1024 * 1024, executor=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.max_body = max_body
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._server = None
+        self._cache = OrderedDict()     # job_key -> 最终结果（不含增量）
+        self._inflight = {}             # job_key -> asyncio.Future
+        self.stats = {"jobs": 0, "cache_hits": 0, "cache_misses": 0, "pending": 0, "errors": 0}
+
+    async def start(self):
+        """开始监听，返回实际端口（`port=0` 时由系统分配）。"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # ---- 作业与缓存 ----
+
+    async def run_job(self, job):
+        """运行（或从缓存取得）一个作业，返回 (结果, 是否命中缓存)。"""
+        key = runner.job_key(job["program"], job.get("config"), job.get("state"), job.get("max_cycles"))
+        self.stats["jobs"] += 1
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return cached, True
+        self.stats["cache_misses"] += 1
+        future = self._inflight.get(key)
+        if future is None:
+            if self.stats["pending"] >= self.max_pending:
+                raise OverflowError("排队作业过多，请稍后重试")
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, runner.simulate, job["program"], job.get("config"),
+                                          job.get("state"), job.get("max_cycles"))
+            self._inflight[key] = future
+            self.stats["pending"] += 1
+            try:
+                result = await future
+            finally:
+                self.stats["pending"] -= 1
+                del self._inflight[key]
+            self._store(key, result)
+            return result, False
+        return await asyncio.shield(future), False
+
+    async def stream_job(self, job):
+        """分段运行一个作业，逐段产生 (增量列表, 结果)；结果只在最后一段给出，其余段为 None。
+
+        每段在进程池中至多运行若干周期（`runner.simulate_chunk`），返回本段增量与快照，
+        下一段从快照继续。增量不缓存，最终结果写入与普通请求共用的缓存。
+        """
+        key = runner.job_key(job["program"], job.get("config"), job.get("state"), job.get("max_cycles"))
+        self.stats["jobs"] += 1
+        self.stats["cache_misses"] += 1
+        if self.stats["pending"] >= self.max_pending:
+            raise OverflowError("排队作业过多，请稍后重试")
+        loop = asyncio.get_running_loop()
+        segment = {k: job.get(k) for k in ("program", "config", "state", "max_cycles")}
+        cycles = self.STREAM_FIRST_CYCLES
+        self.stats["pending"] += 1
+        try:
+            while True:
+                deltas, snapshot, result = await loop.run_in_executor(self._executor, runner.simulate_chunk,
+                                                                      segment, cycles)
+                if result is not None:
+                    break
+                yield deltas, None
+                segment = {"snapshot": snapshot, "max_cycles": job.get("max_cycles")}
+                cycles = min(cycles * 2, self.STREAM_MAX_CYCLES)
+        finally:
+            self.stats["pending"] -= 1
+        self._store(key, result)
+        yield deltas, result
+
+    def _store(self, key, result):
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ---- HTTP ----
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                request_line = await reader.readline()
+                parts = request_line.decode("latin-1").split()
+                if len(parts) < 2:
+                    return
+                method, path = parts[0].upper(), parts[1]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            except (ValueError, asyncio.LimitOverrunError):
+                # 单行超过 StreamReader 的缓冲上限（readline 以 ValueError 报告）
+                await self._send_json(writer, 413, {"error": "请求行或请求头过长"})
+                return
+            raw_length = headers.get("content-length") or "0"
+            if not raw_length.isdigit():
+                await self._send_json(writer, 400, {"error": f"无效的 Content-Length: {raw_length}"})
+                return
+            length = int(raw_length)
+            if length > self.max_body:
+                await self._send_json(writer, 413, {"error": "请求体过大"})
+                return
+            body = await reader.readexactly(length) if length else b""
+            await self._dispatch(method, path, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method, path, body, writer):
+        if path == "/health":
+            await self._send_json(writer, 200, {"status": "ok"})
+            return
+        if path == "/stats":
+            await self._send_json(writer, 200, dict(self.stats, cache_entries=len(self._cache)))
+            return
+        if path != "/simulate":
+            await self._send_json(writer, 404, {"error": f"未知路径: {path}"})
+            return
+        if method != "POST":
+            await self._send_json(writer, 405, {"error": "只支持 POST"})
+            return
+        try:
+            job = json.loads(body or b"{}")
+            if not isinstance(job, dict) or not isinstance(job.get("program"), (str, list)):
+                raise ValueError("请求体必须是包含 program（字符串或行列表）的 JSON 对象")
+            stream = bool(job.get("stream"))
+            if stream:
+                # 先取得第一段，程序或配置无效时仍可返回错误状态码
+                segments = self.stream_job(job)
+                deltas, result = await segments.__anext__()
+            else:
+                result, cached = await self.run_job(job)
+        except OverflowError as e:
+            await self._send_json(writer, 503, {"error": str(e)})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            # JSON 格式错误、配置或程序无效（进程池中的 ValueError 会原样传回）
+            self.stats["errors"] += 1
+            await self._send_json(writer, 400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.stats["errors"] += 1
+            await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        if not stream:
+            await self._send_json(writer, 200, dict(result, cached=cached))
+            return
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        try:
+            while True:
+                for delta in deltas:
+                    await self._send_chunk(writer, dict(delta, type="delta"))
+                if result is not None:
+                    break
+                deltas, result = await segments.__anext__()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # 响应头已发出，只能以一行错误消息结束流
+            self.stats["errors"] += 1
+            await self._send_chunk(writer, {"type": "error", "error": f"{type(e).__name__}: {e}"})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return
+        finally:
+            # 客户端断开时结束生成器，释放排队计数
+            await segments.aclose()
+        await self._send_chunk(writer, dict(result, type="result", cached=False))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_chunk(self, writer, obj):
+        data = json.dumps(obj).encode("utf-8") + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, obj):
+        data = json.dumps(obj).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+
+class BackgroundServer:
+    """在后台线程的事件循环中运行 `SimulationServer`（用于测试或嵌入 GUI）。
+
+        with BackgroundServer(workers=2) as server:
+            client = SimulationClient(port=server.port)
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("port", 0)
+        self.server = SimulationServer(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.port
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class SimulationClient:
+    """最小的本地客户端。出错时引发 RuntimeError（含状态码与服务端错误信息）。"""
+
+    def __init__(self, host="127.0.0.1", port=8765, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        return conn, conn.getresponse()
+
+    def _json(self, method, path, payload=None):
+        conn, resp = self._request(method, path, payload)
+        try:
+            data = json.loads(resp.read() or b"null")
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError(f"{resp.status}: {(data or {}).get('error')}")
+        return data
+
+    def health(self):
+        return self._json("GET", "/health")
+
+    def stats(self):
+        return self._json("GET", "/stats")
+
+    def simulate(self, program, config=None, state=None, max_cycles=None):
+        """提交作业并返回最终结果字典（含 `cached`）。"""
+        return self._json("POST", "/simulate", {"program": program, "config": config, "state": state,
+                                                "max_cycles": max_cycles})
+
+    def stream(self, program, config=None, state=None, max_cycles=None):
+        """提交作业并逐条产生流式消息（若干 delta，最后一条为 result）。"""
+        conn, resp = self._request("POST", "/simulate", {"program": program, "config": config, "state": state,
+                                                         "max_cycles": max_cycles, "stream": True})
+        try:
+            if resp.status != 200:
+                raise RuntimeError(f"{resp.status}: {json.loads(resp.read() or b'{}').get('error')}")
+            for line in resp:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tomasulo 本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="进程池大小")
+    parser.add_argument("--max-pending", type=int, default=64, help="排队作业上限")
+    parser.add_argument("--cache-size", type=int, default=256, help="内存结果缓存条目数")
+    args = parser.parse_args(argv)
+    server = SimulationServer(args.host, args.port, args.workers, args.max_pending, args.cache_size)
+    print(f"监听 http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""分片并行模拟：在排空点把直线程序切分为独立片段，多进程模拟后按周期偏移拼接。
+
+排空点是指某条指令发射时机器已完全空闲（所有保留站空闲、没有待写回的结果）。
+此后的计时与之前的指令无关，只需加上一个周期偏移；寄存器与内存的值则由一次
+快速的顺序功能执行（`Tomasulo.execute_instruction`）预先算出每个片段的初始状态。
+
+切分点有两种：
+- 用户标记：`BARRIER` 指令保证其后的指令从空闲机器开始，总是有效的切分点。
+- 推测切分：`chunk_size` 给出时，再把两个屏障之间的代码每隔 `chunk_size` 条切开。
+  每个片段在模拟时追加下一片段的第一条指令作为探针；只有当探针恰好在片段最后
+  一次写回的下一周期发射时，该切分点才是真正的排空点。否则由主进程从该片段
+  起点开始连续模拟（`simulate_span`），依次检查后面的推测切分点，遇到真正的
+  排空点后改用从那里开始的工作进程结果；连续错过 `max_misses` 个切分点后不再
+  检查，直接模拟到下一个屏障，并取消该区间内尚未开始的片段。每条指令至多被
+  模拟两次，最坏情况也只是顺序模拟的常数倍。
+
+因此结果（每条指令的发射/开始/完成/写回周期、总周期数、最终寄存器和内存）
+与对整个程序顺序调用 `run()` 完全相同，与进程数无关。
+
+含分支的程序（动态指令流依赖取指）不支持分片。
+
+用法：
+    python shard.py big.txt --workers 8 --chunk-size 20000
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import runner
+from tomasulo import BARRIER_OP, BRANCH_OPS, Tomasulo
+
+TIMING_FIELDS = runner.TIMING_FIELDS
+
+
+def parse_trace(program):
+    """返回 (指令文本列表, 已解析字典列表)；程序含分支时引发 ValueError。"""
+    parser = Tomasulo()
+    texts = []
+    parsed_list = []
+    for lineno, line in enumerate(runner.normalize_program(program), start=1):
+        try:
+            _labels, text, parsed = parser.parse_program_line(line)
+        except ValueError as e:
+            raise ValueError(f"第 {lineno} 行: {e}")
+        if text is None:
+            continue
+        if parsed["op"] in BRANCH_OPS:
+            raise ValueError("含分支的程序不支持分片模拟")
+        texts.append(text)
+        parsed_list.append(parsed)
+    return texts, parsed_list
+
+
+def plan_segments(parsed_list, chunk_size=None):
+    """返回片段列表 [(起始下标, 结束下标, 结束处是否为屏障)]。
+
+    片段不含屏障指令；每个屏障前都有一个片段（可能为空），用于确定屏障的退休周期。
+    """
+    segments = []
+    start = 0
+    count = len(parsed_list)
+    for i in range(count + 1):
+        barrier = i < count and parsed_list[i]["op"] == BARRIER_OP
+        if i < count and not barrier:
+            continue
+        if i == start:
+            if barrier:
+                segments.append((i, i, True))
+        else:
+            step = chunk_size or (i - start)
+            for s in range(start, i, step):
+                e = min(s + step, i)
+                segments.append((s, e, barrier and e == i))
+        start = i + 1
+    return segments
+
+
+def simulate_segment(task):
+    """在空闲机器上模拟一个片段（可在工作进程中调用）。
+
+    `task` 为 (指令文本列表, 配置, 初始状态, 探针指令文本或 None)。返回
+    {"clock": 片段最后一次写回的周期, "timing": [[发射, 开始, 完成, 写回], ...],
+    "probe_issue": 探针的发射周期或 None}。
+    """
+    texts, config, state, probe = task
+    t = _build_segment_engine(texts, config, state)
+    if probe is not None:
+        t.add_instruction(probe)
+    count = len(texts)
+    queue = t.instruction_queue
+    # 只需运行到片段的指令全部写回、探针已发射（探针可能先于片段指令写回）
+    while True:
+        written = t.completed_total
+        if probe is not None:
+            probe_issue, *_, probe_write = queue.timing_row(count)
+            if probe_issue is None:
+                t.step()
+                continue
+            written -= probe_write is not None
+        if written >= count:
+            break
+        t.step()
+    timing = [list(queue.timing_row(i)) for i in range(count)]
+    return {
+        "clock": max((row[-1] for row in timing), default=0),
+        "timing": timing,
+        "probe_issue": queue.timing_row(count)[0] if probe is not None else None,
+    }
+
+
+def _build_segment_engine(texts, config, state):
+    t = Tomasulo.from_config(config or {})
+    t.log_enabled = False
+    for reg, value in state["registers"].items():
+        t.registers[reg]["value"] = value
+    t.memory.update(state["memory"])
+    for text in texts:
+        t.add_instruction(text)
+    return t
+
+
+def simulate_span(task):
+    """在空闲机器上连续模拟一段指令，直到在某个候选切分点遇到真正的排空点。
+
+    `task` 为 (指令文本列表, 配置, 初始状态, 候选切分点的本地下标列表（升序）,
+    最多错过的切分点数)。切分点 b 是排空点当且仅当第 b 条指令发射时之前的指令
+    已全部写回，且最后一次写回恰好在上一周期。错过 `max_misses` 个切分点后不再
+    检查，模拟到末尾。返回 {"end": 已确定计时的指令数, "clock": 最后一次写回的周期,
+    "timing": [...], "misses": 错过的切分点数}。
+    """
+    texts, config, state, boundaries, max_misses = task
+    t = _build_segment_engine(texts, config, state)
+    queue = t.instruction_queue
+    pending = iter(boundaries)
+    target = next(pending, None)
+    misses = 0
+    end = len(texts)
+    last_write = 0
+    while target is not None:
+        written = t.completed_total
+        t.step()
+        drained = written == target and t.clock == last_write + 1
+        if t.completed_total != written:
+            last_write = t.clock
+        # 同一周期可能越过多个切分点；只有第一个可能是排空点
+        while target is not None and queue.timing_row(target)[0] is not None:
+            if drained:
+                end = target
+                break
+            drained = False
+            misses += 1
+            target = next(pending, None) if misses < max_misses else None
+        if end != len(texts):
+            break
+    if end == len(texts):
+        t.run()
+    timing = [list(queue.timing_row(i)) for i in range(end)]
+    return {
+        "end": end,
+        "clock": max((row[-1] for row in timing), default=0),
+        "timing": timing,
+        "misses": misses,
+    }
+
+
+def _functional_states(t, parsed_list, starts):
+    """顺序执行程序，返回每个片段起点处的初始状态；执行结束后 `t` 保存最终状态。"""
+    wanted = set(starts)
+    states = {}
+    for i, parsed in enumerate(parsed_list):
+        if i in wanted:
+            states[i] = {"registers": {reg: d["value"] for reg, d in t.registers.items()}, "memory": dict(t.memory)}
+        t.execute_instruction(parsed)
+    return states
+
+
+def run_sharded(program, config=None, state=None, workers=1, chunk_size=None, max_misses=4):
+    """分片模拟程序，返回与 `runner.simulate` 相同格式的结果字典。
+
+    额外的 `shards` 键记录拼接的片段数与因切分点不是排空点而被并入连续模拟的切分点数。
+    """
+    config = config or {}
+    sampled = [op for op, model in (config.get("latency_models") or {}).items() if model.get("model") == "sampled"]
+    if sampled:
+        # 抽样延迟按动态指令下标取值，片段内的下标与整段程序不同，拼接结果会偏离
+        raise ValueError(f"分片模拟不支持 sampled 延迟模型: {', '.join(sampled)}")
+    if config.get("cache"):
+        # 缓存状态跨越切分点，各片段从空缓存开始会得到不同的访存延迟
+        raise ValueError("分片模拟不支持缓存模型")
+    texts, parsed_list = parse_trace(program)
+    reference = runner.build_engine([], config, state)
+    segments = plan_segments(parsed_list, chunk_size)
+    states = _functional_states(reference, parsed_list, [s for s, _, _ in segments])
+
+    def _task(segment):
+        start, end, barrier = segment
+        probe = None if barrier or end >= len(texts) else texts[end]
+        return texts[start:end], config, states[start], probe
+
+    # 单进程时按需模拟，被连续模拟覆盖的片段不再单独模拟
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(segments) > 1 else None
+    futures = [pool.submit(simulate_segment, _task(segment)) for segment in segments] if pool else None
+
+    def _result(i):
+        return futures[i].result() if futures else simulate_segment(_task(segments[i]))
+
+    # 按顺序验证切分点并拼接：每段的周期加上之前所有段的偏移；屏障在偏移后的下一周期退休
+    timing = [None] * len(texts)
+    offset = 0
+    stitched = 0
+    merges = 0
+    i = 0
+    try:
+        while i < len(segments):
+            start, end, barrier = segments[i]
+            result = _result(i)
+            if result["probe_issue"] is not None and result["probe_issue"] != result["clock"] + 1:
+                # 不是排空点：从片段起点连续模拟到本屏障区间内下一个真正的排空点
+                last = i
+                while not segments[last][2] and segments[last][1] < len(texts):
+                    last += 1
+                region_end = segments[last][1]
+                boundaries = [segments[k][1] - start for k in range(i + 1, last)]
+                result = simulate_span((texts[start:region_end], config, states[start], boundaries, max_misses))
+                end = start + result["end"]
+                covered = i
+                while segments[covered][1] < end:
+                    covered += 1
+                if futures:
+                    for future in futures[i + 1:covered + 1]:
+                        future.cancel()
+                merges += covered - i
+                barrier = segments[covered][2] and end == region_end
+                i = covered
+            for index, row in enumerate(result["timing"], start=start):
+                timing[index] = [c + offset for c in row]
+            offset += result["clock"]
+            if barrier:
+                timing[end] = [offset + 1] * len(TIMING_FIELDS)
+            stitched += 1
+            i += 1
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return {
+        "cycles": max((row[-1] for row in timing), default=0),
+        "finished": True,
+        "instructions": len(texts),
+        "registers": {reg: data["value"] for reg, data in reference.registers.items()},
+        "memory": {str(addr): value for addr, value in sorted(reference.memory.items()) if value != 0},
+        "timing": [[text] + row for text, row in zip(texts, timing)],
+        "branch_stats": {"branches": 0, "mispredicts": 0},
+        "shards": {"segments": stitched, "merges": merges},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在排空点切分程序并多进程模拟")
+    parser.add_argument("program", help="指令文件（不含分支）")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=None, help="推测切分的片段长度")
+    args = parser.parse_args(argv)
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    with open(args.program) as f:
+        program = f.read()
+    started = time.perf_counter()
+    result = run_sharded(program, config, workers=args.workers, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    print(f"{result['instructions']} 条指令，{result['cycles']} 个周期；"
+          f"{result['shards']['segments']} 个片段，合并 {result['shards']['merges']} 次；耗时 {elapsed:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""模拟器状态快照：把 `Tomasulo` 的完整状态序列化为带版本号的紧凑二进制格式。
+
+快照覆盖继续模拟所需的全部状态：配置、保留站、寄存器与别名表、内存与内存重命名表、
+指令记录（文本表、周期与标志数组、活动条目）、发射游标、时钟、功能单元日历、
+静态程序与取指前端/分支预测器状态、缓存标签与 LRU 状态、性能计数器以及最近一个周期的变化集合。
+从快照恢复后继续运行，与原模拟器继续运行得到完全相同的结果（逐条日志
+`log_lines` 与计数器的 `dump_path` 不保存）。
+
+布局与列式时间表（export.py）相同，原始数组在前、尾部为 JSON 元数据：
+    b"TSNP"
+    各数组的原始数据（小端序，按 8 字节对齐）：指令文本下标、周期、标志、内存地址与值、
+    寄存器别名表、各级缓存的标签与时间
+    尾部 JSON：格式与引擎版本、各数组的 (偏移, 类型, 长度)、文本表与已解析字典及其余小型状态
+    <Q 尾部长度> b"TSNP"
+
+`loads()` 接受 bytes、bytearray、mmap 或 memoryview，数组直接由 `memoryview.cast`
+读取，只在构造可修改的引擎数组时复制一次；`SnapshotView` 不构造引擎，
+按需从缓冲区读取时间表，适合只查看快照内容（例如大型快照的某几行）。
+
+用法：
+    python snapshot.py program.txt --cycles 50000 -o paused.tsnp   # 运行到第 50000 个周期后保存
+    python snapshot.py --resume paused.tsnp                         # 在任意进程或机器上继续运行
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import deque
+
+from instruction_log import TIMING_FIELDS
+from tomasulo import ENGINE_VERSION, Tomasulo
+
+MAGIC = b"TSNP"
+# 2：整数重命名标签，寄存器别名表为数组段
+FORMAT_VERSION = 2
+_TAIL = struct.Struct("<Q")
+_ALIGN = 8
+_INT64 = (-(1 << 63), (1 << 63) - 1)
+
+
+def _le_bytes(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _pairs(mapping):
+    return [[key, value] for key, value in mapping.items()]
+
+
+def dumps(t):
+    """把模拟器状态序列化为 bytes。"""
+    queue = t.instruction_queue
+    # 内存值一般为整数；浮点数（DIV 的结果）或超出 int64 的整数另存于元数据
+    addresses = array("q", t.memory.keys())
+    values = array("q")
+    other_values = {}
+    for addr, value in t.memory.items():
+        if type(value) is int and _INT64[0] <= value <= _INT64[1]:
+            values.append(value)
+        else:
+            values.append(0)
+            other_values[str(addr)] = value
+    arrays = {
+        "text_ids": queue.text_ids,
+        "cycles": queue.cycles,
+        "flags": queue.flags,
+        "memory_addresses": addresses,
+        "memory_values": values,
+        "rename_table": t.rename_table,
+    }
+    if t.cache is not None:
+        for i, level in enumerate(t.cache.levels):
+            arrays[f"cache_tags_{i}"] = level.tags
+            arrays[f"cache_stamps_{i}"] = level.stamps
+    chunks = [MAGIC]
+    offset = len(MAGIC)
+    sections = {}
+    for name, arr in arrays.items():
+        padding = -offset % _ALIGN
+        chunks.append(b"\0" * padding)
+        offset += padding
+        data = _le_bytes(arr)
+        sections[name] = [offset, arr.typecode, len(arr)]
+        chunks.append(data)
+        offset += len(data)
+
+    counters = t.counters
+    meta = {
+        "version": FORMAT_VERSION,
+        "engine": ENGINE_VERSION,
+        "sections": sections,
+        "config": t.get_config(),
+        "clock": t.clock,
+        "issue_cursor": t.issue_cursor,
+        "completed_total": t.completed_total,
+        "busy_stations": t.busy_stations,
+        "log_enabled": t.log_enabled,
+        # 文本表与平行的已解析字典（读取 JSON 比重新解析文本快得多）
+        "texts": queue.texts,
+        "parsed": queue._parsed,
+        # 活动条目：已解析字典取自文本表
+        "live": [[index, {k: v for k, v in entry.items() if k != "parsed"}] for index, entry in queue._live.items()],
+        "reservation_stations": t.reservation_stations,
+        "registers": t.registers,
+        "memory_other": other_values,
+        "memory_rename": _pairs(t.memory_rename),
+        "fu_free": t._fu_free,
+        "fu_release": _pairs(t._fu_release),
+        "program": None if t.program is None else {
+            "texts": list(t.program_texts),
+            "labels": t.labels,
+            "fetch_pc": t._fetch_pc,
+            "fetch_done": t._fetch_done,
+            "fe_regs": t._fe_regs,
+            "fe_mem": None if t._fe_mem is None else _pairs(t._fe_mem),
+            "bimodal": _pairs(t._bimodal),
+            "fetch_stall_entry": t._fetch_stall_entry,
+            "fetch_resume_cycle": t._fetch_resume_cycle,
+        },
+        "branch_stats": t.branch_stats,
+        "cache": None if t.cache is None else t.cache.get_state(),
+        "counters": {
+            "sample_interval": counters.sample_interval,
+            "capacity": counters.capacity,
+            "values": counters.values,
+            "occupancy": list(counters.occupancy),
+            "fanout": list(counters.fanout),
+            "samples": list(counters.samples),
+        },
+        "completed_operations": t.completed_operations,
+        "timing_changes": sorted(t.timing_changes),
+        "dirty_registers": sorted(t.dirty_registers),
+        "memory_changes": sorted(t.memory_changes),
+    }
+    footer = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    chunks += [footer, _TAIL.pack(len(footer)), MAGIC]
+    return b"".join(chunks)
+
+
+def read_meta(buffer):
+    """校验魔数与版本，返回 (memoryview, 元数据字典)。"""
+    view = memoryview(buffer).cast("B")
+    end = len(view)
+    if end < 2 * len(MAGIC) + _TAIL.size or view[:len(MAGIC)] != MAGIC or view[end - len(MAGIC):] != MAGIC:
+        raise ValueError("不是模拟器快照")
+    (footer_len,) = _TAIL.unpack(view[end - len(MAGIC) - _TAIL.size:end - len(MAGIC)])
+    footer_start = end - len(MAGIC) - _TAIL.size - footer_len
+    if footer_start < len(MAGIC):
+        raise ValueError("快照已损坏：尾部长度无效")
+    meta = json.loads(bytes(view[footer_start:footer_start + footer_len]))
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的快照版本: {meta.get('version')}")
+    if meta.get("engine") != ENGINE_VERSION:
+        raise ValueError(f"快照来自不同的引擎版本: {meta.get('engine')}（当前 {ENGINE_VERSION}）")
+    for name, (offset, typecode, count) in meta["sections"].items():
+        if offset + count * array(typecode).itemsize > footer_start:
+            raise ValueError(f"快照已损坏：数组 {name} 越界")
+    return view, meta
+
+
+def _section(view, meta, name):
+    """返回数组的只读 memoryview（小端序主机上不复制）；大端序主机上返回字节交换后的 array。"""
+    offset, typecode, count = meta["sections"][name]
+    size = array(typecode).itemsize
+    data = view[offset:offset + count * size]
+    if sys.byteorder == "big":
+        arr = array(typecode, bytes(data))
+        arr.byteswap()
+        return arr
+    return data.cast(typecode)
+
+
+def _copy_section(view, meta, name):
+    """复制为可修改的 array（整段内存复制，不逐个元素转换）。"""
+    section = _section(view, meta, name)
+    if isinstance(section, array):
+        return section
+    arr = array(section.format)
+    arr.frombytes(section.cast("B"))
+    return arr
+
+
+def loads(buffer):
+    """由快照重建 `Tomasulo`；快照格式或引擎版本不匹配时引发 ValueError。"""
+    view, meta = read_meta(buffer)
+    t = Tomasulo.from_config(meta["config"])
+    t.log_enabled = meta["log_enabled"]
+    t.clock = meta["clock"]
+    t.issue_cursor = meta["issue_cursor"]
+    t.completed_total = meta["completed_total"]
+    t.busy_stations = meta["busy_stations"]
+
+    queue = t.instruction_queue
+    queue.texts = meta["texts"]
+    queue._parsed = meta["parsed"]
+    queue._text_index = {text: text_id for text_id, text in enumerate(queue.texts)}
+    queue.text_ids = _copy_section(view, meta, "text_ids")
+    queue.cycles = _copy_section(view, meta, "cycles")
+    queue.flags = _copy_section(view, meta, "flags")
+    for index, entry in meta["live"]:
+        text_id = queue._text_index[entry["text"]]
+        entry["parsed"] = queue._parsed[text_id]
+        queue._live[index] = entry
+
+    t.reservation_stations = meta["reservation_stations"]
+    t.registers = meta["registers"]
+    t.rename_table = _copy_section(view, meta, "rename_table")
+    t.memory = dict(zip(_section(view, meta, "memory_addresses"), _section(view, meta, "memory_values")))
+    for addr, value in meta["memory_other"].items():
+        t.memory[int(addr)] = value
+    t.memory_rename = {addr: tag for addr, tag in meta["memory_rename"]}
+    t._fu_free = meta["fu_free"]
+    t._fu_release = {cycle: classes for cycle, classes in meta["fu_release"]}
+
+    program = meta["program"]
+    if program is not None:
+        t._set_program(program["texts"], [t.parse_instruction_text(text) for text in program["texts"]],
+                       program["labels"])
+        t._fetch_pc = program["fetch_pc"]
+        t._fetch_done = program["fetch_done"]
+        t._fe_regs = program["fe_regs"]
+        t._fe_mem = None if program["fe_mem"] is None else {addr: value for addr, value in program["fe_mem"]}
+        t._bimodal = {pc: counter for pc, counter in program["bimodal"]}
+        t._fetch_stall_entry = program["fetch_stall_entry"]
+        t._fetch_resume_cycle = program["fetch_resume_cycle"]
+    t.branch_stats = meta["branch_stats"]
+    if meta["cache"] is not None:
+        t.cache.set_state(meta["cache"])
+        for i, level in enumerate(t.cache.levels):
+            level.tags = _copy_section(view, meta, f"cache_tags_{i}")
+            level.stamps = _copy_section(view, meta, f"cache_stamps_{i}")
+
+    saved = meta["counters"]
+    counters = t.counters
+    counters.sample_interval = saved["sample_interval"]
+    counters.capacity = saved["capacity"]
+    counters.values = saved["values"]
+    counters.occupancy = array("q", saved["occupancy"])
+    counters.fanout = array("q", saved["fanout"])
+    counters.samples = deque((tuple(sample) for sample in saved["samples"]), maxlen=saved["capacity"])
+
+    t.completed_operations = meta["completed_operations"]
+    t.timing_changes = set(meta["timing_changes"])
+    t.dirty_registers = set(meta["dirty_registers"])
+    t.memory_changes = set(meta["memory_changes"])
+    return t
+
+
+def save(t, path):
+    """原子写出快照文件，返回字节数。"""
+    data = dumps(t)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(data)
+
+
+def load(path):
+    """通过 mmap 读取快照文件并重建模拟器。"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return loads(mapped)
+
+
+class SnapshotView:
+    """不重建引擎的只读快照视图：数组是对缓冲区的 memoryview，按行读取时间表。
+
+    缓冲区（如 mmap）在视图使用期间必须保持打开。
+    """
+
+    def __init__(self, buffer):
+        view, self.meta = read_meta(buffer)
+        self.texts = self.meta["texts"]
+        self.text_ids = _section(view, self.meta, "text_ids")
+        self.cycles = _section(view, self.meta, "cycles")
+        self.flags = _section(view, self.meta, "flags")
+        self._live = {index: entry for index, entry in self.meta["live"]}
+
+    @property
+    def clock(self):
+        return self.meta["clock"]
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    def text(self, index):
+        return self.texts[self.text_ids[index]]
+
+    def timing_row(self, index):
+        """与 `InstructionLog.timing_row` 相同：(发射, 开始执行, 执行完成, 写回)，未记录为 None。"""
+        entry = self._live.get(index)
+        if entry is not None:
+            return tuple(entry[field] for field in TIMING_FIELDS)
+        base = index * len(TIMING_FIELDS)
+        return tuple(None if c < 0 else c for c in self.cycles[base:base + len(TIMING_FIELDS)])
+
+
+def main(argv=None):
+    import runner
+    parser = argparse.ArgumentParser(description="保存或恢复模拟器状态快照")
+    parser.add_argument("program", nargs="?", help="指令文件（保存模式）")
+    parser.add_argument("--config", help="机器配置 JSON 文件（Tomasulo.get_config() 格式）")
+    parser.add_argument("--cycles", type=int, help="保存模式：运行到该周期后保存")
+    parser.add_argument("-o", "--output", help="保存模式：快照文件路径")
+    parser.add_argument("--resume", help="恢复模式：从快照继续运行到结束")
+    parser.add_argument("--max-cycles", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.resume:
+        t = load(args.resume)
+        started = t.clock
+        t.run(max_cycles=runner.DEFAULT_MAX_CYCLES if args.max_cycles is None else args.max_cycles)
+        print(f"从周期 {started} 继续：共 {t.clock} 个周期，{len(t.instruction_queue)} 条动态指令，"
+              f"{'已完成' if t.is_finished() else '未完成'}")
+        return 0
+    if not (args.program and args.cycles is not None and args.output):
+        parser.error("保存模式需要 program、--cycles 与 -o")
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    with open(args.program) as f:
+        program = f.read()
+    t = runner.build_engine(program, config)
+    t.run(max_cycles=args.cycles)
+    size = save(t, args.output)
+    print(f"周期 {t.clock}：{len(t.instruction_queue)} 条动态指令，快照 {size} 字节 -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
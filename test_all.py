@@ -207,7 +207,7 @@ class TestTomasuloStepByStep(unittest.TestCase):
             # 如果完成，验证结果
             if t.completed_total > 0:
                 self.assertEqual(t.registers['F1']['value'], 30)
-                self.assertFalse(t.registers['F1'].get('busy', True))
+                self.assertFalse(t.get_state()['registers']['F1']['busy'])
                 break
         
         # 确保指令完成
@@ -215,5 +215,1332 @@ class TestTomasuloStepByStep(unittest.TestCase):
         self.assertTrue(initial_state_checked)
 
 
+class TestDataflowAnalysis(unittest.TestCase):
+    """测试模拟前的静态数据流分析"""
+    def _run(self, t):
+        while t.completed_total < len(t.instruction_queue) and t.clock < 1000:
+            t.step()
+        return t.clock
+
+    def test_dependency_edges(self):
+        t = Tomasulo()
+        for ins in ["LOAD F1 10", "ADD F2 F1 F1", "ADD F1 F3 F4", "STORE 10 F2"]:
+            t.add_instruction(ins)
+        report = t.analyze_dataflow()
+        self.assertIn((0, 1, "RAW", "F1"), report["edges"])
+        self.assertIn((1, 2, "WAR", "F1"), report["edges"])
+        self.assertIn((0, 2, "WAW", "F1"), report["edges"])
+        self.assertIn((0, 3, "WAR", 10), report["edges"])
+        self.assertEqual(report["critical_path"], [0, 1, 3])
+
+    def test_chain_bound_is_tight(self):
+        t = Tomasulo()
+        for ins in ["ADD F1 F3 F4", "ADD F2 F1 F5", "MUL F6 F2 F2"]:
+            t.add_instruction(ins)
+        report = t.analyze_dataflow()
+        self.assertEqual(report["critical_path"], [0, 1, 2])
+        self.assertEqual(report["lower_bound"], 1 + 5 + 5 + 6)
+        self.assertEqual(self._run(t), report["lower_bound"])
+
+    def test_resource_bound_with_few_stations(self):
+        t = Tomasulo()
+        for i in range(10):
+            t.add_instruction(f"ADD F{i + 1} F20 F21")
+        report = t.analyze_dataflow()
+        # 10 条独立 ADD、5 个保留站：两波，每波占用 延迟+1 个周期
+        self.assertEqual(report["critical_path_cycles"], 6)
+        self.assertEqual(report["resource_bound"], 12)
+        self.assertEqual(report["max_parallelism"], 10)
+        self.assertLessEqual(report["lower_bound"], self._run(t))
+
+    def test_prune_configurations(self):
+        from dataflow import prune_configurations
+        t = Tomasulo()
+        for ins in ["DIV F1 F2 F3", "DIV F4 F1 F1"]:
+            t.add_instruction(ins)
+        parsed = [e["parsed"] for e in t.instruction_queue]
+        fast = dict(t.op_latencies, DIV=2)
+        slow = dict(t.op_latencies, DIV=20)
+        kept = prune_configurations(parsed, [{"op_latencies": fast}, {"op_latencies": slow}], best_cycles=20)
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(kept[0][0]["op_latencies"]["DIV"], 2)
+        self.assertEqual(kept[0][1], 5)
+
+    def test_prune_keeps_fast_latency_model(self):
+        import runner
+        from dataflow import prune_configurations
+        t = Tomasulo()
+        t.add_instruction("DIV F1 F2 F3")
+        parsed = [e["parsed"] for e in t.instruction_queue]
+        config = {"op_latencies": dict(t.op_latencies), "latency_models": {"DIV": {"model": "early_out", "fast": 1}}}
+        cycles = runner.simulate(["DIV F1 F2 F3"], config)["cycles"]
+        self.assertEqual(cycles, 2)
+        kept = prune_configurations(parsed, [config], best_cycles=cycles + 1)
+        self.assertEqual([c for c, _bound in kept], [config])
+        self.assertLessEqual(kept[0][1], cycles)
+
+
+class TestWorkloadGenerator(unittest.TestCase):
+    """测试合成负载生成器"""
+    def test_seeded_and_parseable(self):
+        from workload import generate_program
+        a = list(generate_program(500, seed=7))
+        b = list(generate_program(500, seed=7))
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, list(generate_program(500, seed=8)))
+        t = Tomasulo()
+        for line in a:
+            t.parse_instruction_text(line)
+
+    def test_controls(self):
+        from workload import generate_program
+        lines = list(generate_program(300, seed=1, op_mix={"MUL": 1, "LOAD": 1}, num_registers=4,
+                                      address_range=(100, 110), dep_distance={1: 1}, dep_probability=1.0))
+        ops = {line.split()[0] for line in lines}
+        self.assertEqual(ops, {"MUL", "LOAD"})
+        for line in lines:
+            parts = line.split()
+            regs = [p for p in parts[1:] if p.startswith("F")]
+            self.assertTrue(all(1 <= int(r[1:]) <= 4 for r in regs))
+            if parts[0] == "LOAD":
+                self.assertTrue(100 <= int(parts[2]) < 110)
+        # 距离恒为 1 时，每条 MUL 的源操作数都是上一条指令的目的寄存器
+        for prev, cur in zip(lines, lines[1:]):
+            if cur.startswith("MUL"):
+                self.assertEqual(cur.split()[2], prev.split()[1])
+        with self.assertRaises(ValueError):
+            list(generate_program(1, op_mix={"NOP": 1}))
+
+    def test_write_and_feed(self):
+        import os
+        import tempfile
+        from workload import feed, write_program
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "prog.txt")
+            self.assertEqual(write_program(path, 1000, seed=3, chunk_size=64), 1000)
+            with open(path) as f:
+                lines = f.read().splitlines()
+        t = Tomasulo()
+        self.assertEqual(feed(t, 1000, seed=3), 1000)
+        self.assertEqual([e["text"] for e in t.instruction_queue], lines)
+
+
+class TestDifferentialFuzz(unittest.TestCase):
+    """测试乱序引擎与顺序参考解释器的差分模糊测试"""
+    def test_engine_matches_reference(self):
+        from fuzz import run_fuzz
+        self.assertEqual(run_fuzz(300, workers=1, chunk_size=100), [])
+
+    def test_waw_with_slow_older_writer(self):
+        from fuzz import check_program
+        state = {"registers": {"F2": 6, "F3": 3, "F4": 1}, "memory": {}}
+        config = {"op_latencies": {"DIV": 8, "ADD": 1}}
+        self.assertEqual(check_program(["DIV F1 F2 F3", "ADD F1 F4 F4", "ADD F5 F1 F1"], state, config), [])
+
+    def test_store_to_load_forwarding(self):
+        from fuzz import check_program
+        state = {"registers": {"F1": 5}, "memory": {0: 1}}
+        config = {"op_latencies": {"STORE": 3, "LOAD": 1}}
+        self.assertEqual(check_program(["STORE 0 F1", "LOAD F2 0", "STORE 0 F2", "LOAD F3 0"], state, config), [])
+
+    def test_mismatch_is_detected_and_shrunk(self):
+        from fuzz import check_case
+
+        class NoForwarding(Tomasulo):
+            def step(self):
+                self.memory_rename.clear()
+                super().step()
+
+        failure = None
+        for seed in range(500):
+            failure = check_case(seed, engine_factory=NoForwarding)
+            if failure:
+                break
+        self.assertIsNotNone(failure)
+        self.assertTrue(failure["diffs"])
+        self.assertLessEqual(len(failure["program"]), failure["original_length"])
+        ops = [line.split()[0] for line in failure["program"]]
+        self.assertIn("STORE", ops)
+
+    def test_shrink_is_minimal(self):
+        from fuzz import shrink
+        program = [f"ADD F{i} F1 F1" for i in range(1, 20)]
+        minimal = shrink(program, lambda p: "ADD F7 F1 F1" in p and "ADD F13 F1 F1" in p)
+        self.assertEqual(minimal, ["ADD F7 F1 F1", "ADD F13 F1 F1"])
+
+
+class TestHeadlessImports(unittest.TestCase):
+    """核心与工具模块不得引入 PyQt5（保持无界面环境可用、GUI 冷启动只付一次 Qt 的代价）"""
+    def test_core_modules_do_not_import_qt(self):
+        import os
+        import subprocess
+        import sys
+        code = "import sys, tomasulo, dataflow, workload, fuzz, runner, server, result_cache, export, shard, instruction_log, counters, breakpoints, compare, snapshot, ops, cache, bench_gui, sampling, program_index; print('PyQt5' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(out, "False")
+
+
+class TestSuperscalarConfig(unittest.TestCase):
+    """测试发射宽度、功能单元数量、流水化与发射策略"""
+    def _starts(self, t):
+        t.run(max_cycles=500)
+        self.assertTrue(t.is_finished())
+        return [e["exec_start_cycle"] for e in t.instruction_queue]
+
+    def test_issue_width(self):
+        t = Tomasulo(issue_width=2)
+        for i in range(5):
+            t.add_instruction(f"ADD F{i + 1} F10 F11")
+        t.run()
+        self.assertEqual([e["issue_cycle"] for e in t.instruction_queue], [1, 1, 2, 2, 3])
+
+    def test_non_pipelined_divider_blocks(self):
+        t = Tomasulo(fu_counts={"DIVIDER": 1}, pipelined={"DIVIDER": False})
+        t.add_instruction("DIV F1 F2 F3")
+        t.add_instruction("DIV F4 F2 F3")
+        self.assertEqual(self._starts(t), [1, 9])
+
+    def test_pipelined_multiplier_accepts_each_cycle(self):
+        t = Tomasulo(fu_counts={"MULT": 1})
+        for i in range(3):
+            t.add_instruction(f"MUL F{i + 1} F10 F11")
+        self.assertEqual(self._starts(t), [1, 2, 3])
+        # 不同类别互不影响
+        t = Tomasulo(fu_counts={"MULT": 1})
+        t.add_instruction("MUL F1 F10 F11")
+        t.add_instruction("ADD F2 F10 F11")
+        self.assertEqual(self._starts(t), [1, 1])
+
+    def test_issue_policy_oldest_first(self):
+        program = ["MUL F1 F2 F3", "ADD F4 F5 F6", "ADD F7 F5 F6", "ADD F8 F5 F6"]
+        starts = {}
+        for policy in ("station", "oldest"):
+            t = Tomasulo(num_stations=3, fu_counts={"ADDER": 1}, pipelined={"ADDER": False}, issue_policy=policy)
+            t.op_latencies.update({"ADD": 3, "MUL": 1})
+            for ins in program:
+                t.add_instruction(ins)
+            starts[policy] = self._starts(t)
+        # 按保留站顺序时，复用 RS0 的较新指令抢先；按年龄时较旧的指令先执行
+        self.assertLess(starts["station"][3], starts["station"][2])
+        self.assertLess(starts["oldest"][2], starts["oldest"][3])
+
+    def test_config_round_trip_and_bounds(self):
+        t = Tomasulo(num_stations=8, issue_width=1, fu_counts={"DIVIDER": 1}, pipelined={"DIVIDER": False})
+        clone = Tomasulo.from_config(t.get_config())
+        self.assertEqual(clone.get_config(), t.get_config())
+        for i in range(4):
+            t.add_instruction(f"DIV F{i + 1} F10 F11")
+        report = t.analyze_dataflow(keep_edges=False)
+        self.assertEqual(report["resource_bound"], 1 + 4 * 8)
+        self.assertLessEqual(report["lower_bound"], t.run())
+
+    def test_rejects_zero_width(self):
+        for config in ({"issue_width": 0}, {"issue_width": -1}, {"fu_counts": {"ADDER": 0}},
+                       {"fu_counts": {"MULT": 1, "DIVIDER": -2}}):
+            with self.assertRaises(ValueError):
+                Tomasulo.from_config(config)
+        with self.assertRaises(ValueError):
+            Tomasulo(issue_width=0)
+
+
+class TestBranchesAndLoops(unittest.TestCase):
+    """测试标签、分支与惰性展开的动态指令流"""
+    LOOP = ["loop: ADD F1 F1 F2", "MUL F4 F1 F1", "BNE F1 F3 loop", "STORE 5 F4"]
+
+    def _loop_machine(self, **kwargs):
+        t = Tomasulo(**kwargs)
+        t.registers['F2']['value'] = 1
+        t.registers['F3']['value'] = 10
+        t.load_program(self.LOOP)
+        return t
+
+    def test_loop_results_and_lazy_expansion(self):
+        t = self._loop_machine()
+        self.assertEqual(t.instruction_queue, [])
+        t.run(max_cycles=2000)
+        self.assertTrue(t.is_finished())
+        self.assertEqual(t.registers['F1']['value'], 10)
+        self.assertEqual(t.memory[5], 100)
+        # 10 次迭代 x 3 条 + 循环后的 STORE
+        self.assertEqual(len(t.instruction_queue), 31)
+        self.assertEqual(t.branch_stats["branches"], 10)
+        # 静态条目被所有动态实例共享
+        self.assertIs(t.instruction_queue[0]["parsed"], t.instruction_queue[3]["parsed"])
+
+    def test_predictor_and_penalty(self):
+        cycles = {}
+        for predictor in ("not_taken", "taken", "bimodal"):
+            t = self._loop_machine(branch_predictor=predictor, mispredict_penalty=5)
+            cycles[predictor] = t.run(max_cycles=5000)
+            if predictor == "not_taken":
+                self.assertEqual(t.branch_stats["mispredicts"], 9)
+            elif predictor == "taken":
+                self.assertEqual(t.branch_stats["mispredicts"], 1)
+            else:
+                self.assertEqual(t.branch_stats["mispredicts"], 2)
+        self.assertLess(cycles["taken"], cycles["not_taken"])
+        slow = self._loop_machine(branch_predictor="not_taken", mispredict_penalty=0).run(max_cycles=5000)
+        # 每次预测错误都会推迟后续取指（最后一次可能与循环尾部的执行重叠）
+        self.assertGreaterEqual(cycles["not_taken"] - slow, 8 * 5)
+
+    def test_mispredict_blocks_younger_issue(self):
+        t = Tomasulo(branch_predictor="not_taken", mispredict_penalty=3)
+        t.load_program(["BEQ F2 F2 skip", "ADD F1 F2 F3", "skip: ADD F4 F2 F3"])
+        t.run()
+        jmp, target = t.instruction_queue
+        self.assertEqual(target["text"], "ADD F4 F2 F3")
+        # 分支在周期 1 执行完成，惩罚 3 个周期后第 5 周期恢复取指
+        self.assertEqual(target["issue_cycle"], jmp["exec_complete"] + 3 + 1)
+
+    def test_program_errors(self):
+        t = Tomasulo()
+        with self.assertRaises(ValueError):
+            t.load_program(["BEQ F1 F2 nowhere"])
+        with self.assertRaises(ValueError):
+            t.add_instruction("JMP loop")
+        with self.assertRaises(ValueError):
+            t.load_program(["a: ADD F1 F2 F3", "a: JMP a"])
+        # 无分支的程序等价于逐条 add_instruction
+        t.load_program(["start: LOAD F1 10", "", "ADD F2 F1 F1"])
+        self.assertIsNone(t.program)
+        self.assertEqual([e["text"] for e in t.instruction_queue], ["LOAD F1 10", "ADD F2 F1 F1"])
+
+
+class TestSimulationServer(unittest.TestCase):
+    """测试批量运行器与本地 HTTP/JSON 模拟服务"""
+    PROGRAM = ["LOAD F1 10", "LOAD F2 11", "MUL F3 F1 F2", "STORE 12 F3"]
+    STATE = {"memory": {"10": 6, "11": 7}}
+
+    def test_simulate_and_job_key(self):
+        import runner
+        result = runner.simulate(self.PROGRAM, {"num_stations": 2}, self.STATE)
+        self.assertTrue(result["finished"])
+        self.assertEqual(result["memory"]["12"], 42)
+        self.assertEqual(len(result["timing"]), 4)
+        self.assertEqual(result["timing"][2][0], "MUL F3 F1 F2")
+        # 规范化：空行/空白与显式默认配置不影响键，配置或状态变化则改变键
+        key = runner.job_key(self.PROGRAM, {}, self.STATE)
+        self.assertEqual(key, runner.job_key("\n".join(self.PROGRAM) + "\n\n", {"num_stations": 5}, self.STATE))
+        self.assertNotEqual(key, runner.job_key(self.PROGRAM, {"num_stations": 2}, self.STATE))
+        self.assertNotEqual(key, runner.job_key(self.PROGRAM, {}, {"memory": {"10": 1}}))
+        batch = runner.run_batch([{"program": self.PROGRAM, "config": {"num_stations": 2}, "state": self.STATE}])
+        self.assertEqual(batch, [result])
+
+    def test_deltas_replay_to_final_state(self):
+        import runner
+        result = runner.simulate(self.PROGRAM, None, self.STATE, deltas=True)
+        self.assertEqual([d["cycle"] for d in result["deltas"]], list(range(1, result["cycles"] + 1)))
+        registers = {f"F{i}": 0 for i in range(1, 33)}
+        memory = dict(self.STATE["memory"])
+        timing = {}
+        for delta in result["deltas"]:
+            registers.update(delta["registers"])
+            memory.update(delta["memory"])
+            for index, *row in delta["timing"]:
+                timing[index] = row
+        self.assertEqual(registers, result["registers"])
+        self.assertEqual(memory, result["memory"])
+        self.assertEqual([timing[i] for i in range(4)], [row[1:] for row in result["timing"]])
+
+    def test_http_api_with_cache_and_streaming(self):
+        from server import BackgroundServer, SimulationClient
+        with BackgroundServer(workers=1) as background:
+            client = SimulationClient(port=background.port)
+            self.assertEqual(client.health(), {"status": "ok"})
+            first = client.simulate(self.PROGRAM, {"num_stations": 2}, self.STATE)
+            second = client.simulate("\n".join(self.PROGRAM), {"num_stations": 2}, self.STATE)
+            self.assertFalse(first["cached"])
+            self.assertTrue(second["cached"])
+            self.assertEqual(first["memory"]["12"], 42)
+            messages = list(client.stream(self.PROGRAM, {"num_stations": 2}, self.STATE))
+            self.assertEqual(messages[-1]["type"], "result")
+            self.assertEqual(messages[-1]["cycles"], first["cycles"])
+            self.assertEqual(len(messages) - 1, first["cycles"])
+            # 流式请求只把最终结果（不含增量）写入缓存，随后的普通请求命中
+            final = {k: v for k, v in messages[-1].items() if k not in ("type", "cached")}
+            self.assertEqual(final, {k: v for k, v in first.items() if k != "cached"})
+            with self.assertRaises(RuntimeError) as ctx:
+                client.simulate(["FOO F1 F2"])
+            self.assertIn("400", str(ctx.exception))
+            stats = client.stats()
+            self.assertEqual(stats["cache_hits"], 1)
+            self.assertEqual(stats["errors"], 1)
+
+    def test_stream_forwards_segments(self):
+        import runner
+        from server import BackgroundServer, SimulationClient
+        program = ["loop: ADD F1 F1 F2", "BNE F1 F3 loop", "STORE 5 F1"]
+        state = {"registers": {"F2": 1, "F3": 300}}
+        expected = runner.simulate(program, None, state, deltas=True)
+        # 分段运行（段间以快照交接）与一次运行的增量和结果相同
+        segment, deltas = {"program": program, "state": state}, []
+        while True:
+            chunk, snapshot, result = runner.simulate_chunk(segment, 100)
+            deltas += chunk
+            if result is not None:
+                break
+            self.assertLessEqual(len(chunk), 100)
+            segment = {"snapshot": snapshot}
+        self.assertEqual(deltas, expected.pop("deltas"))
+        self.assertEqual(result, expected)
+        with BackgroundServer(workers=1) as background:
+            background.server.STREAM_FIRST_CYCLES = 16
+            client = SimulationClient(port=background.port)
+            messages = list(client.stream(program, None, state))
+            self.assertEqual([m for m in messages if m["type"] == "delta"],
+                             [dict(d, type="delta") for d in deltas])
+            self.assertEqual(messages[-1]["cycles"], expected["cycles"])
+            self.assertTrue(client.simulate(program, None, state)["cached"])
+            self.assertEqual(client.stats()["pending"], 0)
+
+    def test_malformed_framing_gets_error_response(self):
+        import socket
+        from server import BackgroundServer
+
+        def _status(raw):
+            with socket.create_connection(("127.0.0.1", background.port), timeout=10) as sock:
+                sock.sendall(raw)
+                return sock.recv(4096).split(b"\r\n", 1)[0]
+
+        with BackgroundServer(workers=1) as background:
+            for length in (b"abc", b"-5"):
+                status = _status(b"POST /simulate HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+                self.assertEqual(status, b"HTTP/1.1 400 Bad Request")
+            status = _status(b"GET /health HTTP/1.1\r\nX-Long: " + b"a" * 70000 + b"\r\n\r\n")
+            self.assertEqual(status, b"HTTP/1.1 413 Payload Too Large")
+
+
+class TestResultCache(unittest.TestCase):
+    """测试磁盘结果缓存：紧凑编码、批量运行器命中、LRU 淘汰与版本失效"""
+    LOOP = ["loop: ADD F1 F1 F2", "BNE F1 F3 loop", "STORE 5 F1"]
+    STATE = {"registers": {"F2": 1, "F3": 20}}
+
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_encode_round_trip(self):
+        import json
+        import runner
+        from result_cache import decode_result, encode_result
+        result = runner.simulate(self.LOOP, None, self.STATE)
+        self.assertEqual(decode_result(encode_result(result)), result)
+        partial = runner.simulate(self.LOOP, None, self.STATE, max_cycles=5)
+        self.assertIn(None, partial["timing"][-1])
+        self.assertEqual(decode_result(encode_result(partial)), partial)
+        # 41 条动态指令只保存 3 条不同的文本
+        self.assertLess(len(encode_result(result)), len(json.dumps(result)) // 3)
+
+    def test_batch_runner_uses_cache(self):
+        import runner
+        from result_cache import ResultCache
+        cache = ResultCache(self.directory)
+        jobs = [{"program": self.LOOP, "state": self.STATE, "config": {"num_stations": n}} for n in (1, 2, 1)]
+        first = runner.run_batch(jobs, cache=cache)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(len(cache), 2)
+        second = runner.run_batch(jobs, cache=ResultCache(self.directory))
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], first[2])
+        self.assertNotEqual(first[0]["cycles"], first[1]["cycles"])
+
+    def test_size_based_lru_eviction(self):
+        import os
+        import runner
+        from result_cache import ResultCache, encode_result
+        result = runner.simulate(self.LOOP, None, self.STATE)
+        entry_size = len(encode_result(result))
+        cache = ResultCache(self.directory, max_bytes=entry_size * 3)
+        for key in ("aa1", "bb2", "cc3"):
+            cache.put(key, result)
+        # 访问 aa1 使其成为最近使用；写入第 4 条时淘汰最久未使用的 bb2
+        os.utime(cache._path("bb2"), ns=(1, 1))
+        os.utime(cache._path("cc3"), ns=(2, 2))
+        self.assertIsNotNone(cache.get("aa1"))
+        cache.put("dd4", result)
+        self.assertLessEqual(cache.size, entry_size * 3)
+        self.assertIsNone(cache.get("bb2"))
+        self.assertIsNotNone(cache.get("aa1"))
+        self.assertIsNotNone(cache.get("dd4"))
+
+    def test_engine_version_change_invalidates(self):
+        import result_cache
+        import runner
+        cache = result_cache.ResultCache(self.directory)
+        key = runner.job_key(self.LOOP, None, self.STATE)
+        cache.put(key, runner.simulate(self.LOOP, None, self.STATE))
+        self.assertIsNotNone(result_cache.ResultCache(self.directory).get(key))
+        original = result_cache.ENGINE_VERSION
+        result_cache.ENGINE_VERSION = original + 1
+        try:
+            self.assertIsNone(result_cache.ResultCache(self.directory).get(key))
+        finally:
+            result_cache.ENGINE_VERSION = original
+
+    def test_version_reset_keeps_unrelated_files(self):
+        import os
+        import result_cache
+        # 指向已有内容的目录时，只删除缓存自己的分片目录
+        for rel in ("my_project/src/a.py", "ab/notes.txt", "cd/old.trc"):
+            path = os.path.join(self.directory, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("x")
+        result_cache.ResultCache(self.directory)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "my_project", "src", "a.py")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "ab", "notes.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "cd")))
+
+
+class TestExport(unittest.TestCase):
+    """测试时间表的 CSV / 列式二进制 / NumPy 导出与逐周期指标"""
+    def setUp(self):
+        import tempfile
+        from workload import feed
+        self._tmp = tempfile.TemporaryDirectory()
+        self.t = Tomasulo(num_stations=3)
+        feed(self.t, 200, seed=5, num_registers=6)
+        self.t.run()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _path(self, name):
+        import os
+        return os.path.join(self._tmp.name, name)
+
+    def test_csv_and_columnar_round_trip(self):
+        import csv
+        from export import iter_timing, read_columnar, write_columnar, write_csv
+        expected = list(iter_timing(self.t))
+        self.assertEqual(write_csv(self.t, self._path("t.csv")), 200)
+        with open(self._path("t.csv"), newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:2], ["index", "text"])
+        self.assertEqual(rows[5], ["4", expected[4][0]] + [str(c) for c in expected[4][1:]])
+
+        self.assertEqual(write_columnar(self.t, self._path("t.tcol"), row_group_size=64), 200)
+        columns, texts = read_columnar(self._path("t.tcol"))
+        decoded = [(texts[columns["text_id"][i]], columns["issue_cycle"][i], columns["exec_start_cycle"][i],
+                    columns["exec_complete"][i], columns["write_cycle"][i]) for i in range(200)]
+        self.assertEqual(decoded, expected)
+        only, _ = read_columnar(self._path("t.tcol"), columns=["write_cycle"])
+        self.assertEqual(list(only), ["write_cycle"])
+
+    def test_cycle_metrics(self):
+        from export import cycle_metrics
+        metrics = cycle_metrics(self.t)
+        self.assertEqual(len(metrics["cycle"]), self.t.clock)
+        for name in ("issued", "started", "completed", "written"):
+            self.assertEqual(sum(metrics[name]), 200)
+        # 在途指令数不超过保留站数量，结束时为 0
+        self.assertLessEqual(max(metrics["in_flight"]), 3)
+        self.assertEqual(metrics["in_flight"][-1] - metrics["written"][-1], 0)
+
+    def test_numpy_export(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("未安装 numpy")
+        from export import iter_timing, to_numpy, write_columnar
+        table, texts = to_numpy(self.t)
+        self.assertEqual(len(table), 200)
+        self.assertEqual(texts[table["text_id"][7]], next(r for i, r in enumerate(iter_timing(self.t)) if i == 7)[0])
+        write_columnar(self.t, self._path("t.tcol"))
+        from_file, _ = to_numpy(self._path("t.tcol"))
+        self.assertTrue((from_file == table).all())
+
+
+class TestTimingChanges(unittest.TestCase):
+    """测试引擎提供的逐周期变化集合（时间线视图、寄存器表与增量导出的数据源）"""
+    def test_changes_match_timing_fields(self):
+        from workload import feed
+        t = Tomasulo(num_stations=3, fu_counts={"MULT": 1}, pipelined={"MULT": False})
+        feed(t, 60, seed=11, num_registers=5)
+        fields = ("issue_cycle", "exec_start_cycle", "exec_complete", "write_cycle")
+        previous = [tuple(e[f] for f in fields) for e in t.instruction_queue]
+        while not t.is_finished():
+            t.step()
+            current = [tuple(e[f] for f in fields) for e in t.instruction_queue]
+            changed = {i for i, (a, b) in enumerate(zip(previous, current)) if a != b}
+            self.assertEqual(t.timing_changes, changed)
+            previous = current
+        t.reset()
+        self.assertEqual(t.timing_changes, set())
+
+    def test_dirty_registers_cover_changes(self):
+        from workload import feed
+        t = Tomasulo(num_stations=4)
+        feed(t, 80, seed=3, num_registers=6)
+
+        def _snapshot():
+            return {reg: (d["value"], d["rename"], d["busy"]) for reg, d in t.get_state()["registers"].items()}
+
+        previous = _snapshot()
+        while not t.is_finished():
+            t.step()
+            current = _snapshot()
+            changed = {reg for reg in current if current[reg] != previous[reg]}
+            self.assertLessEqual(changed, t.dirty_registers)
+            self.assertLessEqual(t.dirty_registers, {f"F{i}" for i in range(1, 7)})
+            previous = current
+        t.reset()
+        self.assertEqual(t.dirty_registers, set(t.registers))
+
+
+class TestBarrierSharding(unittest.TestCase):
+    """测试 BARRIER 排空语义与分片模拟结果与顺序模拟完全一致"""
+    def test_barrier_waits_for_drain(self):
+        t = Tomasulo()
+        for line in ["MUL F1, F2, F3", "BARRIER", "ADD F4, F5, F6"]:
+            t.add_instruction(line)
+        t.run(max_cycles=100)
+        mul, barrier, add = t.instruction_queue
+        self.assertEqual(barrier["issue_cycle"], mul["write_cycle"] + 1)
+        self.assertEqual(barrier["write_cycle"], barrier["issue_cycle"])
+        self.assertEqual(add["issue_cycle"], barrier["issue_cycle"])
+        self.assertTrue(t.is_finished())
+
+    def test_sharded_matches_sequential(self):
+        import fuzz
+        import runner
+        import shard
+        checked = 0
+        for seed in range(300):
+            program, state, config = fuzz.make_case(seed, max_length=24)
+            # 分片模拟不支持缓存模型（缓存状态跨越切分点）
+            config.pop("cache", None)
+            try:
+                shard.parse_trace(program)
+            except ValueError:
+                continue
+            expected = runner.simulate(program, config, state)
+            for chunk_size in (None, 1, 4):
+                result = shard.run_sharded(program, config, state, chunk_size=chunk_size)
+                result.pop("shards")
+                self.assertEqual(result, expected, f"seed={seed} chunk_size={chunk_size}")
+            checked += 1
+        self.assertGreater(checked, 100)
+
+    def test_failed_splits_continue_instead_of_restarting(self):
+        import runner
+        import shard
+        from workload import generate_program
+        program = list(generate_program(300, seed=3))
+        expected = runner.simulate(program)
+        # 依赖链密集的程序几乎没有排空点：连续模拟覆盖整个区间，每个片段不会被反复重新模拟
+        calls = []
+        original = shard.simulate_segment
+        shard.simulate_segment = lambda task: calls.append(task) or original(task)
+        try:
+            result = shard.run_sharded(program, chunk_size=10, max_misses=2)
+        finally:
+            shard.simulate_segment = original
+        shards = result.pop("shards")
+        self.assertEqual(result, expected)
+        self.assertLessEqual(len(calls), shards["segments"])
+        self.assertEqual(shards["segments"] + shards["merges"], 30)
+
+    def test_process_pool_and_branch_rejection(self):
+        import runner
+        import shard
+        from workload import generate_program
+        program = []
+        for seed in range(4):
+            program += list(generate_program(40, seed=seed)) + ["BARRIER"]
+        result = shard.run_sharded(program, workers=2, chunk_size=16)
+        self.assertGreaterEqual(result.pop("shards")["segments"], 4)
+        self.assertEqual(result, runner.simulate(program))
+        with self.assertRaises(ValueError):
+            shard.run_sharded(["loop: ADD F1, F1, F2", "BNE F1, F3, loop"])
+
+
+class TestInstructionLog(unittest.TestCase):
+    """测试写回后的指令退休到紧凑归档，且对外仍表现为条目列表"""
+    def test_retired_entries_leave_live_window(self):
+        from workload import feed
+        t = Tomasulo(num_stations=4)
+        feed(t, 300, seed=9, num_registers=6)
+        self.assertEqual(t.instruction_queue.live_count, 0)
+        max_live = 0
+        while not t.is_finished():
+            t.step()
+            max_live = max(max_live, t.instruction_queue.live_count)
+        # 活动窗口只含在途指令与下一条待发射指令
+        self.assertLessEqual(max_live, len(t.reservation_stations) + 1)
+        self.assertEqual(t.instruction_queue.live_count, 0)
+        self.assertLess(len(t.instruction_queue.texts), 300)
+        for i, entry in enumerate(t.instruction_queue):
+            self.assertTrue(entry["issued"])
+            self.assertEqual(tuple(entry[f] for f in ("issue_cycle", "exec_start_cycle", "exec_complete", "write_cycle")),
+                             t.instruction_queue.timing_row(i))
+            self.assertIsNotNone(entry["write_cycle"])
+
+    def test_snapshot_is_independent(self):
+        from workload import feed
+        t = Tomasulo()
+        feed(t, 40, seed=2)
+        for _ in range(15):
+            t.step()
+        snapshot = t.instruction_queue.snapshot()
+        before = list(snapshot.iter_timing())
+        t.run()
+        self.assertEqual(list(snapshot.iter_timing()), before)
+        self.assertNotEqual(list(t.instruction_queue.iter_timing()), before)
+
+    def test_branch_flags_and_list_semantics(self):
+        t = Tomasulo(branch_predictor="not_taken")
+        t.registers["F2"]["value"] = 2
+        t.load_program(["loop: ADD F1, F1, F3", "SUB F2, F2, F4", "BNE F2, F5, loop"])
+        t.registers["F4"]["value"] = 1
+        t.run(max_cycles=500)
+        queue = t.instruction_queue
+        branches = [e for e in queue if e["parsed"]["op"] == "BNE"]
+        self.assertEqual([e["taken"] for e in branches], [True, False])
+        self.assertEqual([e.get("mispredicted", False) for e in branches], [True, False])
+        self.assertEqual(queue[-1], queue[len(queue) - 1])
+        self.assertEqual(queue[:2], [queue[0], queue[1]])
+        t.reset()
+        self.assertEqual(t.instruction_queue, [])
+
+
+class TestPerformanceCounters(unittest.TestCase):
+    """测试性能计数器、直方图、定长采样序列与导出"""
+    def test_counts_and_histograms(self):
+        t = Tomasulo(num_stations=3)
+        for line in ["ADD F1 F2 F3", "MUL F4 F1 F1", "STORE 8 F4", "LOAD F5 8", "BARRIER"]:
+            t.add_instruction(line)
+        t.run(max_cycles=200)
+        c = t.get_counters()
+        values = c["counters"]
+        self.assertEqual(values["cycles"], t.clock)
+        self.assertEqual(values["issued"], 4)
+        self.assertEqual(values["started"], 4)
+        self.assertEqual((values["completed"], values["barriers"]), (5, 1))
+        # ADD: 2 次查找；MUL: 2 次均等待 F1；STORE: 等待 F4；LOAD: 等待 STORE 转发
+        self.assertEqual((values["rename_lookups"], values["rename_hits"]), (6, 4))
+        self.assertEqual(values["broadcasts"], 4)
+        self.assertEqual(sum(c["occupancy"]), t.clock)
+        self.assertEqual(sum(c["fanout"]), values["broadcasts"])
+        self.assertEqual(sum(k * n for k, n in enumerate(c["fanout"])), values["broadcast_waiters"])
+        t.reset()
+        self.assertEqual(t.get_counters()["counters"]["cycles"], 0)
+
+    def test_sampling_ring_buffer_and_dump(self):
+        import json
+        import os
+        import tempfile
+        from counters import CounterRegistry
+        from workload import feed
+        t = Tomasulo()
+        t.log_enabled = False
+        t.counters = CounterRegistry(len(t.reservation_stations), sample_interval=10, capacity=5)
+        feed(t, 200, seed=4)
+        with tempfile.TemporaryDirectory() as d:
+            t.counters.dump_path = os.path.join(d, "live.json")
+            t.run()
+            self.assertEqual(t.log_lines, [])
+            series = t.counters.series()
+            self.assertEqual(len(series["rows"]), 5)
+            cycles = [row[0] for row in series["rows"]]
+            self.assertEqual(cycles[-1], t.clock // 10 * 10)
+            self.assertEqual(cycles, sorted(cycles))
+            with open(t.counters.dump_path) as f:
+                dumped = json.load(f)
+            self.assertEqual(dumped["counters"]["cycles"], cycles[-1])
+            prom = t.counters.to_prometheus()
+            self.assertIn(f"tomasulo_completed_total {t.completed_total}", prom)
+            self.assertIn('tomasulo_station_occupancy_cycles_total{busy="0"}', prom)
+
+
+class TestBreakpoints(unittest.TestCase):
+    """测试条件断点：命中周期与单步执行时观察到的状态一致"""
+    LINES = ["LOAD F1 300", "MUL F5 F1 F1", "ADD F2 F5 F5", "DIV F3 F2 F5", "STORE 300 F3", "ADD F5 F3 F1"]
+
+    def _engine(self):
+        t = Tomasulo(num_stations=3)
+        t.memory[300] = 2
+        for line in self.LINES:
+            t.add_instruction(line)
+        return t
+
+    def test_each_condition_matches_single_stepping(self):
+        from breakpoints import compile_breakpoints, parse_breakpoints, run_until
+        cases = {
+            "cycle 7": lambda t: t.clock == 7,
+            "issue 4": lambda t: t.instruction_queue[3]["issue_cycle"] == t.clock,
+            "write 2": lambda t: t.instruction_queue[1]["write_cycle"] == t.clock,
+            "reg F5": lambda t: t.registers["F5"]["value"] != 0,
+            "mem 300": lambda t: t.instruction_queue[4]["write_cycle"] == t.clock,
+            "full": lambda t: t.busy_stations == 3,
+        }
+        for text, predicate in cases.items():
+            reference = self._engine()
+            while not predicate(reference):
+                self.assertFalse(reference.is_finished(), text)
+                reference.step()
+            t = self._engine()
+            hits = run_until(t, compile_breakpoints(t, parse_breakpoints(text)))
+            self.assertTrue(hits, text)
+            self.assertEqual(t.clock, reference.clock, text)
+
+    def test_resume_and_parse_errors(self):
+        from breakpoints import compile_breakpoints, parse_breakpoints, run_until
+        from workload import feed
+        t = Tomasulo()
+        feed(t, 300, seed=5)
+        check = compile_breakpoints(t, parse_breakpoints("full; cycle 100"))
+        hits = []
+        while not t.is_finished():
+            hits += run_until(t, check)
+        self.assertIn("cycle 100", hits)
+        reference = Tomasulo()
+        feed(reference, 300, seed=5)
+        self.assertEqual(t.clock, reference.run())
+        self.assertEqual(run_until(t, compile_breakpoints(t, [])), [])
+        for bad in ("reg X1", "issue 0", "cycle", "watch F1", "full 3"):
+            with self.assertRaises(ValueError):
+                parse_breakpoints(bad)
+
+
+class TestConfigComparison(unittest.TestCase):
+    """测试配置对比：覆盖解析、增量对齐与两侧结果和单独模拟一致"""
+    def test_overrides_and_incremental_alignment(self):
+        from compare import ConfigComparison, parse_overrides
+        config = parse_overrides("DIV=20; num_stations=3; fu.MULT=1; pipelined.DIVIDER=0; issue_policy=oldest")
+        self.assertEqual(config["op_latencies"]["DIV"], 20)
+        self.assertEqual((config["num_stations"], config["fu_counts"], config["pipelined"]),
+                         (3, {"MULT": 1}, {"DIVIDER": False}))
+        for bad in ("DIV", "DIV=x", "FOO=1", "num_stations=0", "issue_policy=random"):
+            with self.assertRaises(ValueError):
+                parse_overrides(bad)
+        comparison = ConfigComparison()
+        rows = [("ADD F1 F2 F3", 1, 2, 6, 7), ("DIV F4 F1 F1", 2, 8, 15, 16)]
+        self.assertEqual(comparison.feed(("a", "rows", 0, rows, {"cycles": 16})), (0, 0))
+        self.assertEqual(comparison.feed(("b", "rows", 0, [("ADD F1 F2 F3", 1, 2, 6, 7)], {"cycles": 7})), (0, 1))
+        self.assertEqual(comparison.feed(("b", "rows", 1, [("DIV F4 F1 F1", 2, 8, 27, 28)], {"cycles": 28})), (1, 2))
+        self.assertEqual(comparison.row(1)["delta"], (0, 0, 12, 12))
+        self.assertEqual(comparison.summary()["max_delta"], (12, 1))
+        self.assertEqual(comparison.metric_rows()[0][:4], ("cycles", 16, 28, 12))
+        with self.assertRaises(ValueError):
+            comparison.feed(("a", "rows", 5, [], {}))
+
+    def test_parallel_runs_match_single_runs(self):
+        import runner
+        from compare import compare, parse_overrides
+        from workload import generate_program
+        program = list(generate_program(400, seed=4))
+        config_a = parse_overrides("")
+        config_b = parse_overrides("DIV=20; num_stations=8")
+        comparison = compare(program, config_a, config_b, chunk_cycles=50)
+        self.assertFalse(comparison.errors)
+        for side, config in (("a", config_a), ("b", config_b)):
+            expected = runner.simulate(program, config)
+            self.assertEqual([list(row) for row in comparison.rows[side]], expected["timing"])
+            self.assertEqual(comparison.metrics[side]["cycles"], expected["cycles"])
+        self.assertEqual(comparison.aligned, 400)
+        self.assertFalse(comparison.mismatches)
+
+
+class TestStateSnapshot(unittest.TestCase):
+    """测试二进制状态快照：中途保存后恢复继续运行与原模拟器完全一致"""
+    def test_resume_matches_uninterrupted_run(self):
+        import fuzz
+        import runner
+        import snapshot
+        checked = 0
+        for seed in range(200):
+            program, state, config = fuzz.make_case(seed, max_length=24)
+            try:
+                reference = runner.build_engine(program, config, state)
+            except ValueError:
+                continue
+            total = reference.run(max_cycles=5000)
+            t = runner.build_engine(program, config, state)
+            t.run(max_cycles=total // 2)
+            data = snapshot.dumps(t)
+            restored = snapshot.loads(data)
+            self.assertEqual(snapshot.dumps(restored), data, f"seed={seed}")
+            self.assertEqual(runner.resume(data, max_cycles=5000), runner.collect_result(reference), f"seed={seed}")
+            restored.run(max_cycles=5000)
+            self.assertEqual(restored.get_counters(), reference.get_counters(), f"seed={seed}")
+            checked += 1
+        self.assertGreater(checked, 100)
+
+    def test_file_view_and_invalid_input(self):
+        import mmap
+        import os
+        import tempfile
+        import snapshot
+        t = Tomasulo()
+        for line in ["LOAD F1 300", "DIV F2 F1 F1", "MUL F3 F2 F2", "STORE 8 F2"]:
+            t.add_instruction(line)
+        t.memory[300] = 7
+        t.run(max_cycles=6)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state.tsnp")
+            snapshot.save(t, path)
+            restored = snapshot.load(path)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = snapshot.SnapshotView(mapped)
+                self.assertEqual(view.clock, 6)
+                self.assertEqual([view.timing_row(i) for i in range(len(view))],
+                                 [t.instruction_queue.timing_row(i) for i in range(4)])
+                del view
+        self.assertEqual(restored.get_state()["registers"], t.get_state()["registers"])
+        t.run()
+        restored.run()
+        self.assertEqual(restored.memory[8], t.memory[8])
+        self.assertIsInstance(restored.memory[8], float)
+        data = bytearray(snapshot.dumps(t))
+        with self.assertRaises(ValueError):
+            snapshot.loads(b"TSNP" + bytes(16))
+        data[-12:-4] = (len(data)).to_bytes(8, "little")
+        with self.assertRaises(ValueError):
+            snapshot.loads(data)
+
+
+class TestOpRegistry(unittest.TestCase):
+    """测试操作注册表：新操作与顺序参考一致、自定义操作与依赖操作数的延迟模型"""
+    def test_new_ops_match_reference(self):
+        import fuzz
+        from workload import generate_program
+        mix = dict(fuzz.EXTENDED_OP_MIX, FMA=4, SQRT=2)
+        for seed in range(150):
+            program = list(generate_program(20, seed=seed, op_mix=mix, num_registers=6, address_range=(0, 4)))
+            state = {"registers": {f"F{i}": (seed * 7 + i) % 9 - 4 for i in range(1, 33)},
+                     "memory": {a: a - 2 for a in range(4)}}
+            config = {"num_stations": 1 + seed % 5, "fu_counts": {"MULT": 1, "INT": 1},
+                      "latency_models": {"FMA": {"model": "early_out", "fast": 2}}}
+            self.assertEqual(fuzz.check_program(program, state, config), [], f"seed={seed}")
+        t = Tomasulo()
+        t.registers["F1"]["value"], t.registers["F2"]["value"], t.registers["F3"]["value"] = 3, 4, 5
+        for line in ["MUL F6 F1 F1", "FMA F4 F6 F2 F3", "SQRT F5 F4", "SHL F7 F1 F2"]:
+            t.add_instruction(line)
+        t.run()
+        self.assertEqual((t.registers["F4"]["value"], t.registers["F5"]["value"], t.registers["F7"]["value"]),
+                         (41, 41 ** 0.5, 48))
+        # FMA 通过第三个源操作数槽位等待 MUL 的广播
+        rows = [t.instruction_queue.timing_row(i) for i in range(2)]
+        self.assertEqual(rows[1][1], rows[0][3])
+        with self.assertRaisesRegex(ValueError, "需要4个操作数"):
+            t.parse_instruction_text("FMA F1 F2 F3")
+        with self.assertRaisesRegex(ValueError, "无效的源寄存器3"):
+            t.parse_instruction_text("FMA F1 F2 F3 X9")
+
+    def test_register_op_and_latency_models(self):
+        import ops
+        from ops import FU_CLASSES, OPS, register_op
+        register_op("MAX", "rrr", max, fu_class="ADDER", latency=2)
+        try:
+            t = Tomasulo()
+            t.registers["F1"]["value"], t.registers["F2"]["value"] = 3, 9
+            t.add_instruction("MAX F3 F1 F2")
+            self.assertEqual(t.run(), 3)
+            self.assertEqual(t.registers["F3"]["value"], 9)
+            with self.assertRaises(ValueError):
+                register_op("ADD", "rrr", max, fu_class="ADDER", latency=2)
+            with self.assertRaises(ValueError):
+                register_op("MIN", "ra", min, fu_class="ADDER", latency=2)
+        finally:
+            del OPS["MAX"], FU_CLASSES["MAX"]
+
+        def _div_cycles(models, values):
+            t = Tomasulo(latency_models=models)
+            for i, value in enumerate(values, start=1):
+                t.registers[f"F{i}"]["value"] = value
+            t.add_instruction("DIV F9 F1 F2")
+            t.run()
+            return t.instruction_queue.timing_row(0)
+        early = {"DIV": {"model": "early_out", "fast": 2}}
+        self.assertEqual(_div_cycles(early, [5, 4]), (1, 1, 2, 3))
+        self.assertEqual(_div_cycles(early, [5, 3]), (1, 1, 8, 9))
+        self.assertEqual(_div_cycles(None, [5, 4]), (1, 1, 8, 9))
+
+        sampled = {"DIV": {"model": "sampled", "values": [3, 30], "weights": [1, 1], "seed": 7}}
+        program = [f"DIV F{i % 8 + 1} F9 F10" for i in range(64)]
+
+        def _run(models):
+            t = Tomasulo.from_config({"num_stations": 64, "latency_models": models})
+            for line in program:
+                t.add_instruction(line)
+            t.run()
+            return list(t.instruction_queue.iter_timing())
+        first = _run(sampled)
+        self.assertEqual(first, _run(Tomasulo.from_config({"latency_models": sampled}).get_config()["latency_models"]))
+        # 每条 DIV 的执行周期数（完成 - 开始 + 1）取自抽样值
+        self.assertEqual({row[3] - row[2] + 1 for row in first}, {3, 30})
+        t = Tomasulo(latency_models=sampled)
+        self.assertEqual(t.min_latencies()["DIV"], 3)
+        with self.assertRaises(ValueError):
+            ops.make_latency_model({"model": "sampled", "values": [0]})
+        with self.assertRaises(ValueError):
+            t.set_latency_model("DIV", {"model": "random"})
+
+
+class TestCacheHierarchy(unittest.TestCase):
+    """测试存储层次模型：LRU 替换、可变访存延迟与快照/配置往返"""
+    SPEC = {"levels": [{"size": 4, "assoc": 2, "line": 1, "latency": 2},
+                       {"size": 16, "assoc": 4, "line": 2, "latency": 7}],
+            "memory_latency": 30}
+
+    def test_lru_and_load_latency(self):
+        from cache import CacheHierarchy
+        cache = CacheHierarchy(self.SPEC)
+        # L1 两组各两路：0、2、4 映射到同一组，访问 4 时替换最久未使用的 2
+        self.assertEqual([cache.access(a) for a in (0, 2, 0, 4, 0, 2, 3)], [30, 30, 2, 30, 2, 7, 7])
+        stats = cache.stats()
+        self.assertEqual((stats["levels"]["L1"]["hits"], stats["levels"]["L1"]["misses"]), (2, 5))
+        self.assertEqual((stats["levels"]["L2"]["hits"], stats["levels"]["L2"]["misses"]), (2, 3))
+        for bad in ({"levels": []}, {"levels": [{"size": 6, "assoc": 4, "line": 1, "latency": 1}], "memory_latency": 9},
+                    {"levels": [{"size": 4, "assoc": 2, "line": 1, "latency": 0}], "memory_latency": 9}):
+            with self.assertRaises(ValueError):
+                CacheHierarchy(bad)
+
+        t = Tomasulo(cache=self.SPEC)
+        t.memory[40] = 5
+        for line in ["LOAD F1 40", "LOAD F2 41", "STORE 40 F1", "LOAD F3 40"]:
+            t.add_instruction(line)
+        t.run()
+        latencies = [row[3] - row[2] + 1 for row in t.instruction_queue.iter_timing()]
+        # 40 缺失到内存；41 与 40 同一 L2 行；之后 40 在 L1 命中
+        self.assertEqual(latencies, [30, 7, 2, 2])
+        self.assertEqual(t.registers["F3"]["value"], 5)
+        self.assertEqual(t.get_counters()["cache"]["reads"], 3)
+        self.assertEqual(t.min_latencies()["LOAD"], 2)
+        self.assertEqual(Tomasulo.from_config(t.get_config()).get_config(), t.get_config())
+        t.reset()
+        self.assertEqual(t.cache.stats()["reads"], 0)
+
+    def test_snapshot_resume_and_shard_rejection(self):
+        import runner
+        import shard
+        import snapshot
+        from workload import generate_program
+        program = list(generate_program(600, seed=3, op_mix={"LOAD": 4, "STORE": 2, "ADD": 2, "MUL": 1}))
+        config = {"cache": self.SPEC, "num_stations": 6, "fu_counts": {"MEM": 1}, "pipelined": {"MEM": False}}
+        expected = runner.simulate(program, config)
+        self.assertGreater(expected["cycles"], runner.simulate(program, {"num_stations": 6})["cycles"])
+        self.assertEqual(expected["cache"]["reads"] + expected["cache"]["writes"], sum(
+            1 for line in program if line.split()[0] in ("LOAD", "STORE")))
+        t = runner.build_engine(program, config)
+        t.run(max_cycles=expected["cycles"] // 2)
+        self.assertEqual(runner.resume(snapshot.dumps(t)), expected)
+        with self.assertRaises(ValueError):
+            shard.run_sharded(program, config)
+
+
+    def test_prune_keeps_cache_config(self):
+        import runner
+        from dataflow import prune_configurations
+        program = ["LOAD F1 0", "LOAD F2 0", "ADD F3 F1 F2", "LOAD F4 0"]
+        t = Tomasulo()
+        parsed = t.parse_program(program)[1]
+        # L1 命中延迟 1 低于固定的 LOAD 延迟 4：按固定延迟计算的下界会高于实际周期数
+        cached = {"cache": {"levels": [{"size": 4, "assoc": 1, "line": 1, "latency": 1}], "memory_latency": 2}}
+        fixed = {"op_latencies": dict(t.op_latencies, LOAD=20)}
+        cycles = runner.simulate(program, cached)["cycles"]
+        self.assertLess(cycles, runner.simulate(program)["cycles"])
+        # 该配置本身就是最优配置（实际周期数等于 best），不能被剔除
+        kept = prune_configurations(parsed, [cached, fixed], best_cycles=cycles)
+        self.assertEqual([config for config, _bound in kept], [cached])
+        self.assertLessEqual(kept[0][1], cycles)
+
+class TestGuiBenchmark(unittest.TestCase):
+    """测试界面刷新基准：分位数、基准比较，以及（安装了 PyQt5 时）offscreen 实测"""
+    def test_percentiles_and_baseline(self):
+        from bench_gui import compare_to_baseline, percentile
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 90), percentile(values, 100)), (50, 90, 100))
+        self.assertEqual(percentile([7], 99), 7)
+        baseline = {"results": [{"size": 1000, "ui_p50_ms": 2.0, "ui_p90_ms": 4.0}]}
+        current = [{"size": 1000, "ui_p50_ms": 2.4, "ui_p90_ms": 5.5}, {"size": 5000, "ui_p50_ms": 9.0, "ui_p90_ms": 9.0}]
+        self.assertEqual(compare_to_baseline(current, baseline, 1.25), [(1000, "ui_p90_ms", 4.0, 5.5)])
+
+    def test_offscreen_run(self):
+        import importlib.util
+        if importlib.util.find_spec("PyQt5") is None:
+            self.skipTest("未安装 PyQt5")
+        from bench_gui import run_child
+        result = run_child(300, 5, 0, "offscreen")
+        self.assertEqual((result["size"], result["steps"]), (300, 5))
+        self.assertLessEqual(result["ui_p50_ms"], result["ui_max_ms"])
+
+
+class TestRenameTags(unittest.TestCase):
+    """测试整数重命名标签：引擎内部只保存整数，可读标签只出现在 get_state 中"""
+    def test_integer_tags_and_labels(self):
+        from tomasulo import REGISTER_INDEX, TAG_IMM, TAG_MEM, TAG_NONE
+        t = Tomasulo(num_stations=3)
+        t.memory[7] = 4
+        for line in ["LOAD F1 7", "FMA F2 F1 F1 F1", "STORE 7 F2"]:
+            t.add_instruction(line)
+        t.step()
+        rs0, rs1, rs2 = t.reservation_stations
+        self.assertEqual((rs0["src1_source"], rs0["src2_source"], rs0["src3_source"]), (TAG_IMM, TAG_MEM, TAG_NONE))
+        self.assertEqual((rs1["src1_source"], rs1["src2_source"], rs1["src3_source"]), (rs0["tag"],) * 3)
+        self.assertEqual(rs2["src1_source"], rs1["tag"])
+        self.assertEqual(t.memory_rename[7], rs2["tag"])
+        self.assertEqual(t.rename_table[REGISTER_INDEX["F2"]], rs1["tag"])
+        self.assertTrue(all(type(tag) is int for tag in t.rename_table))
+        state = t.get_state()
+        self.assertEqual([rs["src1_source"] for rs in state["reservation_stations"]], ["Imm", "RS:RS0", "RS:RS1"])
+        self.assertEqual(state["reservation_stations"][1]["src3_source"], "RS:RS0")
+        self.assertEqual(state["registers"]["F2"], {"value": 0, "rename": "RS:RS1", "busy": True})
+        self.assertEqual(state["registers"]["F3"], {"value": 0, "rename": None, "busy": False})
+        # get_state 返回副本，引擎中的标签保持整数
+        self.assertEqual(rs1["src1_source"], rs0["tag"])
+        t.run()
+        self.assertEqual(t.memory[7], 20)
+        self.assertEqual(list(t.rename_table), [0] * len(t.rename_table))
+        self.assertEqual(t.get_state()["registers"]["F2"]["busy"], False)
+
+
+class TestSampling(unittest.TestCase):
+    """测试抽样模拟：从程序中间开始取指、窗口测量与外推"""
+    def test_start_program_mid_program(self):
+        program = ["LOAD F1 0", "ADD F2 F1 F1", "MUL F3 F2 F2", "STORE 1 F3"]
+        full = Tomasulo()
+        full.memory[0] = 3
+        full.load_program(program)
+        full.run()
+        # 顺序执行前两条后从第 2 条开始，结果相同
+        t = Tomasulo()
+        t.memory[0] = 3
+        texts, parsed_list, labels = t.parse_program(program)
+        for parsed in parsed_list[:2]:
+            t.execute_instruction(parsed)
+        t.start_program(texts, parsed_list, labels, 2)
+        t.run()
+        self.assertEqual(len(t.instruction_queue), 2)
+        self.assertEqual((t.registers["F3"]["value"], t.memory[1]), (36, 36))
+        self.assertEqual(t.memory[1], full.memory[1])
+        with self.assertRaises(ValueError):
+            t.start_program(texts, parsed_list, labels, 5)
+
+    def test_estimate_close_to_full_simulation(self):
+        import runner
+        import sampling
+        from workload import generate_program
+        program = list(generate_program(12000, seed=3))
+        exact = runner.simulate(program, max_cycles=10 ** 7)
+        result = sampling.sample(program, interval=2000, window=300, warmup=300)
+        self.assertEqual((result["instructions"], result["windows"]), (12000, 6))
+        self.assertLess(abs(result["cycles"] - exact["cycles"]) / exact["cycles"], 0.05)
+        low, high = result["cycles_interval"]
+        self.assertLessEqual(low, result["cycles"])
+        self.assertLessEqual(result["cycles"], high)
+        self.assertLess(result["detailed_instructions"], 12000 // 2)
+
+    def test_loop_with_cache_and_validation(self):
+        import runner
+        import sampling
+        loop = ["LOAD F2 1", "LOAD F3 2", "top:", "ADD F1 F1 F2", "LOAD F4 9", "STORE 5 F4", "BNE F1 F3 top"]
+        state = {"memory": {"1": 1, "2": 2000}}
+        config = {"cache": {"levels": [{"size": 16, "assoc": 2, "line": 4, "latency": 2}], "memory_latency": 30}}
+        exact = runner.simulate(loop, config, state, max_cycles=10 ** 7)
+        result = sampling.sample(loop, config, state, interval=1000, window=200, warmup=100)
+        self.assertEqual(result["instructions"], exact["instructions"])
+        self.assertLess(abs(result["cycles"] - exact["cycles"]) / exact["cycles"], 0.05)
+        with self.assertRaises(ValueError):
+            sampling.sample(loop, config, state, interval=100, window=200)
+        with self.assertRaises(ValueError):
+            sampling.sample(["ADD F1 F2 F3"], interval=10, window=5, warmup=0)
+
+
+class TestProgramIndex(unittest.TestCase):
+    """测试行偏移索引：随机访问、索引复用与失效、从任意行开始模拟"""
+    def _write(self, path, text):
+        with open(path, "w", newline="") as f:
+            f.write(text)
+
+    def test_random_access_and_reuse(self):
+        import os
+        import tempfile
+        from program_index import IndexedProgram
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prog.txt")
+            self._write(path, "LOAD F1 0\r\n\r\nstart: ADD F2 F1 F1\nloop:\n  MUL F3 F2 F2\nBNE F3 F4 end\nend: STORE 1 F3")
+            with IndexedProgram(path) as program:
+                self.assertTrue(program.rebuilt)
+                self.assertEqual((program.rows, program.labels, program.branches), (5, {"start": 1, "loop": 2, "end": 4}, True))
+                self.assertEqual([program.text(i) for i in range(5)],
+                                 ["LOAD F1 0", "ADD F2 F1 F1", "MUL F3 F2 F2", "BNE F3 F4 end", "STORE 1 F3"])
+                self.assertEqual(program.parsed[2]["src1"], "F2")
+                with self.assertRaises(IndexError):
+                    program.text(5)
+            self.assertTrue(os.path.exists(path + ".idx"))
+            with IndexedProgram(path) as program:
+                self.assertFalse(program.rebuilt)
+                self.assertEqual(program.text(4), "STORE 1 F3")
+            # 文件变化后索引失效
+            self._write(path, "ADD F1 F2 F3\nSUB F4 F1 F1\n")
+            with IndexedProgram(path) as program:
+                self.assertTrue(program.rebuilt)
+                self.assertEqual((program.rows, program.text(1)), (2, "SUB F4 F1 F1"))
+            # 建立索引失败时不泄漏已打开的文件与映射
+            import gc
+            import warnings
+            for bad in ("ADD F1 F2 F3\nJMP nowhere\n", "a: ADD F1 F2 F3\na: SUB F1 F2 F3\n", "ADD F1 F2\n"):
+                self._write(path, bad)
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter("always", ResourceWarning)
+                    with self.assertRaises(ValueError):
+                        IndexedProgram(path, rebuild=True)
+                    gc.collect()
+                self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+
+    def test_start_from_row_with_image(self):
+        import os
+        import tempfile
+        import runner
+        import sampling
+        from program_index import IndexedProgram, build_engine
+        from workload import generate_program
+        lines = list(generate_program(3000, seed=4))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "big.txt")
+            self._write(path, "\n".join(lines) + "\n")
+            with IndexedProgram(path) as program:
+                state = {"registers": {"F1": 3, "F2": 5}, "memory": {"10": 7}}
+                t = build_engine(program, 2000, state=state)
+                t.run()
+                expected = runner.simulate(lines[2000:], state=state)
+                self.assertEqual((t.clock, t.registers["F5"]["value"]), (expected["cycles"], expected["registers"]["F5"]))
+                self.assertEqual(len(t.instruction_queue), 1000)
+                # 抽样模拟可直接使用索引程序
+                result = sampling.sample(program, interval=1000, window=200, warmup=200)
+                self.assertEqual((result["instructions"], result["windows"]), (3000, 3))
+
+
+class TestInstructionLoader(unittest.TestCase):
+    """测试后台加载：工作线程分块解析；含分支的程序直接使用工作线程的解析结果（需要 PyQt5）"""
+    PROGRAM = "F2 = 1\nloop: ADD F1 F1 F2\n\nBNE F1 F3 loop\nSTORE 0 F1\n"
+
+    def setUp(self):
+        import importlib.util
+        if importlib.util.find_spec("PyQt5") is None:
+            self.skipTest("未安装 PyQt5")
+        import os
+        import tempfile
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication([])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "prog.txt")
+        with open(self.path, "w") as f:
+            f.write(self.PROGRAM)
+
+    def test_chunks_and_errors(self):
+        import main as gui
+        chunks, errors, finished = [], [], []
+        loader = gui.InstructionLoader(self.path)
+        loader.chunk_ready.connect(chunks.extend)
+        loader.line_error.connect(lambda *args: errors.append(args))
+        loader.finished.connect(lambda *args: finished.append(args))
+        loader.run()
+        self.assertEqual([(raw, labels, text) for raw, labels, text, _parsed in chunks],
+                         [("loop: ADD F1 F1 F2", ["loop"], "ADD F1 F1 F2"), ("BNE F1 F3 loop", [], "BNE F1 F3 loop"),
+                          ("STORE 0 F1", [], "STORE 0 F1")])
+        self.assertEqual(chunks[1][3]["target"], "loop")
+        self.assertEqual([(lineno, line) for lineno, line, _message in errors], [(1, "F2 = 1")])
+        self.assertEqual(finished, [(3, 1, False)])
+
+    def test_control_flow_uses_worker_parse(self):
+        import time
+        import main as gui
+        from PyQt5.QtWidgets import QMessageBox
+        for name in ("information", "warning"):
+            original = getattr(QMessageBox, name)
+            self.addCleanup(setattr, QMessageBox, name, original)
+            setattr(QMessageBox, name, staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+        window = gui.TomasuloUI()
+        self.addCleanup(window.close)
+        window.start_loading(self.path)
+        # GUI 线程不得重新解析程序
+
+        def fail(*args, **kwargs):
+            raise AssertionError("GUI 线程重新解析了程序")
+        window.tomasulo.parse_program = window.tomasulo.load_program = fail
+        deadline = time.time() + 30
+        while window._loader is not None and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        window._loader_thread.wait()
+        self.assertEqual(window.tomasulo.program_texts, ["ADD F1 F1 F2", "BNE F1 F3 loop", "STORE 0 F1"])
+        self.assertEqual(window.tomasulo.labels, {"loop": 0})
+        window.tomasulo.registers["F2"]["value"] = 1
+        window.tomasulo.registers["F3"]["value"] = 3
+        window.tomasulo.run()
+        self.assertEqual(window.tomasulo.memory[0], 3)
+
+
+class TestInstructionTableModel(unittest.TestCase):
+    """测试指令表模型：直接读取指令记录，单步时只通知新增行与 timing_changes 中的行（需要 PyQt5）"""
+
+    def setUp(self):
+        import importlib.util
+        if importlib.util.find_spec("PyQt5") is None:
+            self.skipTest("未安装 PyQt5")
+        import os
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication([])
+
+    def test_incremental_sync(self):
+        import main as gui
+        from PyQt5.QtCore import Qt
+        t = Tomasulo()
+        for i in range(50):
+            t.add_instruction(f"ADD F{i % 8 + 1} F9 F10")
+        model = gui.InstructionTableModel()
+        model.sync(t)
+        self.assertEqual(model.rowCount(), 50)
+        self.assertEqual(model.data(model.index(3, 0)), "ADD")
+        self.assertEqual(model.data(model.index(3, 1)), "F4")
+        self.assertEqual(model.data(model.index(3, 4)), "")
+        self.assertIsNone(model.data(model.index(0, 0), Qt.BackgroundRole))
+
+        notified = set()
+        model.dataChanged.connect(lambda first, last: notified.update(range(first.row(), last.row() + 1)))
+        t.step()
+        model.sync(t)
+        self.assertEqual(notified, t.timing_changes)
+        self.assertLess(len(notified), 50)
+        row = min(t.timing_changes)
+        self.assertEqual(model.data(model.index(row, 4)), "1")
+        self.assertEqual(model.data(model.index(row, 4), Qt.BackgroundRole), model.CHANGED_COLOR)
+        self.assertIsNone(model.data(model.index(row, 5), Qt.BackgroundRole))
+
+        # 下一次单步重绘上次高亮的行以清除高亮
+        notified.clear()
+        previous = set(t.timing_changes)
+        t.step()
+        model.sync(t)
+        self.assertEqual(notified, previous | t.timing_changes)
+        self.assertIsNone(model.data(model.index(row, 4), Qt.BackgroundRole))
+
+        # 新增的行整行高亮；加载过程中追加的行不高亮
+        t.add_instruction("MUL F1 F2 F3")
+        model.sync(t)
+        self.assertEqual(model.rowCount(), 51)
+        self.assertEqual(model.data(model.index(50, 0), Qt.BackgroundRole), model.CHANGED_COLOR)
+        t.add_instruction("MUL F1 F2 F3")
+        model.sync(t, highlight=False)
+        self.assertIsNone(model.data(model.index(51, 0), Qt.BackgroundRole))
+
+        model.set_critical_rows([2])
+        self.assertEqual(model.data(model.index(2, 0), Qt.BackgroundRole), model.CRITICAL_COLOR)
+        t.reset()
+        model.sync(t)
+        self.assertEqual(model.rowCount(), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
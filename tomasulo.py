@@ -1,10 +1,94 @@
+from array import array
+
+from cache import CacheHierarchy
+from counters import CounterRegistry
+from dataflow import analyze_dataflow
+from instruction_log import TIMING_FIELDS, InstructionLog
+# 操作语义、操作数形式、默认延迟与功能单元类别由注册表给出（见 ops.py）；
+# FU_CLASSES、BRANCH_OPS、BARRIER_OP 在此重新导出
+from ops import BARRIER_OP, BRANCH_OPS, FU_CLASSES, OPS, SOURCE_SLOTS, default_latencies, make_latency_model
+
+# 分支预测器：静态 不跳转/跳转，或按 PC 索引的 2 位饱和计数器
+BRANCH_PREDICTORS = ("not_taken", "taken", "bimodal")
+
+# 寄存器操作数无效时的提示
+_OPERAND_ERRORS = {
+    "dest": "无效的目标寄存器",
+    "src1": "无效的源寄存器1",
+    "src2": "无效的源寄存器2",
+    "src3": "无效的源寄存器3",
+}
+
+# 寄存器 F1..F32；寄存器名 -> 重命名表（`rename_table`）下标
+NUM_REGISTERS = 32
+REGISTER_INDEX = {f"F{i}": i for i in range(1, NUM_REGISTERS + 1)}
+
+# 重命名标签为整数：正数为生产者（保留站）的物理标签，等待其广播；其余为已就绪操作数的来源。
+# 重命名表、内存重命名表与保留站的 `src*_source` 都只保存整数，可读标签只在
+# `get_state()`（以及由其取数据的界面）中由 `tag_label` 生成
+TAG_REG = 0     # 操作数已从寄存器读取（或已由广播得到）；重命名表中表示寄存器没有待写回的生产者
+TAG_IMM = -1    # 立即数/地址
+TAG_MEM = -2    # 发射时读取的内存值
+TAG_NONE = -3   # 该槽位没有操作数
+SOURCE_LABELS = {TAG_REG: "Reg", TAG_IMM: "Imm", TAG_MEM: "Mem", TAG_NONE: "N/A"}
+
+# 源操作数槽位 -> (来源字段, 值字段, 就绪字段)
+_SLOT_FIELDS = {slot: (f"{slot}_source", f"{slot}_value", f"{slot}_ready") for slot in SOURCE_SLOTS}
+
+# 就绪指令争用功能单元时的发射顺序策略
+ISSUE_POLICIES = ("station", "oldest")
+
+# 引擎版本：修改 `step()` 的计时或语义时递增，使缓存的模拟结果失效（见 result_cache.py）
+# 2：操作注册表、三源操作数保留站与延迟模型
+ENGINE_VERSION = 2
+
+
 class Tomasulo:
-    def __init__(self):
+    def __init__(self, num_stations=5, issue_width=None, fu_counts=None, pipelined=None, issue_policy="station",
+                 branch_predictor="bimodal", mispredict_penalty=2, latency_models=None, cache=None):
+        """创建模拟器。
+
+        机器宽度参数（默认值保持原有行为：不限制发射宽度和功能单元数量）：
+        - `num_stations`：保留站数量。
+        - `issue_width`：每周期最多发射到保留站的指令数，None 表示不限制。
+        - `fu_counts`：功能单元类别 -> 数量（类别见 `FU_CLASSES`），未列出的类别不限制。
+        - `pipelined`：功能单元类别 -> 是否流水化。流水化单元每周期可接收一条新操作，
+          非流水化单元（如除法器）在整个执行延迟内被占用。默认全部流水化。
+        - `issue_policy`：多个就绪保留站争用功能单元时的顺序，"station" 按保留站顺序，
+          "oldest" 按指令年龄（程序顺序）。
+
+        分支参数（仅对 `load_program` 加载的含分支程序有效）：
+        - `branch_predictor`：见 `BRANCH_PREDICTORS`。
+        - `mispredict_penalty`：预测错误时，分支执行完成后取指还需额外停顿的周期数。
+
+        `latency_models`：操作 -> 延迟模型描述（见 ops.py），未列出的操作使用 `op_latencies` 的固定延迟。
+        `cache`：存储层次配置（见 cache.py），给出时 LOAD/STORE 的延迟由缓存命中情况决定。
+        """
+        if issue_policy not in ISSUE_POLICIES:
+            raise ValueError(f"未知的发射策略: {issue_policy}")
+        if branch_predictor not in BRANCH_PREDICTORS:
+            raise ValueError(f"未知的分支预测器: {branch_predictor}")
+        self.branch_predictor = branch_predictor
+        self.mispredict_penalty = mispredict_penalty
+        if num_stations < 1:
+            raise ValueError(f"保留站数量必须为正: {num_stations}")
+        # 发射宽度或功能单元数为 0 时指令永远无法发射或开始执行，run() 会一直空转
+        if issue_width is not None and issue_width < 1:
+            raise ValueError(f"发射宽度必须为正: {issue_width}")
+        for fu_class, count in (fu_counts or {}).items():
+            if count < 1:
+                raise ValueError(f"功能单元数量必须为正: {fu_class}={count}")
+        self.issue_width = issue_width
+        self.fu_counts = dict(fu_counts or {})
+        self.pipelined = dict(pipelined or {})
+        self.issue_policy = issue_policy
         # 初始化保留站、寄存器和指令队列
         # 保留站记录包括解析后的字段和操作数记账
         self.reservation_stations = [
             {
                 "name": f"RS{i}",
+                # 物理标签：该保留站的结果在重命名表与 CDB 广播中的编号
+                "tag": i + 1,
                 "busy": False,
                 "instruction": None,
                 "op": None,
@@ -15,37 +99,140 @@ class Tomasulo:
                 "src2_source": None,
                 "src1_value": None,
                 "src2_value": None,
+                "src3_source": None,
+                "src3_value": None,
                 "time_left": 0,
             }
-            for i in range(5)
+            for i in range(num_stations)
         ]
         # 初始化浮点寄存器（F1到F32）
-        self.registers = {f"F{i}": {"value": 0, "busy": False, "rename": None} for i in range(1, 33)}
-        # instruction_queue 保存字典: {text, issued, issue_cycle, exec_complete, write_cycle}
-        self.instruction_queue = []
-        # (指令条目跟踪自己的 `issued` 标志)
+        self.registers = {reg: {"value": 0} for reg in REGISTER_INDEX}
+        # 寄存器别名表：寄存器下标 -> 最后一个未写回的生产者标签（TAG_REG 表示没有），
+        # 寄存器忙碌即表项非零
+        self.rename_table = array("i", [TAG_REG]) * (NUM_REGISTERS + 1)
+        # 动态指令记录：活动窗口中的条目为字典 {text, parsed, issued, issue_cycle, ...}，
+        # 写回后退休到紧凑的归档数组（见 instruction_log.py）
+        self.instruction_queue = InstructionLog()
+        # 按程序顺序发射：下一条待发射指令在队列中的下标
+        self.issue_cursor = 0
         self.clock = 0
         self.memory = {i: 0 for i in range(256)}  # 模拟内存
+        # 内存地址重命名表：addr -> 最后一个未写回的 STORE 的标签
+        self.memory_rename = {}
         self.completed_operations = []  # 跟踪已完成的操作
-        # 操作延迟（周期数）- 默认教学/演示值
+        # 操作延迟（周期数）- 默认教学/演示值，取自操作注册表
         # 用户可调: DIV=8, MUL=6, ADD/SUB=5, LOAD/STORE=4
-        self.op_latencies = {
-            "ADD": 5,
-            "SUB": 5,
-            "MUL": 6,
-            "DIV": 8,
-            "LOAD": 4,
-            "STORE": 4,
-        }
+        self.op_latencies = default_latencies()
+        # 非固定的延迟模型：操作 -> 模型描述，以及编译后的可调用对象（见 set_latency_model）
+        self.latency_models = {}
+        self._latency_fns = {}
+        for op, model in (latency_models or {}).items():
+            self.set_latency_model(op, model)
+        # 存储层次（None 表示 LOAD/STORE 使用固定延迟）
+        self.cache = CacheHierarchy(cache) if cache else None
         # 已完成（写回完成）指令的累积计数
         self.completed_total = 0
+        # 最近一次 step() 中时间字段（发射/开始/完成/写回）发生变化的指令下标，
+        # 供界面与导出增量更新，无需每周期扫描整个指令队列
+        self.timing_changes = set()
+        # 最近一次 step() 中值、重命名标签或忙标志可能变化的寄存器名（reset() 后为全部寄存器）
+        self.dirty_registers = set(self.registers)
+        # 最近一次 step() 中被 STORE 写入的内存地址，以及该周期结束时忙碌的保留站数
+        self.memory_changes = set()
+        self.busy_stations = 0
+        # 性能计数器（见 counters.py），由 step() 直接累加
+        self.counters = CounterRegistry(len(self.reservation_stations))
         # 调试标志控制打印（测试时默认为关闭）
         self.debug = False
-        # 用于UI的内部日志缓冲区
+        # 用于UI的内部日志缓冲区；无界面的长时间运行可关闭逐条日志，改用计数器观察进度
+        self.log_enabled = True
         self.log_lines = []
+        self._reset_functional_units()
+        self._reset_program()
+
+    def _reset_functional_units(self):
+        # 功能单元忙碌日历：本周期各类别空闲单元数，以及 周期 -> 在该周期释放单元的类别列表。
+        # 检查某类别是否有空闲单元只需查 _fu_free，为 O(1)
+        self._fu_free = dict(self.fu_counts)
+        self._fu_release = {}
+
+    def _reset_program(self):
+        # 静态程序（load_program）及其惰性展开状态；program 为 None 时只使用 add_instruction 入队的指令
+        self.program = None
+        self.labels = {}
+        # 每个静态 PC 的指令文本（文本与已解析字典在该 PC 的所有动态实例间共享）
+        self.program_texts = []
+        self._fetch_pc = 0
+        self._fetch_done = True
+        # 取指前端的功能状态（按程序顺序执行以确定分支方向），首次取指时从寄存器/内存初始化
+        self._fe_regs = None
+        self._fe_mem = None
+        # 分支预测器状态与取指停顿
+        self._bimodal = {}
+        self._fetch_stall_entry = None
+        self._fetch_resume_cycle = 0
+        self.branch_stats = {"branches": 0, "mispredicts": 0}
+
+    def get_config(self):
+        """返回机器配置（可传给 `Tomasulo.from_config` 重建同样的模拟器）。"""
+        return {
+            "num_stations": len(self.reservation_stations),
+            "issue_width": self.issue_width,
+            "fu_counts": dict(self.fu_counts),
+            "pipelined": dict(self.pipelined),
+            "issue_policy": self.issue_policy,
+            "branch_predictor": self.branch_predictor,
+            "mispredict_penalty": self.mispredict_penalty,
+            "op_latencies": dict(self.op_latencies),
+            "latency_models": {op: dict(model) for op, model in self.latency_models.items()},
+            "cache": self.cache.config() if self.cache else None,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 `get_config()` 格式的字典创建模拟器，缺省的键使用默认值。"""
+        t = cls(
+            num_stations=config.get("num_stations", 5),
+            issue_width=config.get("issue_width"),
+            fu_counts=config.get("fu_counts"),
+            pipelined=config.get("pipelined"),
+            issue_policy=config.get("issue_policy", "station"),
+            branch_predictor=config.get("branch_predictor", "bimodal"),
+            mispredict_penalty=config.get("mispredict_penalty", 2),
+            latency_models=config.get("latency_models"),
+            cache=config.get("cache"),
+        )
+        t.op_latencies.update(config.get("op_latencies") or {})
+        return t
+
+    def set_latency_model(self, op, model):
+        """为操作设置延迟模型（ops.py 中的描述字典）；None 或 {"model": "fixed"} 恢复固定延迟。"""
+        op = op.upper()
+        if op not in OPS:
+            raise ValueError(f"不支持的操作: {op}")
+        fn = None if model is None else make_latency_model(model)
+        if fn is None:
+            self.latency_models.pop(op, None)
+            self._latency_fns.pop(op, None)
+        else:
+            self.latency_models[op] = dict(model)
+            self._latency_fns[op] = fn
+
+    def min_latencies(self):
+        """各操作可能的最小延迟（固定延迟，或延迟模型的下限），用于周期下界分析。"""
+        latencies = dict(self.op_latencies)
+        for op, fn in self._latency_fns.items():
+            latencies[op] = fn.minimum(latencies.get(op, OPS[op].latency))
+        if self.cache is not None:
+            for op, spec in OPS.items():
+                if spec.kind in ("load", "store"):
+                    latencies[op] = self.cache.min_latency()
+        return latencies
 
     def log(self, *args, **kwargs):
-        # 总是附加到内部日志缓冲区
+        if not self.log_enabled:
+            return
+        # 附加到内部日志缓冲区
         try:
             msg = " ".join(str(a) for a in args)
         except Exception:
@@ -64,6 +251,7 @@ class Tomasulo:
         for i, rs in enumerate(self.reservation_stations):
             self.reservation_stations[i] = {
                 "name": rs["name"],
+                "tag": rs["tag"],
                 "busy": False,
                 "instruction": None,
                 "op": None,
@@ -74,33 +262,43 @@ class Tomasulo:
                 "src2_source": None,
                 "src1_value": None,
                 "src2_value": None,
+                "src3_source": None,
+                "src3_value": None,
                 "time_left": 0,
             }
         # 重置寄存器
         for reg in list(self.registers.keys()):
-            self.registers[reg].update({"value": 0, "busy": False, "rename": None})
+            self.registers[reg]["value"] = 0
+        self.rename_table = array("i", [TAG_REG]) * (NUM_REGISTERS + 1)
+        self.memory_rename = {}
+        if self.cache is not None:
+            self.cache = CacheHierarchy(self.cache.spec)
+        self._reset_functional_units()
+        self._reset_program()
         # 清空指令队列和计数器
-        self.instruction_queue = []
+        self.instruction_queue = InstructionLog()
+        self.issue_cursor = 0
         self.completed_operations = []
         self.completed_total = 0
+        self.timing_changes = set()
+        self.dirty_registers = set(self.registers)
+        self.memory_changes = set()
+        self.busy_stations = 0
+        self.counters.reset()
         self.clock = 0
 
-    def add_instruction(self, instruction):
-        """将一条指令（文本）作为状态字典添加到队列中。"""
-        # 尽早解析和验证指令，以避免以后重复解析
-        parsed = self.parse_instruction_text(instruction)
+    def add_instruction(self, instruction, parsed=None):
+        """将一条指令（文本）作为状态字典添加到队列中。
 
-        entry = {
-            "text": instruction,
-            "parsed": parsed,
-            "issued": False,
-            "issue_cycle": None,
-            "exec_start_cycle": None,
-            "exec_complete": None,
-            "write_cycle": None,
-        }
-        self.instruction_queue.append(entry)
-        # 条目包含自己的 `issued` 标志
+        若调用者已解析过该指令（例如后台加载线程），可通过 `parsed` 传入以跳过重复解析。
+        """
+        # 尽早解析和验证指令，以避免以后重复解析
+        if parsed is None:
+            parsed = self.parse_instruction_text(instruction)
+        if parsed["op"] in BRANCH_OPS:
+            raise ValueError(f"分支指令需要通过 load_program 与标签一起加载: '{instruction}'")
+        # 待发射指令只保存文本下标，发射前才创建条目字典
+        self.instruction_queue.add(instruction, parsed)
 
     def parse_instruction_text(self, text):
         """将指令文本解析为结构化字典。
@@ -112,8 +310,13 @@ class Tomasulo:
         - DIV F3 F1 F2
         - LOAD F1 100
         - STORE 100 F1
+        - BEQ F1 F2 label / BNE F1 F2 label（相等/不等时跳转）
+        - JMP label
+        - BARRIER（等待所有更早的指令写回）
+        - 以及在 ops.py 中注册的其他操作（如 FMA F4 F1 F2 F3、SQRT F2 F1、AND F3 F1 F2）
 
         返回一个字典，其键取决于操作。格式错误时引发 ValueError。
+        标签是否存在由 `load_program` 检查。
         """
         if not isinstance(text, str):
             raise ValueError("指令必须是字符串")
@@ -122,45 +325,164 @@ class Tomasulo:
         if len(tokens) == 0:
             raise ValueError("空指令")
         op = tokens[0].upper()
-        if op in ("ADD", "SUB", "MUL", "DIV"):
-            if len(tokens) != 4:
-                raise ValueError(f"{op} 需要3个操作数: dest src1 src2: '{text}'")
-            _, dest, src1, src2 = tokens
-            # 基本的寄存器名称验证
-            if dest not in self.registers:
-                raise ValueError(f"无效的目标寄存器: {dest}")
-            if src1 not in self.registers:
-                raise ValueError(f"无效的源寄存器1: {src1}")
-            if src2 not in self.registers:
-                raise ValueError(f"无效的源寄存器2: {src2}")
-            return {"op": op, "dest": dest, "src1": src1, "src2": src2}
-        elif op == "LOAD":
-            if len(tokens) != 3:
-                raise ValueError(f"LOAD 需要目标寄存器和地址: '{text}'")
-            _, dest, addr = tokens
-            if dest not in self.registers:
-                raise ValueError(f"无效的目标寄存器: {dest}")
-            try:
-                addr_i = int(addr)
-            except Exception:
-                raise ValueError(f"无效的LOAD地址: {addr}")
-            return {"op": op, "dest": dest, "addr": addr_i}
-        elif op == "STORE":
-            if len(tokens) != 3:
-                raise ValueError(f"STORE 需要地址和源寄存器: '{text}'")
-            _, addr, src = tokens
-            if src not in self.registers:
-                raise ValueError(f"无效的STORE源寄存器: {src}")
-            try:
-                addr_i = int(addr)
-            except Exception:
-                raise ValueError(f"无效的STORE地址: {addr}")
-            return {"op": op, "addr": addr_i, "src": src}
-        else:
+        spec = OPS.get(op)
+        if spec is None:
             raise ValueError(f"不支持的操作: {op}")
+        # 按注册表中的操作数形式逐个验证
+        if len(tokens) != len(spec.operands) + 1:
+            raise ValueError(f"{op} {spec.usage}: '{text}'")
+        parsed = {"op": op}
+        for key, token in zip(spec.operands, tokens[1:]):
+            if key == "addr":
+                try:
+                    token = int(token)
+                except ValueError:
+                    raise ValueError(f"无效的{op}地址: {token}")
+            elif key != "target" and token not in self.registers:
+                raise ValueError(_OPERAND_ERRORS.get(key, f"无效的{op}源寄存器") + f": {token}")
+            parsed[key] = token
+        return parsed
+
+    def parse_program_line(self, line):
+        """解析程序中的一行，返回 (标签列表, 指令文本或 None, 已解析字典或 None)。
+
+        行首可有一个或多个 `name:` 标签；只有标签的行不含指令。
+        """
+        labels = []
+        rest = line.strip()
+        while True:
+            head, sep, tail = rest.partition(":")
+            if not sep or not head.strip() or " " in head.strip():
+                break
+            labels.append(head.strip())
+            rest = tail.strip()
+        if not rest:
+            return labels, None, None
+        return labels, rest, self.parse_instruction_text(rest)
+
+    def load_program(self, lines):
+        """加载可含标签和分支（BEQ/BNE/JMP）的静态程序。
+
+        不含分支的程序等价于逐条 `add_instruction`。含分支时不预先展开动态指令流：
+        `step()` 按需从静态程序取指，由取指前端按程序顺序执行以确定分支方向。
+        因此加载的开销只与静态代码规模有关（不会因循环次数或死循环而在加载时展开）；
+        但每条已取指的动态指令仍在 `instruction_queue` 中占一条记录，内存随已执行的
+        动态指令数增长（同一静态指令的实例共享文本与已解析字典，退休后只占归档数组的一格）。
+        """
+        texts, parsed_list, labels = self.parse_program(lines)
+        if not any(parsed["op"] in BRANCH_OPS for parsed in parsed_list):
+            for text, parsed in zip(texts, parsed_list):
+                self.add_instruction(text, parsed)
+            return
+        self.start_program(texts, parsed_list, labels)
+
+    def parse_program(self, lines):
+        """把程序行解析为 (指令文本列表, 已解析字典列表, 标签 -> PC)；格式错误时引发 ValueError。"""
+        texts = []
+        parsed_list = []
+        labels = {}
+        for lineno, raw in enumerate(lines, start=1):
+            if not raw.strip():
+                continue
+            try:
+                line_labels, text, parsed = self.parse_program_line(raw)
+            except ValueError as e:
+                raise ValueError(f"第 {lineno} 行: {e}")
+            for label in line_labels:
+                if label in labels:
+                    raise ValueError(f"第 {lineno} 行: 重复的标签 {label}")
+                labels[label] = len(texts)
+            if text is not None:
+                texts.append(text)
+                parsed_list.append(parsed)
+        for text, parsed in zip(texts, parsed_list):
+            if parsed["op"] in BRANCH_OPS and parsed["target"] not in labels:
+                raise ValueError(f"未定义的标签: {parsed['target']} ('{text}')")
+        return texts, parsed_list, labels
+
+    def start_program(self, texts, parsed_list, labels, pc=0, branch_history=None):
+        """从已解析的静态程序（`parse_program` 的结果）的第 `pc` 条指令开始按需取指。
+
+        寄存器与内存取当前值。无论是否含分支，指令都在步进时才取指，因此可以从
+        大型程序的任意位置开始模拟（如抽样模拟的详细窗口），而不必先入队整个程序。
+        `branch_history` 为 bimodal 预测器的初始计数器（PC -> 0..3），缺省为弱不跳转。
+        """
+        if not 0 <= pc <= len(parsed_list):
+            raise ValueError(f"起始位置超出程序范围: {pc}")
+        self._set_program(texts, parsed_list, labels)
+        self._fetch_pc = pc
+        self._fetch_done = pc >= len(parsed_list)
+        if branch_history:
+            self._bimodal = dict(branch_history)
+
+    def _set_program(self, texts, parsed_list, labels):
+        """设置静态程序（不改变取指位置）。动态条目在取指时创建，开销与程序规模无关。"""
+        self.program = parsed_list
+        self.program_texts = texts
+        self.labels = labels
+
+    def _predict(self, pc, parsed):
+        if parsed["op"] == "JMP" or self.branch_predictor == "taken":
+            return True
+        if self.branch_predictor == "not_taken":
+            return False
+        return self._bimodal.get(pc, 1) >= 2
+
+    def _fetch_next(self):
+        """从静态程序中取出下一条动态指令追加到 `instruction_queue`；无法取指时返回 False。"""
+        if self._fetch_done or self._fetch_stall_entry is not None or self.clock < self._fetch_resume_cycle:
+            return False
+        if self._fe_regs is None:
+            self._fe_regs = {reg: data["value"] for reg, data in self.registers.items()}
+            self._fe_mem = dict(self.memory)
+        pc = self._fetch_pc
+        parsed = self.program[pc]
+        entry = {
+            "text": self.program_texts[pc],
+            "parsed": parsed,
+            "pc": pc,
+            "issued": False,
+            "issue_cycle": None,
+            "exec_start_cycle": None,
+            "exec_complete": None,
+            "write_cycle": None,
+        }
+        op = parsed["op"]
+        spec = OPS[op]
+        kind = spec.kind
+        regs = self._fe_regs
+        next_pc = pc + 1
+        if kind == "branch":
+            taken = spec.compute(*(regs[parsed[key]] for key in spec.sources))
+            predicted = self._predict(pc, parsed)
+            if op != "JMP":
+                counter = self._bimodal.get(pc, 1)
+                self._bimodal[pc] = min(counter + 1, 3) if taken else max(counter - 1, 0)
+            self.branch_stats["branches"] += 1
+            entry["taken"] = taken
+            if predicted != taken:
+                # 预测错误：在该分支执行完成（并经过惩罚周期）之前不再取指
+                entry["mispredicted"] = True
+                self.branch_stats["mispredicts"] += 1
+                self._fetch_stall_entry = len(self.instruction_queue)
+            if taken:
+                next_pc = self.labels[parsed["target"]]
+        elif kind == "load":
+            regs[parsed["dest"]] = self._fe_mem.get(parsed["addr"], 0)
+        elif kind == "store":
+            self._fe_mem[parsed["addr"]] = regs[parsed["src"]]
+        elif kind == "alu":
+            regs[parsed["dest"]] = spec.compute(*(regs[parsed[key]] for key in spec.sources))
+        self._fetch_pc = next_pc
+        self._fetch_done = next_pc >= len(self.program)
+        self.instruction_queue.append(entry)
+        return True
+
+    def allocate_reservation_station(self, instruction, entry_index=None):
+        """为指令分配一个保留站。
 
-    def allocate_reservation_station(self, instruction):
-        """为指令分配一个保留站。"""
+        `entry_index` 为该指令在 `instruction_queue` 中的下标，用于直接记录其执行周期。
+        """
         # 接受指令文本或指令条目字典
         if isinstance(instruction, dict):
             instruction_text = instruction.get("text")
@@ -174,179 +496,187 @@ class Tomasulo:
             parsed = self.parse_instruction_text(instruction_text)
 
         op = parsed.get("op")
-        # 每个操作的执行持续时间（周期）- 使用配置的 op_latencies
-
-        if op in ["ADD", "SUB", "MUL", "DIV"]:
-            dest = parsed.get("dest")
-            src1 = parsed.get("src1")
-            src2 = parsed.get("src2")
-
-            self.log(f"为指令分配保留站: {instruction_text}，目标={dest}，源1={src1}，源2={src2}")
-
-            for rs in self.reservation_stations:
-                if not rs["busy"]:
-                    rs.update({
-                        "busy": True,
-                        "instruction": instruction_text,
-                        "op": op,
-                        "dest": dest,
-                        "src1": src1,
-                        "src2": src2,
-                        "exec_time": self.op_latencies.get(op, 3),
-                        "time_left": self.op_latencies.get(op, 3),
-                        "started": False,
-                        "result": None,
-                        "write_pending": False,
-                        "write_ready_cycle": None,
-                        "src1_ready": False,
-                        "src2_ready": False,
-                    })
-
-                    # src1 的就绪状态和源映射
-                    if self.registers.get(src1, {}).get("busy"):
-                        producer = self.registers[src1].get("rename")
-                        rs["src1_source"] = producer if producer else src1
-                        rs["src1_value"] = None
-                        rs["src1_ready"] = False
-                    else:
-                        rs["src1_source"] = "Reg"
-                        rs["src1_value"] = self.registers[src1]["value"]
-                        rs["src1_ready"] = True
-
-                    # src2 的就绪状态和源映射
-                    if self.registers.get(src2, {}).get("busy"):
-                        producer = self.registers[src2].get("rename")
-                        rs["src2_source"] = producer if producer else src2
-                        rs["src2_value"] = None
-                        rs["src2_ready"] = False
-                    else:
-                        rs["src2_source"] = "Reg"
-                        rs["src2_value"] = self.registers[src2]["value"]
-                        rs["src2_ready"] = True
-
-                    # 将目标寄存器标记为重命名/繁忙
-                    if dest in self.registers:
-                        self.registers[dest]["busy"] = True
-                        # 将重命名存储为标准化标签: "RS:<name>"
-                        self.registers[dest]["rename"] = f"RS:{rs['name']}"
-                    # 如果调用者传递了一个指令条目字典，则将其标记为已发射
-                    if isinstance(instruction, dict):
-                        instruction["issued"] = True
-                        instruction["issue_cycle"] = self.clock
-                    return True
-
-        elif op in ["LOAD", "STORE"]:
-            for rs in self.reservation_stations:
-                if not rs["busy"]:
-                    rs.update({
-                        "busy": True,
-                        "instruction": instruction_text,
-                        "op": op,
-                        "exec_time": self.op_latencies.get(op, 3),
-                        "time_left": self.op_latencies.get(op, 3),
-                        "started": False,
-                        "result": None,
-                        "write_pending": False,
-                        "write_ready_cycle": None,
-                    })
-                    if op == "LOAD":
-                        dest = parsed.get("dest")
-                        addr = parsed.get("addr")
-                        rs["dest"] = dest
-                        rs["addr"] = addr
-                        # 立即数/地址源的标准化标签
-                        rs["src1_source"] = "Imm"
-                        rs["src1_value"] = addr
-                        rs["src1_ready"] = True
-                        rs["src2_source"] = "N/A"
-                        rs["src2_value"] = None
-                        rs["src2_ready"] = True
-                        if dest in self.registers:
-                            self.registers[dest]["busy"] = True
-                            # 将重命名存储为标准化标签: "RS:<name>"
-                            self.registers[dest]["rename"] = f"RS:{rs['name']}"
-                    else:  # STORE
-                        addr = parsed.get("addr")
-                        src = parsed.get("src")
-                        rs["addr"] = addr
-                        rs["src1"] = src
-                        # STORE 的源操作数就绪状态
-                        if self.registers.get(src, {}).get("busy"):
-                            producer = self.registers[src].get("rename")
-                            rs["src1_source"] = producer if producer else src
-                            rs["src1_value"] = None
-                            rs["src1_ready"] = False
-                        else:
-                            rs["src1_source"] = "Reg"
-                            rs["src1_value"] = self.registers[src]["value"]
-                            rs["src1_ready"] = True
-                        rs["src2_source"] = "N/A"
-                        rs["src2_value"] = None
-                        rs["src2_ready"] = True
-                    # 如果调用者传递了一个指令条目字典，则将其标记为已发射
-                    if isinstance(instruction, dict):
-                        instruction["issued"] = True
-                        instruction["issue_cycle"] = self.clock
-                    return True
+        spec = OPS.get(op)
+        if spec is None or spec.kind == "barrier":
+            return False
+        kind = spec.kind
+
+        for rs in self.reservation_stations:
+            if rs["busy"]:
+                continue
+            # 每个操作的执行持续时间（周期）- 使用配置的 op_latencies；
+            # 配置了延迟模型的操作在开始执行时按操作数重新确定
+            latency = self.op_latencies.get(op, spec.latency)
+            rs.update({
+                "busy": True,
+                "instruction": instruction_text,
+                "op": op,
+                "entry_index": entry_index,
+                "exec_time": latency,
+                "time_left": latency,
+                "started": False,
+                "result": None,
+                "write_pending": False,
+                "write_ready_cycle": None,
+                "src3_source": TAG_NONE,
+                "src3_value": None,
+                "src3_ready": True,
+            })
+            tag = rs["tag"]
+            if kind == "load":
+                dest = parsed.get("dest")
+                addr = parsed.get("addr")
+                rs["dest"] = dest
+                rs["addr"] = addr
+                # 立即数/地址源
+                rs["src1_source"] = TAG_IMM
+                rs["src1_value"] = addr
+                rs["src1_ready"] = True
+                # 内存操作数：若有更早的 STORE 尚未写回则等待其广播（存储到加载转发），
+                # 否则在发射时读取内存，保证程序顺序语义
+                producer = self.memory_rename.get(addr, TAG_REG)
+                if producer > 0:
+                    rs["src2_source"] = producer
+                    rs["src2_value"] = None
+                    rs["src2_ready"] = False
+                else:
+                    rs["src2_source"] = TAG_MEM
+                    rs["src2_value"] = self.memory.get(addr, 0)
+                    rs["src2_ready"] = True
+            elif kind == "store":
+                addr = parsed.get("addr")
+                rs["addr"] = addr
+                rs["src1"] = parsed.get("src")
+                self._bind_source(rs, "src1", rs["src1"])
+                self._bind_source(rs, "src2", None)
+                # 之后的 LOAD 从此 STORE 转发，之后的 STORE 覆盖此重命名
+                self.memory_rename[addr] = tag
+            else:
+                dest = parsed.get("dest")
+                rs["dest"] = dest
+                self.log(f"为指令分配保留站: {instruction_text}，目标={dest}，"
+                         f"源={', '.join(str(parsed[key]) for key in spec.sources) or '无'}")
+                # 各源操作数槽位的就绪状态和源映射（没有该操作数的槽位为 N/A）
+                for slot in SOURCE_SLOTS:
+                    rs[slot] = parsed.get(slot)
+                    self._bind_source(rs, slot, rs[slot])
+
+            # 将目标寄存器标记为重命名/繁忙
+            dest = rs.get("dest") if kind != "store" else None
+            if dest in REGISTER_INDEX:
+                self.rename_table[REGISTER_INDEX[dest]] = tag
+                self.dirty_registers.add(dest)
+            self._count_operand_lookups(rs)
+            # 如果调用者传递了一个指令条目字典，则将其标记为已发射
+            if isinstance(instruction, dict):
+                instruction["issued"] = True
+                instruction["issue_cycle"] = self.clock
+            return True
         return False
 
+    def _bind_source(self, rs, slot, reg):
+        """设置保留站一个源操作数槽位：无操作数、读取寄存器值，或等待重命名的生产者。"""
+        source, value, ready = _SLOT_FIELDS[slot]
+        producer = TAG_NONE if reg is None else self.rename_table[REGISTER_INDEX[reg]]
+        if producer > 0:
+            rs[source] = producer
+            rs[value] = None
+            rs[ready] = False
+        else:
+            rs[source] = producer
+            rs[value] = None if reg is None else self.registers[reg]["value"]
+            rs[ready] = True
+
     def execute_instruction(self, instruction):
-        """执行单个指令。"""
-        parts = instruction.split()
-        op = parts[0]
-
-        if op == "ADD":
-            dest, src1, src2 = parts[1:]
-            self.registers[dest]["value"] = self.registers[src1]["value"] + self.registers[src2]["value"]
-        elif op == "SUB":
-            dest, src1, src2 = parts[1:]
-            self.registers[dest]["value"] = self.registers[src1]["value"] - self.registers[src2]["value"]
-        elif op == "MUL":
-            dest, src1, src2 = parts[1:]
-            self.registers[dest]["value"] = self.registers[src1]["value"] * self.registers[src2]["value"]
-        elif op == "DIV":
-            dest, src1, src2 = parts[1:]
-            denom = self.registers[src2]["value"]
-            self.registers[dest]["value"] = (self.registers[src1]["value"] / denom) if denom != 0 else 0
-        elif op == "LOAD":
-            dest, address = parts[1:]
-            self.registers[dest]["value"] = self.memory[int(address)]
-        elif op == "STORE":
-            address, src = parts[1:]
-            self.memory[int(address)] = self.registers[src]["value"]
+        """按程序顺序立即执行单个指令（顺序参考语义，不推进时钟）。
+
+        接受指令文本或已解析的指令字典。
+        """
+        parsed = instruction if isinstance(instruction, dict) else self.parse_instruction_text(instruction)
+        spec = OPS[parsed["op"]]
+        kind = spec.kind
+
+        if kind == "load":
+            self.registers[parsed["dest"]]["value"] = self.memory.get(parsed["addr"], 0)
+            self.dirty_registers.add(parsed["dest"])
+        elif kind == "store":
+            self.memory[parsed["addr"]] = self.registers[parsed["src"]]["value"]
+        elif kind == "branch":
+            # 返回是否跳转，由调用者决定下一条指令
+            return spec.compute(*(self.registers[parsed[key]]["value"] for key in spec.sources))
+        elif kind == "alu":
+            self.registers[parsed["dest"]]["value"] = spec.compute(
+                *(self.registers[parsed[key]]["value"] for key in spec.sources))
+            self.dirty_registers.add(parsed["dest"])
 
     def step(self):
         """模拟一个时钟周期。"""
         self.clock += 1
         self.completed_operations = []  # 重置本周期的已完成操作
-
-        # 将指令从指令队列分派到空闲保留站
-        # 尝试尽可能多地分配（队列前端优先）。
-        # 我们在 `instruction_queue` 中保留指令以供 UI 显示，因此使用
-        # `issued_flags` 跟踪发射以避免重复发射同一指令。
-        # 确保 issued_flags 长度与队列匹配
-        for entry in self.instruction_queue:
+        self.timing_changes = set()
+        self.dirty_registers = set()
+        self.memory_changes = set()
+        counter_values = self.counters.values
+
+        # 释放在本周期重新可用的功能单元
+        for fu_class in self._fu_release.pop(self.clock, ()):
+            self._fu_free[fu_class] += 1
+
+        # 将指令从指令队列按程序顺序分派到空闲保留站（队列前端优先）。
+        # 已退休的指令仍按下标保留在 `instruction_queue` 的归档中，因此用 `issue_cursor`
+        # 指向下一条待发射指令；没有空闲保留站或达到发射宽度时停止。
+        issued = 0
+        while self.issue_cursor < len(self.instruction_queue) or self._fetch_next():
+            entry = self.instruction_queue[self.issue_cursor]
             if entry.get("issued"):
+                # 已由调用者直接分配过
+                self.issue_cursor += 1
                 continue
-            allocated = self.allocate_reservation_station(entry)
-            if allocated:
+            if entry["parsed"]["op"] == BARRIER_OP:
+                # 屏障在所有保留站空闲后的发射阶段退休，随后的指令可在同一周期发射
+                if any(rs["busy"] for rs in self.reservation_stations):
+                    break
+                for field in TIMING_FIELDS:
+                    entry[field] = self.clock
                 entry["issued"] = True
+                self.timing_changes.add(self.issue_cursor)
+                self.instruction_queue.retire(self.issue_cursor)
+                self.completed_total += 1
+                counter_values["barriers"] += 1
+                counter_values["completed"] += 1
+                self.issue_cursor += 1
+                continue
+            if self.issue_width is not None and issued >= self.issue_width:
+                break
+            if not self.allocate_reservation_station(entry, self.issue_cursor):
+                break
+            self.timing_changes.add(self.issue_cursor)
+            entry["issued"] = True
+            self.issue_cursor += 1
+            issued += 1
+        counter_values["issued"] += issued
+
+        if self.issue_policy == "oldest":
+            stations = sorted(
+                (rs for rs in self.reservation_stations if rs.get("busy")),
+                key=lambda rs: rs["entry_index"] if rs.get("entry_index") is not None else -1,
+            )
+        else:
+            stations = self.reservation_stations
 
-        # 更新保留站：操作数就绪时开始执行，启动后递减 time_left
-        for rs in self.reservation_stations:
+        # 更新保留站：操作数就绪且有空闲功能单元时开始执行，启动后递减 time_left
+        for rs in stations:
             if not rs.get("busy"):
                 continue
             # 如果执行尚未开始但操作数就绪，则标记为已启动
-            if not rs.get("started") and rs.get("src1_ready") and rs.get("src2_ready"):
+            if not rs.get("started") and not rs.get("write_pending") and rs.get("src1_ready") and rs.get("src2_ready") \
+                    and rs.get("src3_ready", True) and self._acquire_functional_unit(rs):
                 rs["started"] = True
                 # 将 time_left 设置为 exec_time（已在分配时设置）
                 rs["time_left"] = rs.get("exec_time", 1)
                 # 如果存在，将指令执行开始记录到 instruction_queue 条目中
-                instr_text = rs.get("instruction")
-                for entry in self.instruction_queue:
-                    if entry["text"] == instr_text and entry.get("exec_start_cycle") is None:
-                        entry["exec_start_cycle"] = self.clock
-                        break
+                self._record_timing(rs, "exec_start_cycle")
+                counter_values["started"] += 1
 
             # 如果已启动则递减
             if rs.get("started"):
@@ -355,33 +685,26 @@ class Tomasulo:
             # 如果执行完成（time_left == 0）且尚未待写回，则计算结果并标记执行完成
             if rs.get("started") and rs.get("time_left", 1) == 0 and not rs.get("write_pending"):
                 instr_text = rs.get("instruction")
-                op = rs.get("op")
+                spec = OPS[rs.get("op")]
+                kind = spec.kind
                 # 尽可能使用保存在 RS 中的操作数值进行计算
-                if op in ["ADD", "SUB", "MUL", "DIV"]:
-                    a = rs.get("src1_value") if rs.get("src1_value") is not None else self.registers.get(rs.get("src1"), {}).get("value", 0)
-                    b = rs.get("src2_value") if rs.get("src2_value") is not None else self.registers.get(rs.get("src2"), {}).get("value", 0)
-                    if op == "ADD":
-                        rs["result"] = a + b
-                    elif op == "SUB":
-                        rs["result"] = a - b
-                    elif op == "MUL":
-                        rs["result"] = a * b
-                    elif op == "DIV":
-                        rs["result"] = (a / b) if b != 0 else 0
-                elif op == "LOAD":
-                    addr = int(rs.get("src1_value") if rs.get("src1_value") is not None else rs.get("addr", 0))
-                    rs["result"] = self.memory.get(addr, 0)
-                elif op == "STORE":
-                    addr = int(str(rs.get("addr")).strip(','))
+                if kind == "alu" or kind == "branch":
+                    rs["result"] = spec.compute(*self._source_values(rs, spec))
+                elif kind == "load":
+                    # 内存值已在发射时读取或由 STORE 转发
+                    rs["result"] = rs.get("src2_value")
+                elif kind == "store":
                     val = rs.get("src1_value") if rs.get("src1_value") is not None else self.registers.get(rs.get("src1"), {}).get("value", 0)
                     # 对于 STORE，将内存写入推迟到实际写回时
                     rs["result"] = val
 
                 # 在本周期标记执行完成并在下一个周期调度写回
-                for entry in self.instruction_queue:
-                    if entry["text"] == instr_text and entry.get("exec_complete") is None:
-                        entry["exec_complete"] = self.clock
-                        break
+                entry = self._record_timing(rs, "exec_complete")
+                if entry is not None:
+                    # 预测错误的分支已解析：经过惩罚周期后恢复取指
+                    if rs.get("entry_index") is not None and rs["entry_index"] == self._fetch_stall_entry:
+                        self._fetch_stall_entry = None
+                        self._fetch_resume_cycle = self.clock + self.mispredict_penalty + 1
 
                 rs["write_pending"] = True
                 rs["write_ready_cycle"] = self.clock + 1
@@ -396,42 +719,63 @@ class Tomasulo:
                 dest = rs.get("dest")
                 result_val = rs.get("result")
 
-                # 执行实际写回：寄存器或内存
-                if rs.get("op") == "STORE":
+                producer_tag = rs["tag"]
+                # 执行实际写回：寄存器或内存。只有重命名表仍指向本 RS 时才更新，
+                # 否则已有更晚的写者（WAW），其结果将覆盖本结果
+                if OPS[rs.get("op")].kind == "store":
                     # STORE 现在写入内存
                     try:
                         addr = int(str(rs.get("addr")).strip(','))
                     except Exception:
                         addr = 0
-                    if result_val is not None:
-                        self.memory[addr] = result_val
+                    if self.memory_rename.get(addr) == producer_tag:
+                        del self.memory_rename[addr]
+                        if result_val is not None:
+                            self.memory[addr] = result_val
+                            self.memory_changes.add(addr)
                 else:
-                    if dest in self.registers and result_val is not None:
-                        self.registers[dest].update({"value": result_val, "busy": False, "rename": None})
-
-                # 将结果广播到等待此 RS 的其他保留站
-                producer_tag = f"RS:{rs.get('name')}"
+                    index = REGISTER_INDEX.get(dest)
+                    if index is not None and result_val is not None and self.rename_table[index] == producer_tag:
+                        self.registers[dest]["value"] = result_val
+                        self.rename_table[index] = TAG_REG
+                        self.dirty_registers.add(dest)
+
+                # 将结果广播到等待此 RS 的其他保留站（忙碌保留站的三个来源字段都已设置，只比较整数标签）
+                waiters = 0
                 for other in self.reservation_stations:
-                    if other is rs or not other.get("busy"):
+                    if other is rs or not other["busy"]:
                         continue
-                    if other.get("src1_source") == producer_tag:
+                    woken = False
+                    if other["src1_source"] == producer_tag:
                         other["src1_value"] = result_val
                         other["src1_ready"] = True
-                        other["src1_source"] = "Reg"
-                    if other.get("src2_source") == producer_tag:
+                        other["src1_source"] = TAG_REG
+                        woken = True
+                    if other["src2_source"] == producer_tag:
                         other["src2_value"] = result_val
                         other["src2_ready"] = True
-                        other["src2_source"] = "Reg"
-
-                # 将写周期记录到指令条目中
-                for entry in self.instruction_queue:
-                    if entry["text"] == instr_text and entry.get("write_cycle") is None:
-                        entry["write_cycle"] = self.clock
-                        break
+                        other["src2_source"] = TAG_REG
+                        woken = True
+                    if other["src3_source"] == producer_tag:
+                        other["src3_value"] = result_val
+                        other["src3_ready"] = True
+                        other["src3_source"] = TAG_REG
+                        woken = True
+                    waiters += woken
+                self.counters.record_broadcast(waiters)
+
+                # 将写周期记录到指令条目中，并把该指令退休到归档
+                self._record_timing(rs, "write_cycle")
+                if rs.get("entry_index") is not None:
+                    self.instruction_queue.retire(rs["entry_index"])
 
                 # 增加累计完成计数并记录已完成的操作
-                self.completed_operations.append(f"{instr_text} -> {dest} = {result_val}")
+                if OPS[rs.get("op")].kind == "branch":
+                    self.completed_operations.append(f"{instr_text} -> {'taken' if result_val else 'not taken'}")
+                else:
+                    self.completed_operations.append(f"{instr_text} -> {dest} = {result_val}")
                 self.completed_total += 1
+                counter_values["completed"] += 1
                 self.log(f"已完成指令总数：{self.completed_total}")
 
                 # 清空保留站
@@ -444,37 +788,153 @@ class Tomasulo:
                     "src2": None,
                     "src1_source": None,
                     "src2_source": None,
+                    "src3_source": None,
                     "src1_value": None,
                     "src2_value": None,
+                    "src3_value": None,
                     "time_left": 0,
                     "started": False,
                     "exec_time": None,
                     "result": None,
                     "write_pending": False,
                     "write_ready_cycle": None,
+                    "entry_index": None,
                 })
-                
+
+
+        self.busy_stations = sum(1 for rs in self.reservation_stations if rs["busy"])
+        self.counters.end_cycle(self.clock, self.busy_stations)
 
         # 检查是否所有指令都已完成。
-        # 注意：我们有意保留 `instruction_queue` 内容以供 UI 显示，
+        # 注意：已退休的指令仍计入 `instruction_queue` 的长度，
         # 因此终止必须依赖于有多少指令已被写回。
-        all_rs_idle = all(not rs.get("busy") for rs in self.reservation_stations)
-        if all_rs_idle and self.completed_total >= len(self.instruction_queue) and len(self.instruction_queue) > 0:
+        if self.is_finished() and len(self.instruction_queue) > 0:
             self.log("所有指令已写回，模拟停止。")
             return
 
+    def analyze_dataflow(self, keep_edges=True):
+        """对当前指令队列做静态数据流分析（见 `dataflow.analyze_dataflow`）。"""
+        parsed = list(self.instruction_queue.iter_parsed())
+        return analyze_dataflow(parsed, self.min_latencies(), len(self.reservation_stations), keep_edges,
+                                self.issue_width, self.fu_counts, self.pipelined)
+
+    def is_finished(self):
+        """所有已入队的指令（以及静态程序的全部动态指令）是否都已写回。"""
+        if self.completed_total < len(self.instruction_queue) or not self._fetch_done:
+            return False
+        return all(not rs.get("busy") for rs in self.reservation_stations)
+
+    def run(self, max_cycles=None):
+        """连续调用 `step()` 直到所有指令写回或达到 `max_cycles`，返回最终时钟。"""
+        while not self.is_finished():
+            if max_cycles is not None and self.clock >= max_cycles:
+                break
+            self.step()
+        return self.clock
+
+    def _acquire_functional_unit(self, rs):
+        """若该保留站的操作类别有空闲功能单元则占用一个、确定执行延迟并返回 True。"""
+        fu_class = FU_CLASSES.get(rs.get("op"))
+        free = self._fu_free.get(fu_class)
+        if free is not None and free <= 0:
+            return False
+        if self._latency_fns or self.cache is not None:
+            # 延迟在确定开始执行时才计算：缓存访问会改变缓存状态，只能发生一次
+            self._start_latency(rs)
+        if free is None:
+            # 未限制数量的类别
+            return True
+        self._fu_free[fu_class] = free - 1
+        # 流水化单元下一周期即可接收新操作；非流水化单元在整个执行延迟内被占用
+        busy_cycles = 1 if self.pipelined.get(fu_class, True) else max(rs.get("exec_time") or 1, 1)
+        self._fu_release.setdefault(self.clock + busy_cycles, []).append(fu_class)
+        return True
+
+    def _source_values(self, rs, spec):
+        """按操作的源操作数顺序取保留站中的值；未保存值时回退到寄存器当前值。"""
+        values = []
+        for value_field, reg_field in spec.source_fields:
+            value = rs.get(value_field)
+            if value is None:
+                value = self.registers.get(rs.get(reg_field), {}).get("value", 0)
+            values.append(value)
+        return values
+
+    def _start_latency(self, rs):
+        """开始执行时确定执行时间：LOAD/STORE 访问存储层次，其余操作按延迟模型。"""
+        spec = OPS[rs["op"]]
+        if self.cache is not None and (spec.kind == "load" or spec.kind == "store"):
+            rs["exec_time"] = self.cache.access(rs["addr"], spec.kind == "store")
+            return
+        fn = self._latency_fns.get(rs["op"])
+        if fn is not None:
+            rs["exec_time"] = fn(self._source_values(rs, spec), self.op_latencies[rs["op"]], rs.get("entry_index"))
+
+    def _count_operand_lookups(self, rs):
+        """统计刚分配的保留站的寄存器/内存操作数查找，以及其中经重命名等待生产者的次数。"""
+        values = self.counters.values
+        for source, _, ready in _SLOT_FIELDS.values():
+            if rs[source] == TAG_NONE or rs[source] == TAG_IMM:
+                continue
+            values["rename_lookups"] += 1
+            if not rs[ready]:
+                values["rename_hits"] += 1
+
+    def _record_timing(self, rs, field):
+        """把当前周期记录到保留站对应指令条目的 `field`，并登记到 `timing_changes`。"""
+        entry = self._entry_for(rs, field)
+        if entry is not None:
+            entry[field] = self.clock
+            if rs.get("entry_index") is not None:
+                self.timing_changes.add(rs["entry_index"])
+        return entry
+
+    def _entry_for(self, rs, field):
+        """返回保留站对应的指令条目；按文本分配（无下标）时回退为查找该字段尚未记录的同文本条目。"""
+        index = rs.get("entry_index")
+        if index is not None:
+            return self.instruction_queue[index]
+        instr_text = rs.get("instruction")
+        for entry in self.instruction_queue:
+            if entry["text"] == instr_text and entry.get(field) is None:
+                return entry
+        return None
+
     def get_completed_operations(self):
         """返回当前周期的已完成操作列表。"""
         return self.completed_operations
 
+    def get_counters(self):
+        """返回性能计数器的当前值（见 `CounterRegistry.snapshot`）；配置了缓存时含 `cache` 命中统计。"""
+        counters = self.counters.snapshot()
+        if self.cache is not None:
+            counters["cache"] = self.cache.stats()
+        return counters
+
+    def tag_label(self, tag):
+        """把整数标签转换为可读标签：生产者为 "RS:<name>"，其余为 Reg/Imm/Mem/N/A；None 保持为 None。"""
+        if tag is None:
+            return None
+        if tag > 0:
+            return f"RS:{self.reservation_stations[tag - 1]['name']}"
+        return SOURCE_LABELS[tag]
+
     def get_state(self):
-        """返回当前状态以供可视化。"""
+        """返回当前状态以供可视化（保留站来源与寄存器重命名为可读标签的副本）。"""
+        label = self.tag_label
+        stations = []
+        for rs in self.reservation_stations:
+            rs = dict(rs)
+            for source, _, _ in _SLOT_FIELDS.values():
+                rs[source] = label(rs.get(source))
+            stations.append(rs)
+        registers = {}
+        for reg, data in self.registers.items():
+            tag = self.rename_table[REGISTER_INDEX[reg]]
+            registers[reg] = {"value": data["value"], "rename": label(tag) if tag > 0 else None, "busy": tag > 0}
         return {
             "clock": self.clock,
-            "reservation_stations": self.reservation_stations,
-            "registers": {
-                reg: {"value": data["value"], "rename": data.get("rename", None), "busy": data.get("busy", False)}
-                for reg, data in self.registers.items()
-            },
+            "reservation_stations": stations,
+            "registers": registers,
             "instruction_queue": self.instruction_queue,
         }
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""合成负载生成器：按种子生成任意长度的指令程序，用于规模与压力测试。
+
+可控制的参数：
+- `op_mix`：操作权重，例如 `{"ADD": 3, "MUL": 1, "LOAD": 2}`。可使用 LOAD、STORE
+  与注册表中的任意运算操作（如 FMA、SQRT，见 ops.py），源操作数个数按操作的形式生成。
+- `dep_distance`：依赖距离分布。数字表示几何分布的均值，字典表示
+  `{距离: 权重}`；源操作数以 `dep_probability` 的概率读取 k 条指令之前
+  的目的寄存器。
+- `num_registers`：寄存器压力，只使用 F1..F<num_registers>。
+- `address_range` / `locality` / `locality_window`：内存地址范围与局部性，
+  以 `locality` 的概率在上一次地址附近 `locality_window` 内访问。
+
+生成是流式的，可直接写入文件（`write_program`）或送入
+`Tomasulo.add_instruction`（`feed`），不会预先生成整段程序。
+"""
+import argparse
+import bisect
+import itertools
+import math
+import random
+from collections import deque
+
+from ops import OPS
+
+DEFAULT_OP_MIX = {"ADD": 3, "SUB": 2, "MUL": 2, "DIV": 1, "LOAD": 2, "STORE": 1}
+
+
+def _weighted_table(weights):
+    """将权重字典转换为 (键列表, 累积权重列表)。"""
+    keys = [k for k, w in weights.items() if w > 0]
+    if not keys:
+        raise ValueError("权重表不能为空")
+    cum = list(itertools.accumulate(weights[k] for k in keys))
+    return keys, cum
+
+
+def generate_program(count, seed=0, op_mix=None, dep_distance=4.0, dep_probability=0.5,
+                     num_registers=32, address_range=(0, 256), locality=0.8, locality_window=8):
+    """逐条产生 `count` 条指令文本（生成器）。相同参数和种子得到相同程序。"""
+    if not 1 <= num_registers <= 32:
+        raise ValueError(f"寄存器数量必须在 1..32 之间: {num_registers}")
+    lo, hi = address_range
+    if hi <= lo:
+        raise ValueError(f"无效的地址范围: {address_range}")
+    rng = random.Random(seed)
+    ops, op_cum = _weighted_table(op_mix or DEFAULT_OP_MIX)
+    unknown = [op for op in ops if op not in OPS or OPS[op].kind not in ("alu", "load", "store")]
+    if unknown:
+        raise ValueError(f"不支持的操作: {', '.join(unknown)}")
+    op_total = op_cum[-1]
+
+    if isinstance(dep_distance, dict):
+        distances, dist_cum = _weighted_table(dep_distance)
+        dist_total = dist_cum[-1]
+        max_distance = max(distances)
+
+        def _distance():
+            return distances[bisect.bisect_right(dist_cum, rng.random() * dist_total)]
+    else:
+        if dep_distance < 1:
+            raise ValueError(f"依赖距离均值必须 >= 1: {dep_distance}")
+        # 几何分布（支撑集 1, 2, ...），通过逆变换采样
+        p = 1.0 / dep_distance
+        log_q = math.log(1.0 - p) if p < 1.0 else None
+        max_distance = max(1, int(dep_distance * 8))
+
+        def _distance():
+            if log_q is None:
+                return 1
+            return int(math.log(1.0 - rng.random()) / log_q) + 1
+
+    registers = [f"F{i}" for i in range(1, num_registers + 1)]
+    recent_dests = deque(maxlen=max_distance)
+    last_addr = lo
+
+    def _src():
+        if recent_dests and rng.random() < dep_probability:
+            k = _distance()
+            if k <= len(recent_dests):
+                return recent_dests[-k]
+        return registers[rng.randrange(num_registers)]
+
+    def _addr():
+        nonlocal last_addr
+        if rng.random() < locality:
+            addr = last_addr + rng.randint(-locality_window, locality_window)
+            addr = min(max(addr, lo), hi - 1)
+        else:
+            addr = rng.randrange(lo, hi)
+        last_addr = addr
+        return addr
+
+    for _ in range(count):
+        op = ops[bisect.bisect_right(op_cum, rng.random() * op_total)]
+        if op == "LOAD":
+            dest = registers[rng.randrange(num_registers)]
+            line = f"LOAD {dest} {_addr()}"
+        elif op == "STORE":
+            line = f"STORE {_addr()} {_src()}"
+            dest = None
+        else:
+            srcs = [_src() for _ in OPS[op].sources]
+            dest = registers[rng.randrange(num_registers)]
+            line = " ".join([op, dest] + srcs)
+        if dest is not None:
+            recent_dests.append(dest)
+        yield line
+
+
+def write_program(path, count, chunk_size=65536, **params):
+    """将生成的程序流式写入文件，返回写入的指令数。"""
+    written = 0
+    lines = generate_program(count, **params)
+    with open(path, "w") as f:
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                break
+            f.write("\n".join(chunk))
+            f.write("\n")
+            written += len(chunk)
+    return written
+
+
+def feed(tomasulo, count, **params):
+    """将生成的程序逐条送入 `tomasulo.add_instruction`，返回送入的指令数。"""
+    added = 0
+    for line in generate_program(count, **params):
+        tomasulo.add_instruction(line)
+        added += 1
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成 Tomasulo 指令程序")
+    parser.add_argument("count", type=int, help="指令条数")
+    parser.add_argument("-o", "--output", required=True, help="输出文件路径")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dep-distance", type=float, default=4.0, help="依赖距离几何分布均值")
+    parser.add_argument("--dep-probability", type=float, default=0.5)
+    parser.add_argument("--registers", type=int, default=32, help="使用的寄存器数量")
+    parser.add_argument("--locality", type=float, default=0.8)
+    parser.add_argument("--mix", default=None,
+                        help="操作权重，例如 ADD=3,MUL=1,LOAD=2")
+    args = parser.parse_args(argv)
+    op_mix = None
+    if args.mix:
+        op_mix = {}
+        for item in args.mix.split(","):
+            op, _, weight = item.partition("=")
+            op_mix[op.strip().upper()] = float(weight)
+    n = write_program(args.output, args.count, seed=args.seed, op_mix=op_mix,
+                      dep_distance=args.dep_distance, dep_probability=args.dep_probability,
+                      num_registers=args.registers, locality=args.locality)
+    print(f"已写入 {n} 条指令到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()